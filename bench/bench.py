@@ -0,0 +1,170 @@
+import argparse
+import atexit
+import contextlib
+import io
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent / "src"))
+sys.path.insert(0, str(HERE))
+
+from main import generate_site  # noqa: E402
+from parser import (  # noqa: E402
+    block_to_block_type,
+    markdown_to_blocks,
+    markdown_to_html_node,
+    text_to_text_nodes,
+)
+from sitegen import generate_content, markdown_page  # noqa: E402
+
+Case = tuple[str, Callable[[], object]]
+
+
+def micro_cases() -> list[Case]:
+    rng = random.Random(0)
+    page = markdown_page(rng, "Realistic page", blocks=400)
+    blocks = markdown_to_blocks(page)
+    paragraph = " ".join(b.replace("\n", " ") for b in blocks if b[0].isalpha())
+    tree = markdown_to_html_node(page)
+
+    many_markers = "a **b** _c_ `d` " * 5000
+    many_brackets = "[x " * 20000 + "](y)"
+    many_links = " ".join(f"[l{i}](/p{i}.html)" for i in range(5000))
+    long_list = "\n".join(f"- item {i} with _emphasis_" for i in range(20000))
+    long_quote = "\n".join(f"> quoted {i}" for i in range(20000))
+    blank_heavy = "x\n\n" * 50000
+    wide_tree = markdown_to_html_node(
+        "\n\n".join(f"para {i} **b**" for i in range(20000))
+    )
+
+    return [
+        ("text_to_text_nodes/realistic", lambda: text_to_text_nodes(paragraph)),
+        ("text_to_text_nodes/many_markers", lambda: text_to_text_nodes(many_markers)),
+        ("text_to_text_nodes/many_brackets", lambda: text_to_text_nodes(many_brackets)),
+        ("text_to_text_nodes/many_links", lambda: text_to_text_nodes(many_links)),
+        ("markdown_to_blocks/realistic", lambda: markdown_to_blocks(page)),
+        ("markdown_to_blocks/blank_heavy", lambda: markdown_to_blocks(blank_heavy)),
+        ("block_to_block_type/realistic", lambda: [*map(block_to_block_type, blocks)]),
+        ("block_to_block_type/long_list", lambda: block_to_block_type(long_list)),
+        ("block_to_block_type/long_quote", lambda: block_to_block_type(long_quote)),
+        ("markdown_to_html_node/realistic", lambda: markdown_to_html_node(page)),
+        ("to_html/realistic", tree.to_html),
+        ("to_html/wide", wide_tree.to_html),
+    ]
+
+
+def time_case(fn: Callable[[], object], min_time: float, max_runs: int) -> dict:
+    fn()  # warm caches
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < max_runs and (
+        len(samples) < 3 or time.perf_counter() < deadline
+    ):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    return {
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+        "runs": len(samples),
+    }
+
+
+def site_case(pages: int, jobs: int) -> Case:
+    tmp = Path(tempfile.mkdtemp(prefix=f"bench-site-{pages}-"))
+    atexit.register(shutil.rmtree, tmp, ignore_errors=True)
+    content = tmp / "content"
+    generate_content(content, pages)
+    template = tmp / "template.html"
+    template.write_text((HERE.parent / "template.html").read_text())
+
+    def build():
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_site(content, template, tmp / "docs", "/", jobs=jobs)
+
+    return (f"generate_site/{pages}_pages/jobs{jobs}", build)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            print(f"{name:48} (new)")
+            continue
+
+        ratio = result["median_s"] / old["median_s"]
+        flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:48} {ratio:6.2f}x baseline{flag}")
+        if flag:
+            regressions.append(name)
+
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the parser and builds.")
+    parser.add_argument("-o", "--output", type=Path, help="write results as JSON")
+    parser.add_argument(
+        "--baseline", type=Path, help="compare against a previous results file"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed slowdown vs the baseline before failing (default 0.2 = 20%%)",
+    )
+    parser.add_argument(
+        "--site",
+        type=int,
+        action="append",
+        default=[],
+        metavar="PAGES",
+        help="also time a full build of a synthetic site, e.g. --site 1000",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("-k", "--filter", default="", help="only run matching cases")
+    parser.add_argument("--min-time", type=float, default=0.5)
+    parser.add_argument("--max-runs", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    cases = micro_cases()
+    cases += [site_case(pages, args.jobs) for pages in args.site]
+
+    results = {}
+    for name, fn in cases:
+        if args.filter not in name:
+            continue
+        # a full site build is slow enough that a few runs are plenty
+        max_runs = 3 if name.startswith("generate_site/") else args.max_runs
+        results[name] = time_case(fn, args.min_time, max_runs)
+        print(f"{name:48} {results[name]['median_s'] * 1000:10.3f} ms")
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=1, sort_keys=True))
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if compare(results, baseline, args.tolerance):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+import argparse
+import random
+from pathlib import Path
+
+WORDS = (
+    "finn jake candy kingdom princess bubblegum marceline ice king lich "
+    "treehouse fire lumpy space prismo time room adventure sword dungeon "
+    "banana guard peppermint butler gunter ooo mathematical algebraic"
+).split()
+
+
+def _words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def _inline(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(4, 12)):
+        roll = rng.random()
+        if roll < 0.55:
+            parts.append(_words(rng, rng.randint(3, 10)))
+        elif roll < 0.65:
+            parts.append(f"**{_words(rng, 2)}**")
+        elif roll < 0.75:
+            parts.append(f"_{_words(rng, 2)}_")
+        elif roll < 0.83:
+            parts.append(f"`{rng.choice(WORDS)}()`")
+        elif roll < 0.93:
+            parts.append(f"[{_words(rng, 2)}](/{rng.choice(WORDS)}.html)")
+        else:
+            image = rng.choice(WORDS)
+            parts.append(f"![{image}](/images/{image}.webp)")
+    return " ".join(parts)
+
+
+def markdown_page(rng: random.Random, title: str, blocks: int = 24) -> str:
+    out = [f"# {title}"]
+    for _ in range(blocks):
+        roll = rng.random()
+        if roll < 0.45:
+            out.append("\n".join(_inline(rng) for _ in range(rng.randint(1, 4))))
+        elif roll < 0.55:
+            out.append(f"## {_words(rng, 3)}")
+        elif roll < 0.68:
+            items = rng.randint(2, 6)
+            out.append("\n".join(f"- {_inline(rng)}" for _ in range(items)))
+        elif roll < 0.78:
+            out.append(
+                "\n".join(f"{i}. {_inline(rng)}" for i in range(1, rng.randint(3, 9)))
+            )
+        elif roll < 0.88:
+            lines = rng.randint(1, 3)
+            out.append("\n".join(f"> {_inline(rng)}" for _ in range(lines)))
+        else:
+            lines = rng.randint(2, 8)
+            body = "\n".join(f"    {_words(rng, 5)}" for _ in range(lines))
+            out.append(f"```\n{body}\n```")
+
+    return "\n\n".join(out) + "\n"
+
+
+def generate_content(root: Path, pages: int, seed: int = 0, per_dir: int = 100):
+    rng = random.Random(seed)
+    for i in range(pages):
+        path = root / f"section{i // per_dir:04d}" / f"page{i:06d}.md"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(markdown_page(rng, f"Page {i}"), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic content/ tree.")
+    parser.add_argument("dest", type=Path)
+    parser.add_argument("pages", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate_content(args.dest, args.pages, args.seed)
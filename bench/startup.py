@@ -0,0 +1,83 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+SRC = HERE.parent / "src"
+
+# "import time: self [us] | cumulative | imported package", nesting by indent
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def importtime(module: str, path: Path) -> dict[str, tuple[int, int]]:
+    # a fresh interpreter per run, that is what CI and pre-commit hooks pay
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    env["PYTHONPATH"] = str(path)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    found = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match is not None:
+            found[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return found
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Time importing the CLI with -X importtime against a budget."
+    )
+    parser.add_argument(
+        "--module", default="main", help="module to import (default main)"
+    )
+    parser.add_argument(
+        "--path",
+        type=Path,
+        default=SRC,
+        help="sys.path entry to import it from, e.g. a zipapp (default src/)",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=45.0,
+        metavar="MS",
+        help="fail if the median cumulative import time exceeds this (default 45)",
+    )
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports shown")
+    args = parser.parse_args(argv)
+
+    importtime(args.module, args.path)  # writes bytecode caches for src/
+    runs = [importtime(args.module, args.path) for _ in range(args.runs)]
+
+    selfs: dict[str, list[int]] = {}
+    for run in runs:
+        for name, (self_us, _) in run.items():
+            selfs.setdefault(name, []).append(self_us)
+    slowest = sorted(
+        ((statistics.median(v), name) for name, v in selfs.items()), reverse=True
+    )
+    for self_us, name in slowest[: args.top]:
+        print(f"{name:40} {self_us / 1000:8.2f} ms self")
+
+    total = statistics.median(run[args.module][1] for run in runs) / 1000
+    print(f"import {args.module}: {total:.2f} ms (budget {args.budget:.2f} ms)")
+    if total > args.budget:
+        print("startup over budget")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
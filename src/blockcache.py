@@ -0,0 +1,147 @@
+from __future__ import annotations
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+class BlockCache:
+    def __init__(
+        self,
+        max_bytes: int = 64 << 20,
+        directory: Path | None = None,
+        max_disk_bytes: int = 512 << 20,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._size = 0
+        # the render server and highlighting share one cache across threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            h.update(part.encode("utf-8", "surrogatepass"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        assert self.directory is not None
+        return self.directory / key[:2] / f"{key}.html"
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+
+        # disk reads happen outside the lock, a racing put() replaces the
+        # file atomically
+        if self.directory is not None:
+            path = self._disk_path(key)
+            try:
+                html = path.read_text(encoding="utf-8")
+            except (OSError, ValueError):
+                pass
+            else:
+                os.utime(path)  # mtime is the recency used by trim_disk()
+                with self._lock:
+                    self._remember(key, html)
+                    self.hits += 1
+                return html
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, html: str) -> None:
+        with self._lock:
+            self._remember(key, html)
+
+        if self.directory is not None:
+            path = self._disk_path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # write then rename, parallel workers may race on the same key
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_text(html, encoding="utf-8")
+            os.replace(tmp, path)
+
+    def _remember(self, key: str, html: str) -> None:
+        # callers hold the lock
+        if len(html) > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._entries[key] = html
+        self._size += len(html)
+
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def trim_disk(self) -> int:
+        if self.directory is None or not self.directory.exists():
+            return 0
+
+        files = []
+        total = 0
+        for path in self.directory.glob("*/*.html"):
+            stat = path.stat()
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+            total += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+
+        return removed
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = self.hits * 100 / lookups if lookups else 0.0
+        return (
+            f"Block cache: {self.hits} hits, {self.misses} misses "
+            f"({rate:.1f}% hit rate)"
+        )
+
+    def take_counts(self) -> tuple[int, int]:
+        with self._lock:
+            counts = (self.hits, self.misses)
+            self.hits = self.misses = 0
+        return counts
+
+
+_active: BlockCache | None = None
+
+
+def enable(
+    max_bytes: int = 64 << 20,
+    directory: Path | None = None,
+    max_disk_bytes: int = 512 << 20,
+) -> BlockCache:
+    global _active
+    _active = BlockCache(max_bytes, directory, max_disk_bytes)
+    return _active
+
+
+def disable() -> None:
+    global _active
+    _active = None
+
+
+def active() -> BlockCache | None:
+    return _active
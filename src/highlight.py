@@ -0,0 +1,209 @@
+from __future__ import annotations
+import re
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from blockcache import BlockCache
+
+# bump whenever a lexer or the markup changes, older cache entries are then
+# never looked up again
+HIGHLIGHT_VERSION = "1"
+
+_PY_KEYWORDS = (
+    "False None True and as assert async await break class continue def del elif "
+    "else except finally for from global if import in is lambda nonlocal not or "
+    "pass raise return try while with yield match case"
+)
+_JS_KEYWORDS = (
+    "async await break case catch class const continue debugger default delete do "
+    "else export extends false finally for function if import in instanceof let new "
+    "null of return static super switch this throw true try typeof undefined var "
+    "void while with yield"
+)
+_SH_KEYWORDS = (
+    "case do done elif else esac fi for function if in local return select then "
+    "until while export"
+)
+
+
+def _escape(text: str) -> str:
+    # html.escape() would import html.entities, a noticeable part of startup
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _words(words: str) -> str:
+    return r"\b(?:" + "|".join(words.split()) + r")\b"
+
+
+_NUMBER = r"\b(?:0[xX][0-9a-fA-F_]+|\d[\d_]*\.?\d*(?:[eE][+-]?\d+)?)\b"
+_DQ = r'"(?:[^"\\\n]|\\.)*"'
+_SQ = r"'(?:[^'\\\n]|\\.)*'"
+
+# (css class, pattern) per language, tried in order at each position; the
+# first that matches wins, text no rule matches is copied through
+_RULES: dict[str, list[tuple[str, str]]] = {
+    "python": [
+        ("com", r"#[^\n]*"),
+        (
+            "str",
+            r"(?:\b(?i:[rbuf]{1,2}))?"
+            + r'(?:"""[\s\S]*?"""|'
+            + r"'''[\s\S]*?'''|"
+            + f"{_DQ}|{_SQ})",
+        ),
+        ("dec", r"^[ \t]*@[\w.]+"),
+        ("kw", _words(_PY_KEYWORDS)),
+        ("num", _NUMBER),
+        ("fn", r"(?<=\bdef )\w+|(?<=\bclass )\w+"),
+    ],
+    "javascript": [
+        ("com", r"//[^\n]*|/\*[\s\S]*?\*/"),
+        ("str", _DQ + "|" + _SQ + r"|`(?:[^`\\]|\\.)*`"),
+        ("kw", _words(_JS_KEYWORDS)),
+        ("num", _NUMBER),
+        ("fn", r"(?<=\bfunction )\w+|(?<=\bclass )\w+"),
+    ],
+    "json": [
+        ("key", _DQ + r"(?=\s*:)"),
+        ("str", _DQ),
+        ("kw", r"\b(?:true|false|null)\b"),
+        ("num", r"-?\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b"),
+    ],
+    "bash": [
+        ("com", r"(?<![\w$])#[^\n]*"),
+        ("str", _DQ + "|'[^']*'"),
+        ("var", r"\$(?:\{[^}\n]*\}|\w+|[@*#?$!-])"),
+        ("kw", _words(_SH_KEYWORDS)),
+        ("num", r"\b\d+\b"),
+    ],
+    "html": [
+        ("com", r"<!--[\s\S]*?-->"),
+        ("tag", r"</?[A-Za-z][\w:-]*|/?>"),
+        ("attr", r"(?<=\s)[A-Za-z_:][\w:.-]*(?==)"),
+        ("str", r'"[^"]*"|' + r"'[^']*'"),
+        ("ent", r"&#?\w+;"),
+    ],
+}
+_ALIASES = {
+    "py": "python",
+    "python3": "python",
+    "js": "javascript",
+    "mjs": "javascript",
+    "sh": "bash",
+    "shell": "bash",
+    "zsh": "bash",
+    "xml": "html",
+    "svg": "html",
+}
+
+
+@lru_cache(maxsize=None)
+def lexer(lang: str) -> tuple[re.Pattern[str], tuple[str, ...]] | None:
+    # compiled on first use, so languages nobody writes about cost nothing
+    name = _ALIASES.get(lang, lang)
+    rules = _RULES.get(name)
+    if rules is None:
+        return None
+
+    pattern = "|".join(f"(?P<t{i}>{rule})" for i, (_, rule) in enumerate(rules))
+    return re.compile(pattern, re.MULTILINE), tuple(cls for cls, _ in rules)
+
+
+def highlight_code(code: str, lang: str) -> str | None:
+    found = lexer(lang.lower())
+    if found is None:
+        return None
+
+    pattern, classes = found
+    out = []
+    last = 0
+    for match in pattern.finditer(code):
+        start, end = match.span()
+        if start == end:
+            continue
+        if start > last:
+            out.append(_escape(code[last:start]))
+        cls = classes[int(match.lastgroup[1:])]
+        token = _escape(match.group())
+        out.append(f'<span class="hl-{cls}">{token}</span>')
+        last = end
+    out.append(_escape(code[last:]))
+
+    return "".join(out)
+
+
+class Highlighter:
+    # highlighted code by content hash; like the block cache an in-process
+    # LRU, with the directory shared by workers and kept between builds
+    def __init__(
+        self,
+        directory: Path | None = None,
+        max_bytes: int = 16 << 20,
+        max_disk_bytes: int = 64 << 20,
+    ) -> None:
+        self.cache = BlockCache(max_bytes, directory, max_disk_bytes)
+        self.elapsed_ns = 0
+        self._lock = threading.Lock()
+        # goes into the block cache key of code blocks
+        self.key = f"highlight:{HIGHLIGHT_VERSION}"
+
+    def highlight(self, code: str, lang: str) -> str | None:
+        if lexer(lang.lower()) is None:
+            return None
+
+        key = self.cache.key(HIGHLIGHT_VERSION, lang.lower(), code)
+        html = self.cache.get(key)
+        if html is None:
+            start = time.perf_counter_ns()
+            html = highlight_code(code, lang)
+            assert html is not None
+            elapsed = time.perf_counter_ns() - start
+            with self._lock:
+                self.elapsed_ns += elapsed
+            self.cache.put(key, html)
+
+        return html
+
+    def take_counts(self) -> tuple[int, int, int]:
+        hits, misses = self.cache.take_counts()
+        with self._lock:
+            elapsed, self.elapsed_ns = self.elapsed_ns, 0
+        return hits, misses, elapsed
+
+    def add_counts(self, counts: tuple[int, int, int]) -> None:
+        self.cache.hits += counts[0]
+        self.cache.misses += counts[1]
+        self.elapsed_ns += counts[2]
+
+    def summary(self) -> str:
+        hits, misses = self.cache.hits, self.cache.misses
+        lookups = hits + misses
+        rate = hits * 100 / lookups if lookups else 0.0
+        return (
+            f"Highlighting: {hits} hits, {misses} misses ({rate:.1f}% hit rate), "
+            f"{self.elapsed_ns / 1e6:.1f} ms highlighting"
+        )
+
+
+_active: Highlighter | None = None
+
+
+def enable(
+    directory: Path | None = None,
+    max_bytes: int = 16 << 20,
+    max_disk_bytes: int = 64 << 20,
+) -> Highlighter:
+    global _active
+    _active = Highlighter(directory, max_bytes, max_disk_bytes)
+    return _active
+
+
+def disable() -> None:
+    global _active
+    _active = None
+
+
+def active() -> Highlighter | None:
+    return _active
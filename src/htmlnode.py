@@ -1,22 +1,48 @@
 from __future__ import annotations
+import sys
+from typing import Callable, Mapping, Protocol
+
+
+class Writer(Protocol):
+    def write(self, chunk: str, /) -> object: ...
 
 
 class HTMLNode:
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(
         self,
         tag: str | None = None,
         value: str | None = None,
         children: list[HTMLNode] | None = None,
-        props: dict[str, str] | None = None,
+        props: Mapping[str, str] | None = None,
     ) -> None:
-        self.tag = tag
+        self.tag = sys.intern(tag) if tag is not None else None
         self.value = value
         self.children = children
         self.props = props
 
-    def to_html(self) -> str:
+    def _emit(self, write: Callable[[str], object], stack: list) -> None:
         raise NotImplementedError
 
+    def render_to(self, writer: Writer | list[str]) -> None:
+        write = writer.append if isinstance(writer, list) else writer.write
+        # closing tags are pushed as plain strings between the nodes
+        stack: list[HTMLNode | str] = [self]
+        pop = stack.pop
+
+        while stack:
+            item = pop()
+            if type(item) is str:
+                write(item)
+            else:
+                item._emit(write, stack)
+
+    def to_html(self) -> str:
+        chunks: list[str] = []
+        self.render_to(chunks)
+        return "".join(chunks)
+
     def props_to_html(self) -> str:
         if self.props is None:
             return ""
@@ -27,38 +53,43 @@ class HTMLNode:
 
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(
         self,
         tag: str | None = None,
         value: str | None = None,
-        props: dict[str, str] | None = None,
+        props: Mapping[str, str] | None = None,
     ) -> None:
         super().__init__(tag, value, None, props)
 
-    def to_html(self) -> str:
+    def _emit(self, write: Callable[[str], object], stack: list) -> None:
         if self.value is None:
             raise ValueError("all leaf nodes must have a value")
 
         if self.tag is None:
-            return self.value
+            write(self.value)
+            return
 
         props = self.props_to_html()
         if props:
             props = " " + props
 
-        return f"<{self.tag}{props}>{self.value}</{self.tag}>"
+        write(f"<{self.tag}{props}>{self.value}</{self.tag}>")
 
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(
         self,
         tag: str,
         children: list[HTMLNode],
-        props: dict[str, str] | None = None,
+        props: Mapping[str, str] | None = None,
     ) -> None:
         super().__init__(tag, None, children, props)
 
-    def to_html(self) -> str:
+    def _emit(self, write: Callable[[str], object], stack: list) -> None:
         if self.tag is None:
             raise ValueError("all parent nodes must have a tag")
 
@@ -69,4 +100,6 @@ class ParentNode(HTMLNode):
         if props:
             props = " " + props
 
-        return f"<{self.tag}{props}>{''.join(child.to_html() for child in self.children)}</{self.tag}>"
+        write(f"<{self.tag}{props}>")
+        stack.append(f"</{self.tag}>")
+        stack.extend(reversed(self.children))
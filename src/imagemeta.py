@@ -0,0 +1,202 @@
+from __future__ import annotations
+import json
+import os
+import struct
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+from typing import BinaryIO, Mapping
+
+IMAGE_SUFFIXES = frozenset({".png", ".jpg", ".jpeg", ".gif", ".webp"})
+CACHE_VERSION = 1
+
+Size = tuple[int, int]
+# static/ urls and the [width, height] each resolved to, [] where static/
+# had no readable image; recorded per page and per cached block
+ImageDeps = dict[str, list[int]]
+
+# JPEG start-of-frame markers; C4, C8 and CC share the range but are not frames
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _jpeg_size(f: BinaryIO) -> Size | None:
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte == b"\xff":  # fill bytes before a marker
+            byte = f.read(1)
+        if not byte:
+            return None
+
+        marker = byte[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            continue  # standalone markers carry no length
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        (length,) = struct.unpack(">H", length_bytes)
+
+        if marker in _SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">HH", frame[1:5])
+            return width, height
+
+        f.seek(length - 2, os.SEEK_CUR)
+        # every segment is followed by the next marker, anything else is garbage
+        if f.read(1) != b"\xff":
+            return None
+        f.seek(-1, os.SEEK_CUR)
+
+
+def _webp_size(head: bytes) -> Size | None:
+    chunk = head[12:16]
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and head[20:21] == b"\x2f":
+        (bits,) = struct.unpack("<I", head[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def image_size(path: Path) -> Size | None:
+    # reads headers only, never pixel data
+    with path.open("rb") as f:
+        head = f.read(32)
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", head[6:10])
+        if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+            return _webp_size(head)
+        if head.startswith(b"\xff\xd8"):
+            return _jpeg_size(f)
+    return None
+
+
+def _is_local(url: str) -> bool:
+    # only root-relative urls map onto static/
+    return url.startswith("/") and not url.startswith("//")
+
+
+class ImageMeta:
+    def __init__(self, static_dir: Path, sizes: dict[str, Size]) -> None:
+        self.static_dir = static_dir
+        self.sizes = sizes
+
+    def lookup(self, url: str) -> Size | None:
+        if not _is_local(url):
+            return None
+        return self.sizes.get(url[1:].split("?", 1)[0].split("#", 1)[0])
+
+    def is_current(self, deps: ImageDeps) -> bool:
+        # whether every recorded url still resolves to the same size
+        for url, size in deps.items():
+            found = self.lookup(url)
+            if (list(found) if found is not None else []) != size:
+                return False
+        return True
+
+
+def load(static_dir: Path, cache_path: Path) -> ImageMeta:
+    try:
+        data = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        data = {}
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+        data = {}
+    cached: dict[str, list[int]] = data.get("images", {})
+
+    # entries are [mtime_ns, size, width, height], or just [mtime_ns, size]
+    # for files that are not readable images; a header is only read again
+    # when its file changed
+    entries: dict[str, list[int]] = {}
+    for root, _, names in os.walk(static_dir):
+        for name in names:
+            path = Path(root, name)
+            if path.suffix.lower() not in IMAGE_SUFFIXES:
+                continue
+            rel = path.relative_to(static_dir).as_posix()
+            stat = path.stat()
+            entry = cached.get(rel)
+            if entry is None or entry[:2] != [stat.st_mtime_ns, stat.st_size]:
+                try:
+                    size = image_size(path)
+                except (OSError, struct.error):
+                    size = None
+                entry = [stat.st_mtime_ns, stat.st_size, *(size or ())]
+            entries[rel] = entry
+
+    if entries != cached:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(
+            json.dumps({"version": CACHE_VERSION, "images": entries}, sort_keys=True),
+            encoding="utf-8",
+        )
+
+    sizes = {rel: (e[2], e[3]) for rel, e in entries.items() if len(e) == 4}
+    return ImageMeta(static_dir, sizes)
+
+
+@lru_cache(maxsize=8192)
+def _image_props(
+    src: str, alt: str, size: Size | None, lazy: bool
+) -> Mapping[str, str]:
+    props = {"src": src, "alt": alt}
+    if size is not None:
+        props["width"], props["height"] = str(size[0]), str(size[1])
+    if lazy:
+        props["loading"], props["decoding"] = "lazy", "async"
+    return MappingProxyType(props)
+
+
+class PageImages:
+    # the first image of a page is likely above the fold and loads eagerly,
+    # every later one is deferred
+    __slots__ = ("meta", "seen", "used")
+
+    def __init__(self, meta: ImageMeta, used: ImageDeps | None = None) -> None:
+        self.meta = meta
+        self.seen = False
+        # what the page looked up; only a change to one of these images
+        # makes the page stale
+        self.used: ImageDeps = used if used is not None else {}
+
+    @property
+    def key(self) -> str:
+        return "lazy" if self.seen else "eager"
+
+    def props(self, url: str, src: str, alt: str) -> Mapping[str, str]:
+        lazy, self.seen = self.seen, True
+        size = self.meta.lookup(url)
+        if _is_local(url):
+            self.used[url] = list(size) if size is not None else []
+        return _image_props(src, alt, size, lazy)
+
+
+_active: ImageMeta | None = None
+
+
+def enable(meta: ImageMeta) -> ImageMeta:
+    global _active
+    _active = meta
+    return meta
+
+
+def disable() -> None:
+    global _active
+    _active = None
+
+
+def active() -> ImageMeta | None:
+    return _active
+
+
+def page_images(used: ImageDeps | None = None) -> PageImages | None:
+    return PageImages(_active, used) if _active is not None else None
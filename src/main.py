@@ -1,65 +1,486 @@
-import sys
+import argparse
+import os
+import threading
 from pathlib import Path
-import shutil
-import re
-from parser import markdown_to_html_node
+from typing import Sequence
+import blockcache
+import highlight
+import imagemeta
+from imagemeta import ImageDeps
+from manifest import IMAGE_META_NAME, Manifest, file_digest
+import profiling
+from pages import (
+    Target,
+    build_page,
+    describe,
+    generate_page,
+    layout_dependencies,
+    page_digest,
+    page_layout,
+    warm_up,
+)
+from sync import MODES, sync_tree
+from template import load_template
 
 
-def gen_docs(project_root: Path):
+def gen_docs(
+    project_root: Path,
+    mode: str = "copy",
+    checksum: bool = False,
+    docs_dir: Path | None = None,
+):
     static_dir = project_root / "static"
-    docs_dir = project_root / "docs"
+    if docs_dir is None:
+        docs_dir = project_root / "docs"
 
-    if docs_dir.exists():
-        shutil.rmtree(docs_dir)
     docs_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest.load(docs_dir)
+
+    result = sync_tree(static_dir, docs_dir, set(manifest.static), mode, checksum)
+    print(
+        f"Synced {static_dir}: {result.copied} copied, "
+        f"{result.unchanged} unchanged, {result.removed} removed"
+    )
+
+    manifest.static = sorted(result.files)
+    manifest.save()
+
+
+_worker_partials: Path | None = None
+
+
+def _init_worker(
+    partials_dir: Path,
+    profile: bool,
+    cache_config: tuple[int, Path | None] | None,
+    images: imagemeta.ImageMeta | None,
+    highlight_dir: Path | None,
+):
+    global _worker_partials
+    _worker_partials = partials_dir
+    if profile:
+        profiling.enable()
+    if images is not None:
+        imagemeta.enable(images)
 
-    shutil.copytree(static_dir, docs_dir, dirs_exist_ok=True)
+    warm_up()
 
+    # after the warm-up so it does not count as misses; each worker keeps its
+    # own LRU, the disk directory is what they share
+    if cache_config is not None:
+        max_bytes, directory = cache_config
+        blockcache.enable(max_bytes, directory)
+    if highlight_dir is not None:
+        highlight.enable(highlight_dir)
 
-def extract_title(markdown: str) -> str:
-    match = re.match(r"^# (.*?)\n\n", markdown.strip(), re.DOTALL)
-    if match is None:
-        raise Exception("no header no bueno >:(")  # )
 
-    return match.group(1).strip()
+# (source, layout, targets, minify, collect text for the search index)
+PageJob = tuple[Path, Path, list[Target], bool, bool]
+# a page's title and plain text
+PageText = tuple[str, str]
 
 
-def generate_page(from_path: Path, template_path: Path, dest_path: Path, basepath: str):
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
+def _generate_page_worker(
+    job: PageJob,
+) -> tuple[
+    str | None,
+    list[profiling.Event],
+    tuple[int, int],
+    tuple[int, int, int],
+    PageText | None,
+    ImageDeps,
+]:
+    from_path, template_path, targets, minify, search = job
 
+    text: list[str] | None = [] if search else None
+    indexed = None
+    images_used: ImageDeps = {}
     try:
-        content = from_path.read_text(encoding="utf-8")
-        template = template_path.read_text(encoding="utf-8")
+        # compiled per worker on first use, then served from the template cache
+        template = load_template(template_path, _worker_partials)
+        title = build_page(from_path, template, targets, minify, text, images_used)
     except Exception as exc:
-        print(exc)
-        raise
-
-    html = markdown_to_html_node(content).to_html()
-    title = extract_title(content)
+        error = f"{type(exc).__name__}: {exc}"
+    else:
+        error = None
+        if text is not None:
+            indexed = (title, "\n".join(text))
 
-    html_text = (
-        template.replace("{{ Title }}", title)
-        .replace("{{ Content }}", html)
-        .replace('href="/', f'href="{basepath}')
-        .replace('src="/', f'src="{basepath}')
+    profiler = profiling.active()
+    cache = blockcache.active()
+    highlighter = highlight.active()
+    return (
+        error,
+        profiler.take() if profiler is not None else [],
+        cache.take_counts() if cache is not None else (0, 0),
+        highlighter.take_counts() if highlighter is not None else (0, 0, 0),
+        indexed,
+        images_used,
     )
 
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-    dest_path.write_text(html_text, encoding="utf-8")
 
+def _generate_pages_parallel(
+    pages: list[PageJob], partials_dir: Path, jobs: int
+) -> tuple[list[str | None], list[PageText | None], list[ImageDeps]]:
+    # multiprocessing is most of the import time, and most runs never need it
+    from concurrent.futures import ProcessPoolExecutor
 
-def generate_site(
-    content_dir: Path, template_path: Path, docs_dir: Path, basepath: str
+    chunksize = max(1, len(pages) // (jobs * 8))
+    errors = []
+    texts = []
+    used = []
+    profiler = profiling.active()
+    cache = blockcache.active()
+    cache_config = (cache.max_bytes, cache.directory) if cache is not None else None
+    highlighter = highlight.active()
+
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(
+            partials_dir,
+            profiler is not None,
+            cache_config,
+            imagemeta.active(),
+            highlighter.cache.directory if highlighter is not None else None,
+        ),
+    ) as pool:
+        results = pool.map(_generate_page_worker, pages, chunksize=chunksize)
+        # map() yields in submission order, so the log reads the same as a serial run
+        for page, result in zip(pages, results):
+            error, events, counts, hl_counts, indexed, images_used = result
+            from_path, template_path, targets, *_ = page
+            if profiler is not None:
+                profiler.events.extend(events)
+            if cache is not None:
+                cache.hits += counts[0]
+                cache.misses += counts[1]
+            if highlighter is not None:
+                highlighter.add_counts(hl_counts)
+            print(describe(from_path, targets, template_path))
+            if error is not None:
+                print(error)
+            errors.append(error)
+            texts.append(indexed)
+            used.append(images_used)
+
+    return errors, texts, used
+
+
+def generate_sites(
+    content_dir: Path,
+    template_path: Path,
+    targets: Sequence[Target],
+    incremental: bool = False,
+    jobs: int = 1,
+    minify: bool = False,
+    search: bool = False,
 ):
-    for md_path in content_dir.rglob("*.md"):
+    # a full build still needs the old manifests to prune deleted pages
+    manifests = [Manifest.load(docs_dir) for _, docs_dir in targets]
+    site_root = template_path.parent
+    partials_dir = site_root / "partials"
+    digests: dict[Path, str] = {}
+    images = imagemeta.active()
+    images_current = images.is_current if images is not None else None
+    live = set()
+    pending = []
+    # pages whose layout could not be picked or loaded, never rendered
+    unrendered = []
+
+    for md_path in sorted(content_dir.rglob("*.md")):
         rel = md_path.relative_to(content_dir)
         out_rel = rel.with_suffix(".html")
-        out_path = docs_dir / out_rel
+        source = rel.as_posix()
+        live.add(source)
+        source_digest = file_digest(md_path)
+        try:
+            layout = page_layout(md_path, rel, template_path)
+            template_digest, files = layout_dependencies(layout, partials_dir, digests)
+        except Exception as exc:
+            # reported like a page that fails to render, the rest still builds
+            print(f"{type(exc).__name__}: {exc}")
+            unrendered.append(md_path)
+            for manifest in manifests:
+                manifest.pages.pop(source, None)
+            continue
+        deps = [path.relative_to(site_root).as_posix() for path in files]
 
-        generate_page(md_path, template_path, out_path, basepath)
+        # only the targets that are out of date get this page written
+        stale = []
+        for (basepath, docs_dir), manifest in zip(targets, manifests):
+            page_hash = page_digest(
+                source_digest, template_digest, basepath, minify, search
+            )
+            if incremental and manifest.is_fresh(source, page_hash, images_current):
+                continue
+            stale.append((basepath, docs_dir / out_rel, manifest, page_hash))
 
+        if stale:
+            pending.append((md_path, layout, source, out_rel.as_posix(), deps, stale))
 
-def main(basepath):
+    pages = [
+        (
+            md_path,
+            layout,
+            [(basepath, out_path) for basepath, out_path, *_ in stale],
+            minify,
+            search,
+        )
+        for md_path, layout, *_, stale in pending
+    ]
+    errors: list[str | None]
+    texts: list[PageText | None]
+    used: list[ImageDeps]
+    if jobs > 1 and len(pages) > 1:
+        errors, texts, used = _generate_pages_parallel(pages, partials_dir, jobs)
+    else:
+        # a failing page is reported like a worker reports it, the rest of
+        # the site is still built and recorded before the build fails
+        errors, texts, used = [], [], []
+        for md_path, layout, page_targets, *_ in pages:
+            text: list[str] | None = [] if search else None
+            images_used: ImageDeps = {}
+            used.append(images_used)
+            try:
+                title = generate_page(
+                    md_path,
+                    layout,
+                    page_targets,
+                    partials_dir,
+                    minify,
+                    text,
+                    images_used,
+                )
+            except Exception as exc:
+                error = f"{type(exc).__name__}: {exc}"
+                print(error)
+                errors.append(error)
+                texts.append(None)
+                continue
+            errors.append(None)
+            texts.append((title, "\n".join(text)) if text is not None else None)
+
+    # per manifest, the text of the pages it got written for this build
+    indexed: dict[Manifest, dict[str, PageText]] = {m: {} for m in manifests}
+    for (_, _, source, out_rel, deps, stale), error, page_text, images_used in zip(
+        pending, errors, texts, used
+    ):
+        for _, _, manifest, page_hash in stale:
+            if error is None:
+                manifest.record(source, out_rel, page_hash, deps, images_used)
+                if page_text is not None:
+                    indexed[manifest][out_rel] = page_text
+            else:
+                manifest.pages.pop(source, None)
+
+    for manifest in manifests:
+        for removed in manifest.prune(live):
+            print(f"Removed stale page {removed}")
+        manifest.save()
+
+    if search:
+        from search import SearchIndex
+
+        # built from the text collected while rendering, nothing is parsed
+        # again; pages that were fresh keep their postings
+        for (basepath, docs_dir), manifest in zip(targets, manifests):
+            index = SearchIndex.load(docs_dir, basepath)
+            live_outputs = {entry["output"] for entry in manifest.pages.values()}
+            index.update(live_outputs, indexed[manifest])
+            index.save()
+
+    failed = [md_path for (md_path, *_), error in zip(pending, errors) if error]
+    failed = sorted(unrendered + failed)
+    if failed:
+        raise Exception(f"failed to generate {len(failed)} page(s), first: {failed[0]}")
+
+
+def generate_site(
+    content_dir: Path,
+    template_path: Path,
+    docs_dir: Path,
+    basepath: str,
+    incremental: bool = False,
+    jobs: int = 1,
+    minify: bool = False,
+    search: bool = False,
+):
+    generate_sites(
+        content_dir,
+        template_path,
+        [(basepath, docs_dir)],
+        incremental,
+        jobs,
+        minify,
+        search,
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the static site.")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument(
+        "--target",
+        dest="targets",
+        action="append",
+        default=[],
+        metavar="BASEPATH=DIR",
+        help="also write the site to DIR for BASEPATH, may be repeated; every "
+        "page is still parsed and rendered once",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only regenerate pages whose inputs changed",
+    )
+    parser.add_argument(
+        "--static-mode",
+        choices=MODES,
+        default="copy",
+        help="how changed static files are put into docs/ (default copy)",
+    )
+    parser.add_argument(
+        "--checksum",
+        action="store_true",
+        help="compare static file contents when size matches but mtime differs",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes, 0 means one per core",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        nargs="?",
+        const=Path("build-trace.json"),
+        metavar="TRACE",
+        help="time each page stage, print a summary and write a Chrome trace "
+        "(default build-trace.json)",
+    )
+    parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="collapse whitespace in generated pages, <pre> and friends excepted",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="write .gz (and .br if brotli is installed) next to text outputs",
+    )
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        help="write a prefix-sharded full-text search index to docs/search/",
+    )
+    parser.add_argument(
+        "--highlight",
+        action="store_true",
+        help="highlight fenced code blocks by the language after the fence",
+    )
+    parser.add_argument(
+        "--highlight-cache-dir",
+        type=Path,
+        metavar="DIR",
+        help="where highlighted code is kept between builds (default .highlight-cache)",
+    )
+    parser.add_argument(
+        "--no-image-sizes",
+        dest="image_sizes",
+        action="store_false",
+        help="do not read static/ image headers for width/height attributes",
+    )
+    parser.add_argument(
+        "--block-cache",
+        action="store_true",
+        help="render identical markdown blocks once; pays off when many blocks "
+        "repeat across pages, otherwise every block costs a little more",
+    )
+    parser.add_argument(
+        "--block-cache-dir",
+        type=Path,
+        metavar="DIR",
+        help="keep rendered blocks in DIR so later builds can reuse them, "
+        "implies --block-cache",
+    )
+    parser.add_argument(
+        "--block-cache-size",
+        type=int,
+        default=64,
+        metavar="MB",
+        help="in-memory block cache bound per process (default 64)",
+    )
+    parser.add_argument(
+        "--block-cache-disk-size",
+        type=int,
+        default=512,
+        metavar="MB",
+        help="trim DIR to this size after a build (default 512)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="after building, rebuild changed pages and static files",
+    )
+    parser.add_argument(
+        "--serve",
+        type=int,
+        metavar="PORT",
+        help="serve docs/ with live reload on PORT, implies --watch",
+    )
+    parser.add_argument(
+        "--render-server",
+        type=int,
+        metavar="PORT",
+        help="build nothing, serve content/ and static/ on PORT and render each "
+        "page when it is first asked for",
+    )
+    parser.add_argument(
+        "--page-cache-size",
+        type=int,
+        default=64,
+        metavar="MB",
+        help="rendered pages kept by --render-server (default 64)",
+    )
+
+    args = parser.parse_args(argv)
+    if not args.basepath.startswith("/"):
+        args.basepath = "/" + args.basepath
+
+    targets = []
+    for target in args.targets:
+        basepath, sep, out_dir = target.partition("=")
+        if not sep or not out_dir:
+            parser.error(f"--target expects BASEPATH=DIR, got {target!r}")
+        if not basepath.startswith("/"):
+            basepath = "/" + basepath
+        targets.append((basepath, Path(out_dir)))
+    args.targets = targets
+    if args.jobs <= 0:
+        args.jobs = os.cpu_count() or 1
+    if args.serve is not None:
+        args.watch = True
+    if args.block_cache_dir is not None:
+        args.block_cache = True
+
+    return args
+
+
+def _report_caches(
+    cache: blockcache.BlockCache | None, highlighter: highlight.Highlighter | None
+) -> None:
+    if cache is not None:
+        print(cache.summary())
+        cache.trim_disk()
+    if highlighter is not None:
+        print(highlighter.summary())
+        highlighter.cache.trim_disk()
+
+
+def main(args: argparse.Namespace) -> None:
     here = Path(__file__).resolve().parent
     project_root = here.parent
 
@@ -67,17 +488,112 @@ def main(basepath):
     template_path = project_root / "template.html"
     docs_dir = project_root / "docs"
 
-    gen_docs(project_root)
-    generate_site(content_dir, template_path, docs_dir, basepath)
+    # the render server renders with the same caches and image sizes as a
+    # build, or its pages would differ from the built ones
+    cache = (
+        blockcache.enable(
+            args.block_cache_size << 20,
+            args.block_cache_dir,
+            args.block_cache_disk_size << 20,
+        )
+        if args.block_cache
+        else None
+    )
+    # highlighting dwarfs the rest of the parse and the same samples recur
+    # across pages, so its output is always kept on disk
+    highlighter = (
+        highlight.enable(args.highlight_cache_dir or project_root / ".highlight-cache")
+        if args.highlight
+        else None
+    )
+    if args.image_sizes:
+        imagemeta.enable(
+            imagemeta.load(project_root / "static", docs_dir / IMAGE_META_NAME)
+        )
 
+    if args.render_server is not None:
+        import server
 
-if __name__ == "__main__":
-    if (len(sys.argv) <= 1) or (type(sys.argv[1]) is not str):
-        basepath = "/"
-    else:
-        basepath = sys.argv[1]
+        page_cache = server.PageCache(args.page_cache_size << 20)
+        httpd = server.serve(
+            content_dir,
+            project_root / "static",
+            template_path,
+            args.render_server,
+            args.basepath,
+            page_cache,
+        )
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            print(page_cache.summary())
+            _report_caches(cache, highlighter)
+        return
 
-    if not basepath.startswith("/"):
-        basepath = "/" + basepath
+    profiler = profiling.enable() if args.profile is not None else None
+    try:
+        site_targets = [(args.basepath, docs_dir), *args.targets]
+        for _, out_dir in site_targets:
+            gen_docs(project_root, args.static_mode, args.checksum, out_dir)
+        generate_sites(
+            content_dir,
+            template_path,
+            site_targets,
+            args.incremental,
+            args.jobs,
+            args.minify,
+            args.search,
+        )
+        for _, out_dir in site_targets:
+            manifest = Manifest.load(out_dir)
+            if args.compress:
+                from postprocess import compress_tree
 
-    main(basepath)
+                result = compress_tree(out_dir, args.jobs, set(manifest.static))
+                print(
+                    f"Compressed {out_dir}: {result.compressed} compressed, "
+                    f"{result.unchanged} unchanged, {result.removed} removed"
+                )
+
+            # deploy tooling uploads what is listed here instead of the tree
+            delta = manifest.scan_outputs()
+            delta.save(out_dir)
+            manifest.save()
+            print(
+                f"Deploy delta for {out_dir}: {len(delta.added)} added, "
+                f"{len(delta.changed)} changed, {len(delta.deleted)} deleted"
+            )
+    finally:
+        _report_caches(cache, highlighter)
+        if profiler is not None:
+            profiling.disable()
+            print(profiler.summary())
+            profiler.write_trace(args.profile)
+            print(f"Wrote trace to {args.profile}")
+
+    if args.watch:
+        import watch
+
+        watch.watch(
+            content_dir,
+            project_root / "static",
+            template_path,
+            docs_dir,
+            args.basepath,
+            args.serve,
+            args.static_mode,
+            args.minify,
+            args.search,
+        )
+
+
+def cli(argv: list[str] | None = None) -> None:
+    main(parse_args(argv))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,190 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable
+
+MANIFEST_NAME = ".build-manifest.json"
+DELTA_NAME = ".deploy-delta.json"
+IMAGE_META_NAME = ".image-meta.json"
+MANIFEST_VERSION = 1
+
+# state the generator keeps in out_dir; everything else there, dotfiles like
+# .nojekyll included, is part of the site
+_GENERATOR_FILES = frozenset(
+    {MANIFEST_NAME, DELTA_NAME, IMAGE_META_NAME, "search/.state.json"}
+)
+
+
+def digest(*parts: bytes | str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        # length prefix so ("ab", "c") and ("a", "bc") hash differently
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()
+
+
+def is_generator_file(rel: str) -> bool:
+    return rel in _GENERATOR_FILES or rel.endswith(".tmp")
+
+
+def file_digest(path: Path) -> str:
+    # hashed in chunks so huge sources never have to fit in memory
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Delta:
+    def __init__(self) -> None:
+        self.added: dict[str, str] = {}
+        self.changed: dict[str, str] = {}
+        self.deleted: list[str] = []
+        self.unchanged = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"Delta({len(self.added)} added, {len(self.changed)} changed, "
+            f"{len(self.deleted)} deleted, {self.unchanged} unchanged)"
+        )
+
+    def save(self, out_dir: Path) -> None:
+        data = {"added": self.added, "changed": self.changed, "deleted": self.deleted}
+        (out_dir / DELTA_NAME).write_text(
+            json.dumps(data, indent=1, sort_keys=True), encoding="utf-8"
+        )
+
+
+class Manifest:
+    def __init__(
+        self,
+        out_dir: Path,
+        pages: dict[str, dict] | None = None,
+        static: list[str] | None = None,
+        outputs: dict[str, list] | None = None,
+    ):
+        self.out_dir = out_dir
+        self.pages = pages if pages is not None else {}
+        self.static = static if static is not None else []
+        # every file in out_dir as of the last build: [size, mtime_ns, sha256]
+        self.outputs = outputs if outputs is not None else {}
+
+    @property
+    def path(self) -> Path:
+        return self.out_dir / MANIFEST_NAME
+
+    @classmethod
+    def load(cls, out_dir: Path) -> Manifest:
+        try:
+            data = json.loads((out_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return cls(out_dir)
+
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            return cls(out_dir)
+
+        return cls(
+            out_dir,
+            data.get("pages", {}),
+            data.get("static", []),
+            data.get("outputs", {}),
+        )
+
+    def is_fresh(
+        self,
+        source: str,
+        page_digest: str,
+        images_current: Callable[[dict[str, list[int]]], bool] | None = None,
+    ) -> bool:
+        entry = self.pages.get(source)
+        if entry is None or entry["hash"] != page_digest:
+            return False
+        images = entry.get("images")
+        if images and (images_current is None or not images_current(images)):
+            return False
+
+        return (self.out_dir / entry["output"]).exists()
+
+    def record(
+        self,
+        source: str,
+        output: str,
+        page_digest: str,
+        deps: list[str] | None = None,
+        images: dict[str, list[int]] | None = None,
+    ) -> None:
+        entry: dict = {"output": output, "hash": page_digest}
+        if deps is not None:
+            # layout and partials, relative to the site root
+            entry["deps"] = deps
+        if images:
+            # static/ image urls the page used and the sizes they had
+            entry["images"] = images
+        self.pages[source] = entry
+
+    def dependents(self, dep: str) -> list[str]:
+        return sorted(
+            source
+            for source, entry in self.pages.items()
+            if dep in entry.get("deps", ())
+        )
+
+    def prune(self, live: set[str]) -> list[Path]:
+        removed = []
+        for source in sorted(set(self.pages) - live):
+            out_path = self.out_dir / self.pages.pop(source)["output"]
+            if out_path.exists():
+                out_path.unlink()
+                removed.append(out_path)
+
+        return removed
+
+    def scan_outputs(self) -> Delta:
+        # what changed in out_dir since the last scan; a file whose size and
+        # mtime match its record is not read again, which holds for nearly
+        # everything now that unchanged outputs are never rewritten
+        delta = Delta()
+        outputs: dict[str, list] = {}
+        for root, _, names in os.walk(self.out_dir):
+            for name in names:
+                path = Path(root, name)
+                rel = path.relative_to(self.out_dir).as_posix()
+                if is_generator_file(rel):
+                    continue
+                stat = path.stat()
+                old = self.outputs.get(rel)
+                if old is not None and old[:2] == [stat.st_size, stat.st_mtime_ns]:
+                    outputs[rel] = old
+                    delta.unchanged += 1
+                    continue
+
+                h = file_digest(path)
+                outputs[rel] = [stat.st_size, stat.st_mtime_ns, h]
+                if old is None:
+                    delta.added[rel] = h
+                elif old[2] != h:
+                    delta.changed[rel] = h
+                else:
+                    delta.unchanged += 1
+
+        delta.deleted = sorted(set(self.outputs) - set(outputs))
+        self.outputs = outputs
+        return delta
+
+    def save(self) -> None:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "pages": self.pages,
+            "static": sorted(self.static),
+            "outputs": self.outputs,
+        }
+        self.path.write_text(
+            json.dumps(data, indent=1, sort_keys=True), encoding="utf-8"
+        )
@@ -0,0 +1,393 @@
+import filecmp
+import io
+import itertools
+import os
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+import blockcache
+import highlight
+import imagemeta
+from imagemeta import ImageDeps
+from manifest import digest, file_digest
+import profiling
+from block import BlockType
+from parser import (
+    PARSER_VERSION,
+    collect_definitions,
+    markdown_to_html_node,
+    read_front_matter,
+    render_blocks_to,
+    scan_blocks,
+)
+from template import Template, Value, Writer, load_template
+from urls import BASEPATH_MARKER, UrlRewriter, basepath_rewriter
+
+# building one page, shared by full builds, watch rebuilds and the render
+# server; main.py is the command line around it
+
+# sources bigger than this are converted block by block straight into the
+# output file instead of being read, parsed and rendered as a whole
+STREAM_THRESHOLD = 8 << 20
+# bump whenever a page's html changes for reasons outside the parser; with
+# PARSER_VERSION it is part of every page digest, so an upgraded generator
+# rebuilds pages that --incremental would otherwise keep
+GENERATOR_VERSION = "1"
+
+
+def _title(meta: dict[str, str]) -> str:
+    title = meta.get("title")
+    if not title:
+        raise Exception("no header no bueno >:(")  # )
+
+    return title
+
+
+def extract_title(markdown: str) -> str:
+    # scans only up to the front matter's title or the first h1
+    meta: dict[str, str] = {}
+    for _ in scan_blocks(markdown, meta=meta):
+        if "title" in meta:
+            break
+
+    return _title(meta)
+
+
+def page_values(meta: dict[str, str], content: Value) -> dict[str, Value]:
+    # every front matter key is a slot of its own name, {{ author }} and the
+    # like; Title, Date and Tags are always there for templates to rely on
+    values: dict[str, Value] = dict(meta)
+    tags = [tag.strip() for tag in meta.get("tags", "").strip("[]").split(",")]
+    values.update(
+        Title=_title(meta),
+        Date=meta.get("date", ""),
+        Tags=", ".join(tag for tag in tags if tag),
+        Content=content,
+    )
+    return values
+
+
+# (basepath, output path) of one rendered copy of a page or of the site
+Target = tuple[str, Path]
+
+
+class _TargetsWriter:
+    def __init__(self, outs: list[tuple[str, Writer]]) -> None:
+        self.outs = outs
+
+    def write(self, chunk: str) -> None:
+        if BASEPATH_MARKER in chunk:
+            for basepath, out in self.outs:
+                out.write(chunk.replace(BASEPATH_MARKER, basepath))
+        else:
+            for _, out in self.outs:
+                out.write(chunk)
+
+
+def _rewriter(targets: Sequence[Target]) -> UrlRewriter:
+    # one target is rendered with its basepath; for several, urls are rendered
+    # with a marker that each output swaps for its own basepath, so a page is
+    # parsed and rendered once however many copies of it are written
+    if len(targets) == 1:
+        return basepath_rewriter(targets[0][0])
+    return basepath_rewriter(BASEPATH_MARKER)
+
+
+def _replace_if_changed(tmp: Path, dest: Path) -> bool:
+    try:
+        same = filecmp.cmp(tmp, dest, shallow=False)
+    except FileNotFoundError:
+        same = False
+
+    if same:
+        tmp.unlink()
+        return False
+    os.replace(tmp, dest)
+    return True
+
+
+@contextmanager
+def _open_targets(targets: Sequence[Target], minify: bool = False) -> Iterator[Writer]:
+    # every copy is written next to its destination and only moved over it
+    # when the bytes differ, so unchanged pages keep their mtime (and are not
+    # uploaded again) and an interrupted build never leaves half a page
+    tmps = [dest.with_name(dest.name + ".tmp") for _, dest in targets]
+    try:
+        with ExitStack() as stack:
+            outs: list[tuple[str, Writer]] = []
+            for (basepath, _), tmp in zip(targets, tmps):
+                tmp.parent.mkdir(parents=True, exist_ok=True)
+                outs.append(
+                    (basepath, stack.enter_context(tmp.open("w", encoding="utf-8")))
+                )
+
+            out = outs[0][1] if len(outs) == 1 else _TargetsWriter(outs)
+            if not minify:
+                yield out
+            else:
+                from postprocess import MinifyWriter
+
+                # minified on the way out, once for all targets; the page
+                # is never held whole
+                minifier = MinifyWriter(out)
+                yield minifier
+                minifier.close()
+
+        for (_, dest), tmp in zip(targets, tmps):
+            _replace_if_changed(tmp, dest)
+    except BaseException:
+        for tmp in tmps:
+            tmp.unlink(missing_ok=True)
+        raise
+
+
+def _page_values(
+    content: str,
+    rewrite_url: UrlRewriter,
+    page: str = "",
+    text: list[str] | None = None,
+    images_used: ImageDeps | None = None,
+) -> tuple[str, dict[str, Value]]:
+    # NUL is the basepath marker, keep it out of the rendered text
+    content = content.replace(BASEPATH_MARKER, "\ufffd")
+    # front matter and title are picked up by the same scan that renders
+    meta: dict[str, str] = {}
+    with profiling.stage("markdown_to_html_node", page):
+        node = markdown_to_html_node(
+            content,
+            blockcache.active(),
+            rewrite_url,
+            imagemeta.page_images(images_used),
+            text,
+            meta,
+            highlight.active(),
+        )
+
+    values = page_values(meta, node)
+    return meta["title"], values
+
+
+def render_page(content: str, template: Template, basepath: str, page: str = "") -> str:
+    rewrite_url = basepath_rewriter(basepath)
+    _, values = _page_values(content, rewrite_url, page)
+    out = io.StringIO()
+    template.render_to(out, values, rewrite_url)
+    return out.getvalue()
+
+
+def write_page(
+    content: str,
+    template: Template,
+    targets: Sequence[Target],
+    page: str = "",
+    minify: bool = False,
+    text: list[str] | None = None,
+    images_used: ImageDeps | None = None,
+) -> str:
+    rewrite_url = _rewriter(targets)
+    title, values = _page_values(content, rewrite_url, page, text, images_used)
+
+    profiler = profiling.active()
+    if profiler is None:
+        with _open_targets(targets, minify) as f:
+            template.render_to(f, values, rewrite_url)
+        return title
+
+    # rendering streams into the files, so writes are timed as they happen and
+    # the trace shows them as one block after the rendering they interleave with
+    start = time.perf_counter_ns()
+    with _open_targets(targets, minify) as f:
+        writer = profiling.TimedWriter(f)
+        template.render_to(writer, values, rewrite_url)
+        close_start = time.perf_counter_ns()
+    end = time.perf_counter_ns()
+
+    written = writer.elapsed + end - close_start
+    profiler.add("render", page, start, end - start - written)
+    profiler.add("write", page, end - written, written)
+    return title
+
+
+class _StreamedContent:
+    def __init__(
+        self,
+        blocks: Iterable[tuple[str, BlockType]],
+        refs: dict[str, str],
+        rewrite_url: UrlRewriter,
+        text: list[str] | None,
+        images_used: ImageDeps | None,
+    ) -> None:
+        self.blocks = blocks
+        self.refs = refs
+        self.rewrite_url = rewrite_url
+        self.text = text
+        self.images_used = images_used
+
+    def render_to(self, writer: Writer) -> None:
+        render_blocks_to(
+            self.blocks,
+            writer,
+            self.refs,
+            blockcache.active(),
+            self.rewrite_url,
+            imagemeta.page_images(self.images_used),
+            self.text,
+            highlight.active(),
+        )
+
+
+def _unmarked(lines: Iterable[str]) -> Iterator[str]:
+    # NUL is the basepath marker, keep it out of the rendered text
+    return (line.replace(BASEPATH_MARKER, "\ufffd") for line in lines)
+
+
+def stream_page(
+    from_path: Path,
+    template: Template,
+    targets: Sequence[Target],
+    minify: bool = False,
+    text: list[str] | None = None,
+    images_used: ImageDeps | None = None,
+) -> str:
+    with from_path.open(encoding="utf-8") as src:
+        # definitions may come after the links that use them; like
+        # markdown_to_html_node() they are all collected first, by a pass
+        # that converts nothing
+        refs = collect_definitions(_unmarked(src))
+        src.seek(0)
+        meta: dict[str, str] = {}
+        blocks = scan_blocks(_unmarked(src), refs, meta)
+        # the title has to be known before the page starts streaming: the
+        # front matter's, else the first h1, the blocks before it held back
+        head = []
+        while "title" not in meta and (block := next(blocks, None)) is not None:
+            head.append(block)
+
+        rewrite_url = _rewriter(targets)
+        content = _StreamedContent(
+            itertools.chain(head, blocks), refs, rewrite_url, text, images_used
+        )
+        values = page_values(meta, content)
+        with _open_targets(targets, minify) as out:
+            template.render_to(out, values, rewrite_url)
+
+    return meta["title"]
+
+
+def build_page(
+    from_path: Path,
+    template: Template,
+    targets: Sequence[Target],
+    minify: bool = False,
+    text: list[str] | None = None,
+    images_used: ImageDeps | None = None,
+) -> str:
+    # returns the page title; with text, the page's plain text is collected
+    # into it while the page is parsed, with images_used the static/ images
+    # it looked up
+    page = str(from_path)
+    if from_path.stat().st_size > STREAM_THRESHOLD:
+        with profiling.stage("stream", page):
+            return stream_page(
+                from_path, template, targets, minify, text, images_used
+            )
+
+    with profiling.stage("read", page):
+        content = from_path.read_text(encoding="utf-8")
+    return write_page(content, template, targets, page, minify, text, images_used)
+
+
+def describe(from_path: Path, targets: Sequence[Target], template_path: Path) -> str:
+    dests = ", ".join(str(dest) for _, dest in targets)
+    return f"Generating page from {from_path} to {dests} using {template_path}"
+
+
+def generate_page(
+    from_path: Path,
+    template_path: Path,
+    targets: Sequence[Target],
+    partials_dir: Path | None = None,
+    minify: bool = False,
+    text: list[str] | None = None,
+    images_used: ImageDeps | None = None,
+) -> str:
+    print(describe(from_path, targets, template_path))
+    template = load_template(template_path, partials_dir)
+    return build_page(from_path, template, targets, minify, text, images_used)
+
+
+def warm_up() -> None:
+    # the parser's regexes live in the re module cache, fill it before the
+    # first real page so its time is not spent compiling them
+    markdown_to_html_node(
+        "# a\n\n- b\n\n1. c\n\n> d\n\n```\ne\n```\n\n**f** _g_ `h` ![i](j) [k](l)"
+    ).to_html()
+
+
+def select_layout(rel: Path, template_path: Path, name: str | None = None) -> Path:
+    # a page's "layout: name" picks layouts/name.html; otherwise
+    # content/a/b/x.md renders with layouts/a/b.html, else layouts/a.html,
+    # else the site template
+    layouts = template_path.parent / "layouts"
+    if name:
+        layout = layouts / f"{name}.html"
+        if ".." in Path(name).parts or not layout.is_file():
+            raise Exception(f"{rel}: no layout {name!r} in {layouts}")
+        return layout
+
+    section = rel.parent
+    while section.parts:
+        layout = layouts / section.parent / f"{section.name}.html"
+        if layout.exists():
+            return layout
+        section = section.parent
+
+    return template_path
+
+
+def page_layout(md_path: Path, rel: Path, template_path: Path) -> Path:
+    # only the front matter is read, not the page
+    with md_path.open(encoding="utf-8") as f:
+        meta = read_front_matter(f)
+
+    return select_layout(rel, template_path, meta.get("layout"))
+
+
+def layout_dependencies(
+    layout: Path, partials_dir: Path, digests: dict[Path, str]
+) -> tuple[str, list[Path]]:
+    # the files a page's html depends on besides its source, and one digest
+    # over them; digests is shared across pages so each file is hashed once
+    files = [layout, *load_template(layout, partials_dir).dependencies]
+    for path in files:
+        if path not in digests:
+            digests[path] = file_digest(path)
+
+    return digest(*(digests[path] for path in files)), files
+
+
+def page_digest(
+    source_digest: str,
+    template_digest: str,
+    basepath: str,
+    minify: bool = False,
+    search: bool = False,
+) -> str:
+    # everything a page's html depends on; full builds and watch rebuilds
+    # both record this, so either sees the other's pages as fresh
+    options: tuple[str, ...] = (GENERATOR_VERSION, PARSER_VERSION)
+    # minified and plain pages differ, switching --minify rebuilds everything
+    if minify:
+        options += ("minify",)
+    # the index is only complete if every page went through an indexing build
+    if search:
+        options += ("search",)
+    # the sizes themselves are checked per page, against only the images the
+    # page used (see Manifest.is_fresh)
+    if imagemeta.active() is not None:
+        options += ("images",)
+    if (highlighter := highlight.active()) is not None:
+        options += (highlighter.key,)
+
+    return digest(source_digest, template_digest, basepath, *options)
@@ -1,34 +1,44 @@
+from __future__ import annotations
+import itertools
+import json
 import re
+from typing import TYPE_CHECKING, Iterable, Iterator
 from block import BlockType
-from htmlnode import LeafNode, ParentNode
+from htmlnode import HTMLNode, LeafNode, ParentNode, Writer
 from textnode import TextNode, TextType, text_node_to_html_node
 
+if TYPE_CHECKING:
+    from blockcache import BlockCache
+    from highlight import Highlighter
+    from imagemeta import ImageDeps, PageImages
+    from urls import UrlRewriter
+
+# bump whenever the HTML produced for a block changes, cached fragments
+# from older versions are then never looked up again
+PARSER_VERSION = "6"
+
 
 def _split_node_delimiter(
     old_node: TextNode, delimiter: str, text_type: TextType
 ) -> list[TextNode]:
-    nodes = []
-    sp = old_node.text.split(delimiter, 1)
+    parts = old_node.text.split(delimiter)
 
-    if len(sp) <= 1:
+    if len(parts) == 1:
         if not old_node.text:
             return []
         return [old_node]
 
-    nodes.append(TextNode(sp[0], TextType.TEXT))
-    rest = sp[1]
-
-    rest_sp = rest.split(delimiter, 1)
-
-    if len(rest_sp) <= 1:
+    if len(parts) % 2 == 0:
         raise Exception(f"unmatched delimiter found in {old_node.text}")
 
-    nodes.append(TextNode(rest_sp[0], text_type))
-    right = TextNode(rest_sp[1], TextType.TEXT)
+    nodes = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            nodes.append(TextNode(part, text_type))
+        elif part:
+            nodes.append(TextNode(part, TextType.TEXT))
 
-    return [
-        node for node in nodes if node.text_type != TextType.TEXT or node.text
-    ] + _split_node_delimiter(right, delimiter, text_type)
+    return nodes
 
 
 def split_nodes_delimiter(
@@ -44,39 +54,39 @@ def split_nodes_delimiter(
     return res
 
 
+_IMAGE_RE = re.compile(r"!\[(.*?)\]\((.*?)\)")
+_LINK_RE = re.compile(r"(?<!!)\[(.*?)\]\((.*?)\)")
+
+
 def extract_markdown_images(text: str) -> list[tuple[str, str]]:
-    return re.findall(r"!\[(.*?)\]\((.*?)\)", text)
+    return _IMAGE_RE.findall(text)
 
 
 def extract_markdown_links(text: str) -> list[tuple[str, str]]:
-    return re.findall(r"(?<!!)\[(.*?)\]\((.*?)\)", text)
+    return _LINK_RE.findall(text)
 
 
 def _split_node_image_link(node: TextNode, image: bool) -> list[TextNode]:
-    nodes = []
-    cur = node
     if image:
-        metas = extract_markdown_images(node.text)
+        pattern, text_type = _IMAGE_RE, TextType.IMAGE
     else:
-        metas = extract_markdown_links(node.text)
-
-    for meta in metas:
-        if image:
-            rest = cur.text.split(f"![{meta[0]}]({meta[1]})")
-        else:
-            rest = cur.text.split(f"[{meta[0]}]({meta[1]})")
-
-        nodes.append(TextNode(rest[0], TextType.TEXT))
-        if image:
-            nodes.append(TextNode(meta[0], TextType.IMAGE, meta[1]))
-        else:
-            nodes.append(TextNode(meta[0], TextType.LINK, meta[1]))
-        right = TextNode(rest[1], TextType.TEXT)
+        pattern, text_type = _LINK_RE, TextType.LINK
 
-        cur = right
-    nodes.append(cur)
+    nodes = []
+    text = node.text
+    last = 0
+    for match in pattern.finditer(text):
+        if match.start() > last:
+            nodes.append(TextNode(text[last : match.start()], TextType.TEXT))
+        nodes.append(TextNode(match.group(1), text_type, match.group(2)))
+        last = match.end()
+
+    if last == 0:
+        return [node] if text else []
+    if last < len(text):
+        nodes.append(TextNode(text[last:], TextType.TEXT))
 
-    return [node for node in nodes if node.text_type != TextType.TEXT or node.text]
+    return nodes
 
 
 def split_nodes_image(old_nodes: list[TextNode]) -> list[TextNode]:
@@ -101,70 +111,404 @@ def split_nodes_link(old_nodes: list[TextNode]) -> list[TextNode]:
     return res
 
 
-def text_to_text_nodes(text: str) -> list[TextNode]:
-    nodes = [TextNode(text, TextType.TEXT, None)]
-    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
-    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
-    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
+_INLINE_TOKEN_RE = re.compile(r"\*\*|[_`]|!?\[")
+# link text may hold one level of balanced brackets, as in [a [b] c](u)
+_LINK_TEXT = r"([^\[\]]*(?:\[[^\[\]]*\][^\[\]]*)*)"
+_INLINE_IMAGE_RE = re.compile(r"!\[" + _LINK_TEXT + r"\]\(([^()]*)\)")
+_INLINE_LINK_RE = re.compile(r"\[" + _LINK_TEXT + r"\]\(([^()]*)\)")
+# [text][label], [text][] and [text], resolved against the document's definitions
+_INLINE_REF_RE = re.compile(r"!?\[([^\[\]]*)\](?:\[([^\[\]]*)\])?")
+_REF_DEF_RE = re.compile(
+    r" {0,3}\[([^\[\]]*\S[^\[\]]*)\]:[ \t]*(<[^<>]*>|\S+)"
+    r"""(?:[ \t]+(?:"[^"]*"|'[^']*'|\([^()]*\)))?[ \t]*$"""
+)
+_INLINE_DELIMITERS = {
+    "**": TextType.BOLD,
+    "_": TextType.ITALIC,
+    "`": TextType.CODE,
+}
 
-    return nodes
 
+def normalize_label(label: str) -> str:
+    return " ".join(label.split()).casefold()
 
-def markdown_to_blocks(markdown: str) -> list[str]:
-    return [
-        x for x in map(lambda x: x.strip(), re.split(r"\n\s*?\n", markdown)) if x != ""
-    ]
 
+def _match_reference(
+    text: str, start: int, refs: dict[str, str]
+) -> tuple[re.Match[str], str] | None:
+    match = _INLINE_REF_RE.match(text, start)
+    if match is None:
+        return None
 
-def block_to_block_type(block: str) -> BlockType:
-    re_heading = re.compile(r"^#{1,6} .*$", re.DOTALL)
-    re_code = re.compile(r"^```.*```$", re.DOTALL)
-    re_quote = re.compile(r"^(?:>.*?\n)*(?:>.*?)$")
-    re_unordered_list = re.compile(r"^(?:- .*?\n)*(?:- .*?)$")
-    re_ordered_list = re.compile(r"^(?:\d\. .*?\n)*(?:\d\. .*?)$")
+    label = match.group(2) or match.group(1)
+    url = refs.get(normalize_label(label))
+    if url is None:
+        return None
+
+    return match, url
+
+
+def text_to_text_nodes(
+    text: str, refs: dict[str, str] | None = None
+) -> list[TextNode]:
+    # one left-to-right pass: jump from token to token, the span between the
+    # last consumed token and the next one is plain text
+    nodes = []
+    plain_start = 0
+    pos = 0
+    search = _INLINE_TOKEN_RE.search
+
+    while (token_match := search(text, pos)) is not None:
+        token = token_match.group()
+        start = token_match.start()
+
+        if token[-1] == "[":
+            if token == "![":
+                match = _INLINE_IMAGE_RE.match(text, start)
+                text_type = TextType.IMAGE
+            else:
+                match = _INLINE_LINK_RE.match(text, start)
+                text_type = TextType.LINK
+
+            if match is not None:
+                url = match.group(2)
+            elif refs and (ref := _match_reference(text, start, refs)) is not None:
+                match, url = ref
+            else:
+                pos = start + len(token)
+                continue
+
+            if start > plain_start:
+                nodes.append(TextNode(text[plain_start:start], TextType.TEXT))
+            nodes.append(TextNode(match.group(1), text_type, url))
+            plain_start = pos = match.end()
+        else:
+            inner_start = start + len(token)
+            end = text.find(token, inner_start)
+            if end == -1:
+                raise Exception(f"unmatched delimiter found in {text}")
+
+            if start > plain_start:
+                nodes.append(TextNode(text[plain_start:start], TextType.TEXT))
+            nodes.append(TextNode(text[inner_start:end], _INLINE_DELIMITERS[token]))
+            plain_start = pos = end + len(token)
 
-    if re_heading.match(block):
+    if plain_start < len(text):
+        nodes.append(TextNode(text[plain_start:], TextType.TEXT))
+
+    return nodes
+
+
+def _iter_lines(text: str) -> Iterator[str]:
+    start = 0
+    find = text.find
+    while (end := find("\n", start)) != -1:
+        yield text[start:end]
+        start = end + 1
+    yield text[start:]
+
+
+def _classify_lines(lines: list[str], block: str) -> BlockType:
+    first = lines[0]
+    level = len(first) - len(first.lstrip("#"))
+    if 1 <= level <= 6 and first[level : level + 1] == " ":
         return BlockType.HEADING
-    elif re_code.match(block):
+    elif len(block) >= 6 and block.startswith("```") and block.endswith("```"):
         return BlockType.CODE
-    elif re_quote.match(block):
+    elif all(line.startswith(">") for line in lines):
         return BlockType.QUOTE
-    elif re_unordered_list.match(block):
+    elif all(line.startswith("- ") for line in lines):
         return BlockType.UNORDERED_LIST
-    elif re_ordered_list.match(block):
+    elif all(line[:1].isdecimal() and line[1:3] == ". " for line in lines):
         return BlockType.ORDERED_LIST
     else:
         return BlockType.PARAGRAPH
 
 
-def conv_heading_to_div(md: str) -> ParentNode:
+def _take_definitions(lines: list[str], refs: dict[str, str]) -> list[str]:
+    taken = 0
+    for line in lines:
+        match = _REF_DEF_RE.match(line)
+        if match is None:
+            break
+        url = match.group(2)
+        if url.startswith("<"):
+            url = url[1:-1]
+        # the first definition of a label wins, like CommonMark
+        refs.setdefault(normalize_label(match.group(1)), url)
+        taken += 1
+
+    return lines[taken:] if taken else lines
+
+
+def _finish_block(
+    lines: list[str], refs: dict[str, str] | None = None
+) -> tuple[str, BlockType] | None:
+    if refs is not None and lines[0].lstrip().startswith("["):
+        lines = _take_definitions(lines, refs)
+        if not lines:
+            return None
+
+    lines[0] = lines[0].lstrip()
+    lines[-1] = lines[-1].rstrip()
+    block = "\n".join(lines)
+
+    return block, _classify_lines(lines, block)
+
+
+def _scan_lines(
+    lines: Iterable[str], fences: bool, refs: dict[str, str] | None
+) -> Iterator[tuple[str, BlockType]]:
+    block_lines: list[str] = []
+    in_fence = False
+
+    for line in lines:
+        if line.endswith("\n"):
+            line = line[:-1]
+
+        if in_fence:
+            block_lines.append(line)
+            if line.rstrip().endswith("```"):
+                in_fence = False
+                yield _finish_block(block_lines)
+                block_lines = []
+            continue
+
+        if not line.strip():
+            if block_lines:
+                if (finished := _finish_block(block_lines, refs)) is not None:
+                    yield finished
+                block_lines = []
+            continue
+
+        if fences and not block_lines:
+            opening = line.strip()
+            in_fence = opening.startswith("```") and not (
+                len(opening) >= 6 and opening.endswith("```")
+            )
+
+        block_lines.append(line)
+
+    if in_fence:
+        # a fence that runs to the end can't be closed by any later fence
+        # either, so the rest is split on blank lines like any other text
+        yield from _scan_lines(block_lines, False, refs)
+    elif block_lines:
+        if (finished := _finish_block(block_lines, refs)) is not None:
+            yield finished
+
+
+_FRONT_MATTER_FENCE = "---"
+_FRONT_MATTER_RE = re.compile(r"([A-Za-z_][\w-]*)[ \t]*:[ \t]*(.*?)[ \t]*$")
+
+
+def _take_front_matter(lines: Iterator[str], meta: dict[str, str]) -> Iterator[str]:
+    # "---", key: value lines, "---"; anything else and nothing was front
+    # matter, the lines read so far go back in front of the rest
+    first = next(lines, None)
+    if first is None:
+        return lines
+    if first.rstrip() != _FRONT_MATTER_FENCE:
+        return itertools.chain([first], lines)
+
+    taken = [first]
+    found = {}
+    for line in lines:
+        taken.append(line)
+        if line.rstrip() == _FRONT_MATTER_FENCE:
+            meta.update(found)
+            return lines
+        if not line.strip():
+            continue
+        match = _FRONT_MATTER_RE.match(line.strip())
+        if match is None:
+            break
+        found[match.group(1).lower()] = match.group(2)
+
+    return itertools.chain(taken, lines)
+
+
+def read_front_matter(lines: Iterable[str]) -> dict[str, str]:
+    # stops at the closing fence, the rest of the document is never read
+    meta: dict[str, str] = {}
+    _take_front_matter(iter(lines), meta)
+    return meta
+
+
+def _note_title(
+    blocks: Iterator[tuple[str, BlockType]], meta: dict[str, str]
+) -> Iterator[tuple[str, BlockType]]:
+    if "title" not in meta:
+        for block, block_type in blocks:
+            # set before the block is handed on, a streaming caller needs the
+            # title as soon as it has the first block
+            if block_type is BlockType.HEADING and block.startswith("# "):
+                meta["title"] = block.split("\n", 1)[0][2:].strip()
+                yield block, block_type
+                break
+            yield block, block_type
+
+    yield from blocks
+
+
+def scan_blocks(
+    markdown: str | Iterable[str],
+    refs: dict[str, str] | None = None,
+    meta: dict[str, str] | None = None,
+) -> Iterator[tuple[str, BlockType]]:
+    # with refs, link reference definitions are dropped from the block stream
+    # and collected into refs instead; front matter is dropped as well, with
+    # meta it goes there, along with the first h1 as title if it has none
+    lines = iter(_iter_lines(markdown) if isinstance(markdown, str) else markdown)
+    lines = _take_front_matter(lines, meta if meta is not None else {})
+    blocks = _scan_lines(lines, True, refs)
+    return blocks if meta is None else _note_title(blocks, meta)
+
+
+_BLANK_LINES_RE = re.compile(r"\n\s*?\n")
+# a line whose last non-blank characters are ```, which closes a fence
+_FENCE_END_RE = re.compile(r"```[^\S\n]*$", re.MULTILINE)
+
+
+def collect_definitions(lines: Iterable[str]) -> dict[str, str]:
+    # the document's link reference definitions, found by the same scan that
+    # renders it but without converting a block
+    refs: dict[str, str] = {}
+    for _ in scan_blocks(lines, refs):
+        pass
+    return refs
+
+
+def _split_on_blank_lines(text: str) -> list[str]:
+    return [block for block in map(str.strip, _BLANK_LINES_RE.split(text)) if block]
+
+
+def markdown_to_blocks(markdown: str) -> list[str]:
+    # the blocks scan_blocks() yields, untyped; runs of blank lines are found
+    # by regex, only a block that opens a fence is looked at line by line
+    if markdown.startswith(_FRONT_MATTER_FENCE):
+        markdown = "\n".join(_take_front_matter(_iter_lines(markdown), {}))
+
+    blocks = []
+    pos = 0
+    end = len(markdown)
+    search = _BLANK_LINES_RE.search
+    while pos <= end:
+        fence = markdown.find("```", pos)
+        if fence == -1:
+            blocks += _split_on_blank_lines(markdown[pos:])
+            break
+        # only the block holding the next ``` can open a fence, everything
+        # before it is split in one go
+        *before, last = _BLANK_LINES_RE.split(markdown[pos:fence])
+        blocks += [block for block in map(str.strip, before) if block]
+        pos = fence - len(last)
+
+        blank = search(markdown, pos)
+        block = markdown[pos : blank.start() if blank is not None else end].strip()
+        opening = block.partition("\n")[0].rstrip()
+        if opening.startswith("```") and not (
+            len(opening) >= 6 and opening.endswith("```")
+        ):
+            line_end = markdown.find("\n", fence)
+            close = None
+            if line_end != -1:
+                close = _FENCE_END_RE.search(markdown, line_end + 1)
+            if close is None:
+                # never closed, the rest is split like text without fences
+                blocks += _split_on_blank_lines(markdown[fence:])
+                break
+            # the line after the fence starts a block, blank line or not
+            blocks.append(markdown[fence : close.end()].rstrip())
+            pos = close.end() + 1
+            continue
+
+        if block:
+            blocks.append(block)
+        pos = blank.end() if blank is not None else end + 1
+
+    return blocks
+
+
+def block_to_block_type(block: str) -> BlockType:
+    if block.endswith("\n"):
+        block = block[:-1]
+
+    return _classify_lines(block.split("\n"), block)
+
+
+def _text_to_children(
+    text: str,
+    refs: dict[str, str] | None,
+    rewrite_url: UrlRewriter | None,
+    images: PageImages | None,
+    text_out: list[str] | None,
+) -> list[HTMLNode]:
+    nodes = text_to_text_nodes(text, refs)
+    if text_out is not None:
+        text_out.append("".join(node.text for node in nodes))
+
+    return [text_node_to_html_node(node, rewrite_url, images) for node in nodes]
+
+
+def conv_heading_to_div(
+    md: str,
+    refs: dict[str, str] | None = None,
+    rewrite_url: UrlRewriter | None = None,
+    images: PageImages | None = None,
+    text_out: list[str] | None = None,
+) -> ParentNode:
     marker, text_content = md.split(" ", 1)
 
-    html_leafs = list(map(text_node_to_html_node, text_to_text_nodes(text_content)))
+    html_leafs = _text_to_children(text_content, refs, rewrite_url, images, text_out)
 
     return ParentNode(tag=f"h{len(marker)}", children=html_leafs)
 
 
-def conv_code_to_div(md: str) -> ParentNode:
-    text_content = md[3:-3]
-    if text_content.startswith("\n"):
-        text_content = text_content[1:]
-
-    code = LeafNode(tag="code", value=text_content)
+def conv_code_to_div(
+    md: str,
+    text_out: list[str] | None = None,
+    highlighter: Highlighter | None = None,
+) -> ParentNode:
+    # the rest of the opening fence's line is the info string, its first
+    # word names the language
+    info, newline, text_content = md[3:-3].partition("\n")
+    if not newline:
+        info, text_content = "", info
+    lang = info.split(maxsplit=1)[0] if info.strip() else ""
+    if text_out is not None:
+        text_out.append(text_content)
+
+    props = {"class": f"language-{lang}"} if lang else None
+    highlighted = highlighter.highlight(text_content, lang) if highlighter else None
+    if highlighted is not None:
+        text_content = highlighted
+    code = LeafNode(tag="code", value=text_content, props=props)
     return ParentNode(tag="pre", children=[code])
 
 
-def conv_quote_to_div(md: str) -> ParentNode:
+def conv_quote_to_div(
+    md: str,
+    refs: dict[str, str] | None = None,
+    rewrite_url: UrlRewriter | None = None,
+    images: PageImages | None = None,
+    text_out: list[str] | None = None,
+) -> ParentNode:
     quote_lines = md.split("\n")
     text_content = "<br>".join(map(lambda x: x[1:].strip(), quote_lines))
-    html_leafs = list(map(text_node_to_html_node, text_to_text_nodes(text_content)))
+    html_leafs = _text_to_children(text_content, refs, rewrite_url, images, text_out)
 
     return ParentNode(tag="blockquote", children=html_leafs)
 
 
-def conv_list_to_div(md: str, ordered: bool) -> ParentNode:
+def conv_list_to_div(
+    md: str,
+    ordered: bool,
+    refs: dict[str, str] | None = None,
+    rewrite_url: UrlRewriter | None = None,
+    images: PageImages | None = None,
+    text_out: list[str] | None = None,
+) -> ParentNode:
     list_lines = md.split("\n")
 
     lines_html_nodes = []
@@ -174,8 +518,8 @@ def conv_list_to_div(md: str, ordered: bool) -> ParentNode:
             text_content = line[3:]
         else:
             text_content = line[2:]
-        line_text_nodes = list(
-            map(text_node_to_html_node, text_to_text_nodes(text_content))
+        line_text_nodes = _text_to_children(
+            text_content, refs, rewrite_url, images, text_out
         )
 
         lines_html_nodes.append(ParentNode(tag="li", children=line_text_nodes))
@@ -188,39 +532,212 @@ def conv_list_to_div(md: str, ordered: bool) -> ParentNode:
     return ParentNode(tag=tag, children=lines_html_nodes)
 
 
-def conv_paragraph_to_div(md: str) -> ParentNode:
-    paragraph_text_nodes = list(
-        map(text_node_to_html_node, text_to_text_nodes(md.replace("\n", " ")))
+def conv_paragraph_to_div(
+    md: str,
+    refs: dict[str, str] | None = None,
+    rewrite_url: UrlRewriter | None = None,
+    images: PageImages | None = None,
+    text_out: list[str] | None = None,
+) -> ParentNode:
+    paragraph_text_nodes = _text_to_children(
+        md.replace("\n", " "), refs, rewrite_url, images, text_out
     )
 
     return ParentNode(tag="p", children=paragraph_text_nodes)
 
 
-def markdown_to_html_node(markdown: str) -> ParentNode:
-    blocks = list(
-        map(
-            lambda block: (block, block_to_block_type(block)),
-            markdown_to_blocks(markdown),
+def block_to_html_node(
+    block: str,
+    block_type: BlockType,
+    refs: dict[str, str] | None = None,
+    rewrite_url: UrlRewriter | None = None,
+    images: PageImages | None = None,
+    text_out: list[str] | None = None,
+    highlighter: Highlighter | None = None,
+) -> ParentNode:
+    match block_type:
+        case BlockType.HEADING:
+            return conv_heading_to_div(block, refs, rewrite_url, images, text_out)
+        case BlockType.CODE:
+            return conv_code_to_div(block, text_out, highlighter)
+        case BlockType.QUOTE:
+            return conv_quote_to_div(block, refs, rewrite_url, images, text_out)
+        case BlockType.UNORDERED_LIST:
+            return conv_list_to_div(block, False, refs, rewrite_url, images, text_out)
+        case BlockType.ORDERED_LIST:
+            return conv_list_to_div(block, True, refs, rewrite_url, images, text_out)
+        case BlockType.PARAGRAPH:
+            return conv_paragraph_to_div(block, refs, rewrite_url, images, text_out)
+        case _:
+            raise NotImplementedError("OOOOOOOOOOOOO")
+
+
+def _refs_key(refs: dict[str, str] | None) -> str:
+    if not refs:
+        return ""
+    return "\0".join(f"{label}\0{url}" for label, url in sorted(refs.items()))
+
+
+def cached_block_to_html_node(
+    block: str,
+    block_type: BlockType,
+    refs: dict[str, str] | None,
+    cache: BlockCache,
+    refs_key: str = "",
+    rewrite_url: UrlRewriter | None = None,
+    images: PageImages | None = None,
+    text_out: list[str] | None = None,
+    highlighter: Highlighter | None = None,
+) -> HTMLNode:
+    # only blocks with a bracket can contain a link or image, keep the
+    # definitions, the rewriter and the image state out of every other
+    # block's key so those stay shareable
+    block_images = images if images is not None and "![" in block else None
+    if "[" in block:
+        url_key = f"{refs_key}\0{rewrite_url.key if rewrite_url else ''}"
+        if block_images is not None:
+            url_key += f"\0{block_images.key}"
+    else:
+        url_key = ""
+    if highlighter is not None and block_type is BlockType.CODE:
+        url_key += f"\0{highlighter.key}"
+    key = cache.key(PARSER_VERSION, block_type.value, url_key, block)
+    entry = cache.get(key)
+    # entries are "<flags>:<text length>:<deps length>:<text><deps><html>",
+    # flags holding "i" when rendering the block moved the page past its
+    # first image and "t" when its text is kept, deps being the sizes the
+    # block's images resolved to; image sizes are not in the key, an entry
+    # is only used while those sizes still hold
+    deps: ImageDeps = {}
+    if entry is not None:
+        flags, _, rest = entry.partition(":")
+        text_length, _, rest = rest.partition(":")
+        deps_length, _, rest = rest.partition(":")
+        text_end = int(text_length)
+        deps_end = text_end + int(deps_length)
+        text, html = rest[:text_end], rest[deps_end:]
+        if deps_end > text_end:
+            deps = json.loads(rest[text_end:deps_end])
+        if block_images is not None and not block_images.meta.is_current(deps):
+            entry = None
+        elif text_out is not None and "t" not in flags:
+            entry = None  # stored by a build that did not index
+
+    if entry is None:
+        # collecting the text costs, it is only kept when the page is indexed
+        block_text: list[str] | None = [] if text_out is not None else None
+        if block_images is not None:
+            # the page's lookups so far are set aside to see just this block's
+            page_used, block_images.used = block_images.used, {}
+            seen = block_images.seen
+        node = block_to_html_node(
+            block, block_type, refs, rewrite_url, images, block_text, highlighter
+        )
+        html = node.to_html()
+        flags = deps_json = text = ""
+        if block_text is not None:
+            text = "\n".join(block_text)
+            flags = "t"
+        if block_images is not None:
+            deps, block_images.used = block_images.used, page_used
+            deps_json = json.dumps(deps, separators=(",", ":")) if deps else ""
+            if block_images.seen and not seen:
+                flags += "i"
+        cache.put(
+            key, f"{flags}:{len(text)}:{len(deps_json)}:{text}{deps_json}{html}"
         )
-    )
 
-    children = []
-
-    for block in blocks:
-        match block[1]:
-            case BlockType.HEADING:
-                children.append(conv_heading_to_div(block[0]))
-            case BlockType.CODE:
-                children.append(conv_code_to_div(block[0]))
-            case BlockType.QUOTE:
-                children.append(conv_quote_to_div(block[0]))
-            case BlockType.UNORDERED_LIST:
-                children.append(conv_list_to_div(block[0], ordered=False))
-            case BlockType.ORDERED_LIST:
-                children.append(conv_list_to_div(block[0], ordered=True))
-            case BlockType.PARAGRAPH:
-                children.append(conv_paragraph_to_div(block[0]))
-            case _:
-                raise NotImplementedError("OOOOOOOOOOOOO")
+    if images is not None:
+        # a hit skips props(), the page still has to know what it used and
+        # whether its first image is behind it; "<img" in the html could be
+        # code or raw html, only the flag says an image was rendered
+        images.used.update(deps)
+        if "i" in flags:
+            images.seen = True
+
+    if text_out is not None:
+        text_out.append(text)
+
+    return LeafNode(None, html)
+
+
+def markdown_to_html_node(
+    markdown: str,
+    cache: BlockCache | None = None,
+    rewrite_url: UrlRewriter | None = None,
+    images: PageImages | None = None,
+    text_out: list[str] | None = None,
+    meta: dict[str, str] | None = None,
+    highlighter: Highlighter | None = None,
+) -> ParentNode:
+    # definitions may come after the links that use them, so every block is
+    # scanned (filling refs) before any of them is converted
+    refs: dict[str, str] = {}
+    blocks = list(scan_blocks(markdown, refs, meta))
+
+    if cache is None:
+        children = [
+            block_to_html_node(
+                block, block_type, refs, rewrite_url, images, text_out, highlighter
+            )
+            for block, block_type in blocks
+        ]
+    else:
+        refs_key = _refs_key(refs)
+        children = [
+            cached_block_to_html_node(
+                block,
+                block_type,
+                refs,
+                cache,
+                refs_key,
+                rewrite_url,
+                images,
+                text_out,
+                highlighter,
+            )
+            for block, block_type in blocks
+        ]
 
     return ParentNode("div", children=children)
+
+
+def render_blocks_to(
+    blocks: Iterable[tuple[str, BlockType]],
+    writer: Writer | list[str],
+    refs: dict[str, str] | None = None,
+    cache: BlockCache | None = None,
+    rewrite_url: UrlRewriter | None = None,
+    images: PageImages | None = None,
+    text_out: list[str] | None = None,
+    highlighter: Highlighter | None = None,
+) -> None:
+    # same output as markdown_to_html_node(...).render_to(writer), but each
+    # block's subtree is dropped as soon as it has been written; only
+    # definitions scanned before a block can be resolved inside it, unless
+    # refs already holds them all (see collect_definitions)
+    write = writer.append if isinstance(writer, list) else writer.write
+    write("<div>")
+    refs_key, refs_seen = "", 0
+    for block, block_type in blocks:
+        if cache is None:
+            node = block_to_html_node(
+                block, block_type, refs, rewrite_url, images, text_out, highlighter
+            )
+        else:
+            # refs only grow while streaming, rebuild the key when they do
+            if refs and len(refs) != refs_seen:
+                refs_key, refs_seen = _refs_key(refs), len(refs)
+            node = cached_block_to_html_node(
+                block,
+                block_type,
+                refs,
+                cache,
+                refs_key,
+                rewrite_url,
+                images,
+                text_out,
+                highlighter,
+            )
+        node.render_to(writer)
+    write("</div>")
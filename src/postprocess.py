@@ -0,0 +1,273 @@
+from __future__ import annotations
+import filecmp
+import gzip
+import os
+import re
+from contextlib import ExitStack
+from pathlib import Path
+from typing import BinaryIO, Callable, Protocol
+
+from htmlnode import Writer
+
+from manifest import is_generator_file
+
+# files are minified and compressed this much at a time, never read whole
+CHUNK_SIZE = 1 << 20
+# text outputs worth a precompressed sibling
+COMPRESSIBLE = frozenset(
+    {".html", ".css", ".js", ".mjs", ".json", ".map", ".svg", ".xml", ".txt"}
+)
+
+# an element whose text is whitespace-sensitive, up to its end tag or, if it
+# is never closed, the end of the page
+_RAW_RE = re.compile(
+    r"(<(pre|textarea|script|style)\b.*?(?:</\2\s*>|\Z))", re.IGNORECASE | re.DOTALL
+)
+# not \s, that would also eat U+00A0 and friends, which do render
+_SPACE_RE = re.compile(r"[ \t\n\r\f]+")
+_SPACE = " \t\n\r\f"
+_RAW_START_RE = re.compile(r"<(pre|textarea|script|style)\b", re.IGNORECASE)
+_RAW_STARTS = ("<pre", "<textarea", "<script", "<style")
+
+
+class CompressResult:
+    def __init__(self) -> None:
+        self.compressed = 0
+        self.unchanged = 0
+        self.removed = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"CompressResult({self.compressed} compressed, "
+            f"{self.unchanged} unchanged, {self.removed} removed)"
+        )
+
+
+def _collapse(match: re.Match[str]) -> str:
+    return "\n" if "\n" in match.group() else " "
+
+
+def minify_html(html: str) -> str:
+    # split() with two groups yields text, raw element, tag name, text, ...
+    parts = _RAW_RE.split(html)
+    out = []
+    for i in range(0, len(parts), 3):
+        out.append(_SPACE_RE.sub(_collapse, parts[i]))
+        if i + 1 < len(parts):
+            out.append(parts[i + 1])
+
+    return "".join(out)
+
+
+def _raw_end_re(name: str) -> re.Pattern[str]:
+    return re.compile(rf"</{name}\s*>", re.IGNORECASE)
+
+
+_RAW_END_RES = {name[1:]: _raw_end_re(name[1:]) for name in _RAW_STARTS}
+
+
+class MinifyWriter:
+    # minify_html() over a stream: the same output for any split into
+    # chunks, holding back only what the next chunk could still change, a
+    # partial tag or a run of spaces
+    def __init__(self, out: Writer) -> None:
+        self.out = out
+        self.pending = ""
+        # name of the raw element being copied through, if inside one
+        self.raw: str | None = None
+
+    def write(self, chunk: str) -> None:
+        text = self.pending + chunk
+        while text:
+            if self.raw is not None:
+                end = _RAW_END_RES[self.raw].search(text)
+                if end is None:
+                    held = _held_end_tag(text, self.raw)
+                    self.out.write(text[: len(text) - len(held)])
+                    self.pending = held
+                    return
+                self.out.write(text[: end.end()])
+                text = text[end.end() :]
+                self.raw = None
+                continue
+
+            start = _RAW_START_RE.search(text)
+            # at the very end the name may yet go on, <pre vs <preview
+            if start is not None and start.end() < len(text):
+                self.out.write(_SPACE_RE.sub(_collapse, text[: start.start()]))
+                self.raw = start.group(1).lower()
+                text = text[start.start() :]
+                continue
+
+            cut = text.rfind("<")
+            tail = text[cut:].lower()
+            if cut == -1 or not any(raw.startswith(tail) for raw in _RAW_STARTS):
+                cut = len(text.rstrip(_SPACE))
+            self.out.write(_SPACE_RE.sub(_collapse, text[:cut]))
+            # a run of spaces collapses the same once more spaces follow it
+            self.pending = _SPACE_RE.sub(_collapse, text[cut:])
+            return
+
+        self.pending = ""
+
+    def close(self) -> None:
+        # an element never closed runs to the end of the page
+        if self.raw is None:
+            self.out.write(_SPACE_RE.sub(_collapse, self.pending))
+        else:
+            self.out.write(self.pending)
+        self.pending = ""
+        self.raw = None
+
+
+def _held_end_tag(text: str, name: str) -> str:
+    # the tail of a raw element that may be the start of its end tag
+    cut = text.rfind("<")
+    if cut == -1:
+        return ""
+    tail = text[cut:]
+    end = f"</{name}"
+    if end.startswith(tail.lower()) or re.fullmatch(
+        rf"{end}\s*", tail, re.IGNORECASE
+    ):
+        return tail
+    return ""
+
+
+def _tmp_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+
+# only pages are minified, and before they replace the old output; static
+# files may be hardlinks to the sources and are never rewritten
+def minify_file(path: Path) -> bool:
+    tmp = _tmp_path(path)
+    try:
+        with path.open(encoding="utf-8") as src, tmp.open(
+            "w", encoding="utf-8", newline=""
+        ) as dest:
+            minifier = MinifyWriter(dest)
+            while chunk := src.read(CHUNK_SIZE):
+                minifier.write(chunk)
+            minifier.close()
+        if filecmp.cmp(tmp, path, shallow=False):
+            tmp.unlink()
+            return False
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return True
+
+
+class Encoder(Protocol):
+    def write(self, data: bytes, /) -> object: ...
+
+    def close(self) -> None: ...
+
+
+def _gzip(out: BinaryIO) -> Encoder:
+    # mtime=0 and no file name, so identical input gives byte-identical output
+    return gzip.GzipFile(filename="", mode="wb", compresslevel=9, fileobj=out, mtime=0)
+
+
+class _BrotliEncoder:
+    def __init__(self, out: BinaryIO, compressor) -> None:
+        self.out = out
+        self.compressor = compressor
+
+    def write(self, data: bytes) -> None:
+        self.out.write(self.compressor.process(data))
+
+    def close(self) -> None:
+        self.out.write(self.compressor.finish())
+
+
+def _brotli() -> Callable[[BinaryIO], Encoder] | None:
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return lambda out: _BrotliEncoder(out, brotli.Compressor())
+
+
+def encoders() -> dict[str, Callable[[BinaryIO], Encoder]]:
+    found: dict[str, Callable[[BinaryIO], Encoder]] = {".gz": _gzip}
+    if (compress := _brotli()) is not None:
+        found[".br"] = compress
+    return found
+
+
+def compress_file(path: Path, codecs: dict[str, Callable[[BinaryIO], Encoder]]) -> bool:
+    stat = path.stat()
+    # a sibling carries its source's mtime, anything else means it is stale
+    stale = []
+    for suffix in codecs:
+        sibling = path.with_name(path.name + suffix)
+        try:
+            if sibling.stat().st_mtime_ns == stat.st_mtime_ns:
+                continue
+        except FileNotFoundError:
+            pass
+        stale.append((suffix, sibling, _tmp_path(sibling)))
+
+    if not stale:
+        return False
+
+    # the source is read once, a chunk at a time, into every stale sibling
+    try:
+        with ExitStack() as stack:
+            src = stack.enter_context(path.open("rb"))
+            outs = [
+                codecs[suffix](stack.enter_context(tmp.open("wb")))
+                for suffix, _, tmp in stale
+            ]
+            while chunk := src.read(CHUNK_SIZE):
+                for out in outs:
+                    out.write(chunk)
+            for out in outs:
+                out.close()
+    except BaseException:
+        for _, _, tmp in stale:
+            tmp.unlink(missing_ok=True)
+        raise
+
+    for _, sibling, tmp in stale:
+        os.replace(tmp, sibling)
+        os.utime(sibling, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return True
+
+
+def compress_tree(
+    out_dir: Path, jobs: int = 1, keep: set[str] | frozenset[str] = frozenset()
+) -> CompressResult:
+    codecs = encoders()
+    result = CompressResult()
+    sources = []
+    for root, _, names in os.walk(out_dir):
+        for name in names:
+            path = Path(root, name)
+            rel = path.relative_to(out_dir).as_posix()
+            if is_generator_file(rel):
+                continue
+            if path.suffix in COMPRESSIBLE:
+                # static/ may ship its own precompressed copies, leave those be
+                if not any(rel + suffix in keep for suffix in codecs):
+                    sources.append(path)
+            elif path.suffix in codecs and not path.with_suffix("").exists():
+                # sibling of a deleted output, unless static/ shipped it as is
+                if rel not in keep:
+                    path.unlink()
+                    result.removed += 1
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    # zlib and brotli release the GIL while they work, threads are enough
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for compressed in pool.map(lambda p: compress_file(p, codecs), sources):
+            if compressed:
+                result.compressed += 1
+            else:
+                result.unchanged += 1
+
+    return result
@@ -0,0 +1,131 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Iterator
+
+# (stage, page, start_ns, duration_ns, pid, tid)
+Event = tuple[str, str, int, int, int, int]
+
+_active: Profiler | None = None
+_NULL = nullcontext()
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.events: list[Event] = []
+
+    def add(self, stage: str, page: str, start: int, duration: int) -> None:
+        self.events.append(
+            (stage, page, start, duration, os.getpid(), threading.get_ident())
+        )
+
+    @contextmanager
+    def stage(self, name: str, page: str) -> Iterator[None]:
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, page, start, time.perf_counter_ns() - start)
+
+    def take(self) -> list[Event]:
+        events, self.events = self.events, []
+        return events
+
+    def stage_totals(self) -> dict[str, int]:
+        totals: dict[str, int] = {}
+        for stage, _, _, duration, _, _ in self.events:
+            totals[stage] = totals.get(stage, 0) + duration
+        return totals
+
+    def page_totals(self) -> dict[str, int]:
+        totals: dict[str, int] = {}
+        for _, page, _, duration, _, _ in self.events:
+            totals[page] = totals.get(page, 0) + duration
+        return totals
+
+    def summary(self, top: int = 10) -> str:
+        stages = self.stage_totals()
+        pages = self.page_totals()
+        total = sum(stages.values()) or 1
+
+        lines = [f"Stages ({len(pages)} pages, {total / 1e6:.1f} ms total):"]
+        for stage, duration in sorted(stages.items(), key=lambda kv: -kv[1]):
+            lines.append(
+                f"  {stage:24} {duration / 1e6:10.1f} ms {duration * 100 / total:5.1f}%"
+            )
+
+        lines.append(f"Slowest {min(top, len(pages))} pages:")
+        for page, duration in sorted(pages.items(), key=lambda kv: -kv[1])[:top]:
+            lines.append(f"  {duration / 1e6:10.1f} ms  {page}")
+
+        return "\n".join(lines)
+
+    def write_trace(self, path: Path) -> None:
+        origin = min((event[2] for event in self.events), default=0)
+        lanes: dict[tuple[int, int], int] = {}
+        trace = []
+
+        for stage, page, start, duration, pid, tid in self.events:
+            # chrome wants small thread ids, number the lanes per process
+            lane = lanes.setdefault((pid, tid), len(lanes))
+            trace.append(
+                {
+                    "name": stage,
+                    "cat": "page",
+                    "ph": "X",
+                    "ts": (start - origin) / 1000,
+                    "dur": duration / 1000,
+                    "pid": pid,
+                    "tid": lane,
+                    "args": {"page": page},
+                }
+            )
+
+        for (pid, _), lane in lanes.items():
+            trace.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": lane,
+                    "args": {"name": "main" if pid == os.getpid() else f"worker {pid}"},
+                }
+            )
+
+        path.write_text(json.dumps({"traceEvents": trace}), encoding="utf-8")
+
+
+class TimedWriter:
+    def __init__(self, writer) -> None:
+        self.writer = writer
+        self.elapsed = 0
+
+    def write(self, chunk: str) -> None:
+        start = time.perf_counter_ns()
+        self.writer.write(chunk)
+        self.elapsed += time.perf_counter_ns() - start
+
+
+def enable() -> Profiler:
+    global _active
+    _active = Profiler()
+    return _active
+
+
+def disable() -> None:
+    global _active
+    _active = None
+
+
+def active() -> Profiler | None:
+    return _active
+
+
+def stage(name: str, page: str):
+    if _active is None:
+        return _NULL
+    return _active.stage(name, page)
@@ -0,0 +1,183 @@
+from __future__ import annotations
+import json
+import os
+import re
+from pathlib import Path
+from string import ascii_lowercase, digits
+
+INDEX_DIR = "search"
+INDEX_VERSION = 1
+# a shard holds every term starting with the same PREFIX_LEN characters
+PREFIX_LEN = 2
+STATE_NAME = ".state.json"
+
+# page text may carry inline html, which is markup and not indexed
+_TAG_RE = re.compile(r"<[^<>]*>")
+_WORD_RE = re.compile(r"\w+")
+_SHARD_CHARS = frozenset(ascii_lowercase + digits)
+
+# term -> [[doc id, first position, delta, delta, ...], ...]
+Shard = dict[str, list[list[int]]]
+
+
+def tokenize(text: str) -> list[str]:
+    return _WORD_RE.findall(_TAG_RE.sub(" ", text).casefold())
+
+
+def shard_name(term: str) -> str:
+    # file names stay ascii, anything else is spelled as _<hex code point>;
+    # the client derives the same name from what was typed
+    return "".join(
+        c if c in _SHARD_CHARS else f"_{ord(c):x}" for c in term[:PREFIX_LEN]
+    )
+
+
+def postings(text: str) -> dict[str, list[int]]:
+    positions: dict[str, list[int]] = {}
+    last: dict[str, int] = {}
+    for pos, term in enumerate(tokenize(text)):
+        # positions are stored as gaps, which keeps the numbers small
+        prev = last.get(term)
+        if prev is None:
+            positions[term] = [pos]
+        else:
+            positions[term].append(pos - prev)
+        last[term] = pos
+
+    return positions
+
+
+def _write_if_changed(path: Path, data: str) -> bool:
+    try:
+        if path.read_text(encoding="utf-8") == data:
+            return False
+    except (OSError, ValueError):
+        pass
+
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(data, encoding="utf-8")
+    os.replace(tmp, path)
+    return True
+
+
+class SearchIndex:
+    # docs.json lists [output path, title] per doc id, <shard>.json maps the
+    # shard's terms to their postings; the state file remembers which shards
+    # each doc is in so an update only touches those
+    def __init__(self, out_dir: Path, basepath: str) -> None:
+        self.dir = out_dir / INDEX_DIR
+        self.basepath = basepath
+        self.docs: list[list[str] | None] = []
+        self.ids: dict[str, int] = {}
+        self.doc_shards: dict[int, list[str]] = {}
+        self._shards: dict[str, Shard] = {}
+        self._dirty: set[str] = set()
+
+    @classmethod
+    def load(cls, out_dir: Path, basepath: str) -> SearchIndex:
+        index = cls(out_dir, basepath)
+        try:
+            docs = json.loads((index.dir / "docs.json").read_text(encoding="utf-8"))
+            state = json.loads((index.dir / STATE_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return index
+
+        if (
+            not isinstance(docs, dict)
+            or docs.get("version") != INDEX_VERSION
+            or docs.get("prefix") != PREFIX_LEN
+            or not isinstance(state, dict)
+        ):
+            return index
+
+        index.docs = docs["docs"]
+        index.ids = {doc[0]: i for i, doc in enumerate(index.docs) if doc is not None}
+        index.doc_shards = {int(i): names for i, names in state["shards"].items()}
+        return index
+
+    def _shard(self, name: str) -> Shard:
+        shard = self._shards.get(name)
+        if shard is None:
+            try:
+                shard = json.loads(
+                    (self.dir / f"{name}.json").read_text(encoding="utf-8")
+                )
+            except (OSError, ValueError):
+                shard = {}
+            self._shards[name] = shard
+
+        return shard
+
+    def update(self, live: set[str], pages: dict[str, tuple[str, str]]) -> None:
+        # pages holds (title, text) of every page rendered this build, keyed by
+        # output path; indexed pages that are not live are dropped
+        gone = {rel for rel in self.ids if rel not in live or rel in pages}
+        removed = {self.ids.pop(rel) for rel in gone}
+        # one pass over each affected shard however many of its docs left
+        touched = set()
+        for doc_id in removed:
+            self.docs[doc_id] = None
+            touched.update(self.doc_shards.pop(doc_id, ()))
+        for name in touched:
+            shard = self._shard(name)
+            for term in list(shard):
+                kept = [p for p in shard[term] if p[0] not in removed]
+                if kept:
+                    shard[term] = kept
+                else:
+                    del shard[term]
+        self._dirty |= touched
+
+        free = iter(sorted(i for i, doc in enumerate(self.docs) if doc is None))
+        for rel, (title, text) in sorted(pages.items()):
+            if rel not in live:
+                continue
+            doc_id = next(free, len(self.docs))
+            if doc_id == len(self.docs):
+                self.docs.append(None)
+            self.docs[doc_id] = [rel, title]
+            self.ids[rel] = doc_id
+
+            names = set()
+            for term, positions in postings(text).items():
+                name = shard_name(term)
+                self._shard(name).setdefault(term, []).append([doc_id, *positions])
+                names.add(name)
+            self.doc_shards[doc_id] = sorted(names)
+            self._dirty |= names
+
+        # trailing holes are dropped so a shrinking site shrinks docs.json
+        while self.docs and self.docs[-1] is None:
+            self.docs.pop()
+
+    def save(self) -> int:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        written = 0
+        for name in sorted(self._dirty):
+            path = self.dir / f"{name}.json"
+            shard = self._shards[name]
+            if not shard:
+                path.unlink(missing_ok=True)
+                continue
+            data = json.dumps(shard, separators=(",", ":"), sort_keys=True)
+            written += _write_if_changed(path, data)
+        self._dirty.clear()
+
+        docs = {
+            "version": INDEX_VERSION,
+            "prefix": PREFIX_LEN,
+            "basepath": self.basepath,
+            "docs": self.docs,
+        }
+        written += _write_if_changed(
+            self.dir / "docs.json",
+            json.dumps(docs, separators=(",", ":"), ensure_ascii=False),
+        )
+        _write_if_changed(
+            self.dir / STATE_NAME,
+            json.dumps(
+                {"shards": {str(i): names for i, names in self.doc_shards.items()}},
+                sort_keys=True,
+            ),
+        )
+        return written
@@ -0,0 +1,210 @@
+from __future__ import annotations
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+from typing import Callable
+
+from pages import page_layout, render_page, warm_up
+from template import Template, load_template
+from urls import strip_basepath
+
+# a rendered page is valid while its source and its compiled template are
+# the same; load_template() hands out a new Template whenever the layout or
+# one of its partials changed, so the template object stands for all of them
+Stamp = tuple[int, int, Template]
+
+
+class PageCache:
+    def __init__(self, max_bytes: int = 64 << 20) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: OrderedDict[Path, tuple[Stamp, bytes]] = OrderedDict()
+        self._size = 0
+        self._pending: dict[Path, Future[bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: Path, stamp: Stamp, render: Callable[[], bytes]) -> bytes:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+
+            # whoever asks first renders, everyone asking meanwhile waits for
+            # that render instead of starting their own
+            future = self._pending.get(path)
+            owner = future is None
+            if future is None:
+                future = self._pending[path] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            body = render()
+        except BaseException as exc:
+            with self._lock:
+                del self._pending[path]
+            future.set_exception(exc)
+            raise
+
+        # cached before the waiters are released, a request arriving in
+        # between finds either the pending render or the cached page
+        with self._lock:
+            del self._pending[path]
+            self._remember(path, stamp, body)
+        future.set_result(body)
+        return body
+
+    def _remember(self, path: Path, stamp: Stamp, body: bytes) -> None:
+        old = self._entries.pop(path, None)
+        if old is not None:
+            self._size -= len(old[1])
+        if len(body) > self.max_bytes:
+            return
+
+        self._entries[path] = (stamp, body)
+        self._size += len(body)
+        while self._size > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def summary(self) -> str:
+        return (
+            f"Page cache: {self.hits} hits, {self.misses} renders, "
+            f"{self.coalesced} coalesced, {len(self._entries)} pages kept"
+        )
+
+
+class PageRenderer:
+    def __init__(
+        self,
+        content_dir: Path,
+        template_path: Path,
+        basepath: str,
+        cache: PageCache,
+    ) -> None:
+        self.content_dir = content_dir
+        self.template_path = template_path
+        self.partials_dir = template_path.parent / "partials"
+        self.basepath = basepath
+        self.cache = cache
+
+    def render(self, md_path: Path) -> bytes | None:
+        try:
+            stat = md_path.stat()
+        except FileNotFoundError:
+            return None
+
+        rel = md_path.relative_to(self.content_dir)
+        template = load_template(
+            page_layout(md_path, rel, self.template_path), self.partials_dir
+        )
+
+        def render() -> bytes:
+            content = md_path.read_text(encoding="utf-8")
+            html = render_page(content, template, self.basepath, str(md_path))
+            return html.encode("utf-8")
+
+        stamp = (stat.st_mtime_ns, stat.st_size, template)
+        return self.cache.get(md_path, stamp, render)
+
+
+class PageHandler(SimpleHTTPRequestHandler):
+    # serves static/ as files and renders content/*.md for .html and
+    # directory urls the first time they are asked for
+    renderer: PageRenderer
+    basepath = "/"
+
+    def log_message(self, format, *args):
+        pass
+
+    def translate_path(self, path: str) -> str:
+        return super().translate_path(strip_basepath(path, self.basepath))
+
+    def send_head(self):
+        # translate_path() has already stripped query, "..", and the like
+        static_path = Path(self.translate_path(self.path))
+        rel = static_path.relative_to(self.directory)
+        if self.path.split("?", 1)[0].endswith("/"):
+            md_path = self.renderer.content_dir / rel / "index.md"
+        elif static_path.suffix == ".html":
+            md_path = self.renderer.content_dir / rel.with_suffix(".md")
+        else:
+            return super().send_head()
+
+        try:
+            body = self.renderer.render(md_path)
+        except Exception as exc:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"{md_path}: {exc}")
+            return None
+        if body is None:
+            # no source, static/ may still have the file
+            return super().send_head()
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        return io.BytesIO(body)
+
+
+class PooledHTTPServer(HTTPServer):
+    # a fixed set of threads instead of one new thread per connection
+    def __init__(self, address, handler, workers: int) -> None:
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def serve(
+    content_dir: Path,
+    static_dir: Path,
+    template_path: Path,
+    port: int,
+    basepath: str = "/",
+    cache: PageCache | None = None,
+    workers: int = 8,
+) -> PooledHTTPServer:
+    if cache is None:
+        cache = PageCache()
+    renderer = PageRenderer(content_dir, template_path, basepath, cache)
+    handler = type(
+        "Handler", (PageHandler,), {"renderer": renderer, "basepath": basepath}
+    )
+    warm_up()
+
+    server = PooledHTTPServer(
+        ("", port), partial(handler, directory=str(static_dir)), workers
+    )
+    print(f"Rendering {content_dir} on request at http://localhost:{port}{basepath}")
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import os
+import shutil
+from pathlib import Path
+
+from manifest import file_digest
+
+MODES = ("copy", "hardlink", "reflink")
+FICLONE = 0x40049409
+
+
+class SyncResult:
+    def __init__(self) -> None:
+        self.files: set[str] = set()
+        self.copied = 0
+        self.unchanged = 0
+        self.removed = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"SyncResult({len(self.files)} files, {self.copied} copied, "
+            f"{self.unchanged} unchanged, {self.removed} removed)"
+        )
+
+
+def _up_to_date(
+    src_stat: os.stat_result, src: Path, dst: Path, checksum: bool
+) -> bool:
+    try:
+        dst_stat = dst.stat()
+    except FileNotFoundError:
+        return False
+
+    if (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev, dst_stat.st_ino):
+        return True
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    if src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+        return True
+    if not checksum:
+        return False
+
+    if file_digest(src) != file_digest(dst):
+        return False
+    # same bytes, only the timestamp drifted: fix it so the next run is cheap
+    shutil.copystat(src, dst)
+    return True
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    import fcntl
+
+    with src.open("rb") as s, dst.open("wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    shutil.copystat(src, dst)
+
+
+def sync_file(src: Path, dst: Path, mode: str = "copy") -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+
+    if mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass  # other filesystem or no link support, fall back to a copy
+    elif mode == "reflink":
+        try:
+            _reflink(src, dst)
+            return
+        except (OSError, ImportError):
+            if dst.exists():
+                dst.unlink()
+
+    shutil.copy2(src, dst)
+
+
+def sync_tree(
+    src_dir: Path,
+    dst_dir: Path,
+    previous: set[str] | None = None,
+    mode: str = "copy",
+    checksum: bool = False,
+) -> SyncResult:
+    if mode not in MODES:
+        raise ValueError(f"unknown sync mode {mode!r}, expected one of {MODES}")
+
+    result = SyncResult()
+    for root, _, names in os.walk(src_dir):
+        for name in names:
+            src = Path(root, name)
+            rel = src.relative_to(src_dir).as_posix()
+            dst = dst_dir / rel
+            result.files.add(rel)
+
+            if _up_to_date(src.stat(), src, dst, checksum):
+                result.unchanged += 1
+            else:
+                sync_file(src, dst, mode)
+                result.copied += 1
+
+    # only files an earlier sync put there are ours to delete, everything
+    # else in dst_dir belongs to the page generator or to the user
+    for rel in sorted((previous or set()) - result.files):
+        dst = dst_dir / rel
+        if dst.exists():
+            dst.unlink()
+            result.removed += 1
+            _remove_empty_parents(dst.parent, dst_dir)
+
+    return result
+
+
+def _remove_empty_parents(directory: Path, stop: Path) -> None:
+    while directory != stop and directory.is_relative_to(stop):
+        try:
+            directory.rmdir()
+        except OSError:
+            return
+        directory = directory.parent
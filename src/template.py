@@ -0,0 +1,161 @@
+from __future__ import annotations
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Protocol, Union
+
+if TYPE_CHECKING:
+    from urls import UrlRewriter
+
+# {{ name }} is a slot, {{> name }} includes partials/name.html
+_SLOT_RE = re.compile(r"\{\{\s*(>\s*)?([A-Za-z_][\w.-]*)\s*\}\}")
+# attributes are only looked for inside tags; a literal may end inside one
+# (href="/{{ Path }}"), then only the part before the slot is rewritten
+_TAG_RE = re.compile(r"<[^<>]*>?")
+_URL_ATTR_RE = re.compile(r'(?<=\s)(href|src)="([^"]*)')
+
+
+class Writer(Protocol):
+    def write(self, chunk: str, /) -> object: ...
+
+
+class Renderable(Protocol):
+    def render_to(self, writer: Writer) -> None: ...
+
+
+Value = Union[str, Renderable]
+
+
+class Template:
+    def __init__(
+        self,
+        source: str,
+        include: Callable[[str], Template] | None = None,
+        path: Path | None = None,
+    ) -> None:
+        self.path = path
+        # literals[i] comes before slots[i], literals[-1] closes the template
+        self.literals = [""]
+        self.slots: list[str] = []
+        # every partial file this template pulls in, directly or not
+        self.dependencies: list[Path] = []
+
+        pos = 0
+        for match in _SLOT_RE.finditer(source):
+            self.literals[-1] += source[pos : match.start()]
+            pos = match.end()
+            is_partial, name = match.groups()
+            if not is_partial:
+                self.slots.append(name)
+                self.literals.append("")
+                continue
+
+            if include is None:
+                raise ValueError(f"partial {name!r} included, but no partials dir")
+            # compiled partials are spliced in, so rendering never recurses
+            partial = include(name)
+            self.literals[-1] += partial.literals[0]
+            self.slots.extend(partial.slots)
+            self.literals.extend(partial.literals[1:])
+            for dep in [partial.path, *partial.dependencies]:
+                if dep is not None and dep not in self.dependencies:
+                    self.dependencies.append(dep)
+
+        self.literals[-1] += source[pos:]
+        self._literals_by_rewriter: dict[str, list[str]] = {}
+
+    def _rewritten_literals(self, rewrite_url: UrlRewriter | None) -> list[str]:
+        if rewrite_url is None:
+            return self.literals
+
+        literals = self._literals_by_rewriter.get(rewrite_url.key)
+        if literals is None:
+
+            def sub(match: re.Match[str]) -> str:
+                attr, url = match.groups()
+                return f'{attr}="{rewrite_url(url, attr)}'
+
+            literals = [
+                _TAG_RE.sub(lambda tag: _URL_ATTR_RE.sub(sub, tag.group()), lit)
+                for lit in self.literals
+            ]
+            self._literals_by_rewriter[rewrite_url.key] = literals
+
+        return literals
+
+    def segments(
+        self, values: dict[str, str], rewrite_url: UrlRewriter | None = None
+    ) -> list[str]:
+        literals = self._rewritten_literals(rewrite_url)
+        out = [literals[0]]
+        for slot, literal in zip(self.slots, literals[1:]):
+            out.append(values.get(slot, ""))
+            out.append(literal)
+
+        return out
+
+    def render(
+        self, values: dict[str, str], rewrite_url: UrlRewriter | None = None
+    ) -> str:
+        return "".join(self.segments(values, rewrite_url))
+
+    def render_to(
+        self,
+        writer: Writer,
+        values: dict[str, Value],
+        rewrite_url: UrlRewriter | None = None,
+    ) -> None:
+        # string values are written as-is, anything else streams itself
+        # into the writer, so a page's content never exists as one string
+        literals = self._rewritten_literals(rewrite_url)
+        writer.write(literals[0])
+        for slot, literal in zip(self.slots, literals[1:]):
+            value = values.get(slot, "")
+            if isinstance(value, str):
+                writer.write(value)
+            else:
+                value.render_to(writer)
+            writer.write(literal)
+
+
+_cache: dict[tuple[Path, Path | None], tuple[list[tuple[int, int]], Template]] = {}
+
+
+def _stamp(path: Path) -> tuple[int, int]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return (-1, -1)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def load_template(
+    path: Path, partials_dir: Path | None = None, _including: tuple[Path, ...] = ()
+) -> Template:
+    # a cached template is reused while neither it nor any partial changed
+    cached = _cache.get((path, partials_dir))
+    if cached is not None:
+        stamps, template = cached
+        files = [path, *template.dependencies]
+        if all(_stamp(f) == stamp for f, stamp in zip(files, stamps)):
+            return template
+
+    if path in _including:
+        chain = " -> ".join(p.name for p in (*_including, path))
+        raise ValueError(f"partials include each other: {chain}")
+
+    def include(name: str) -> Template:
+        assert partials_dir is not None
+        return load_template(
+            partials_dir / f"{name}.html", partials_dir, (*_including, path)
+        )
+
+    stamp = _stamp(path)
+    template = Template(
+        path.read_text(encoding="utf-8"),
+        include if partials_dir is not None else None,
+        path,
+    )
+    stamps = [stamp, *(_stamp(dep) for dep in template.dependencies)]
+    _cache[(path, partials_dir)] = (stamps, template)
+
+    return template
@@ -0,0 +1,131 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from blockcache import BlockCache
+from parser import markdown_to_html_node
+
+MARKDOWN = (
+    "# Title\n\nsome **bold** text with [a ref][r]\n\n- one\n- two\n\n"
+    "```\ncode\n```\n\n> quote\n\n[r]: /target\n"
+)
+
+
+class TestBlockCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name) / "cache"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_counts_hits_and_misses(self):
+        cache = BlockCache()
+        self.assertIsNone(cache.get("k"))
+        cache.put("k", "<p>x</p>")
+        self.assertEqual(cache.get("k"), "<p>x</p>")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertIn("50.0% hit rate", cache.summary())
+        self.assertEqual(cache.take_counts(), (1, 1))
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+    def test_memory_is_bounded_lru(self):
+        cache = BlockCache(max_bytes=10)
+        cache.put("a", "aaaa")
+        cache.put("b", "bbbb")
+        cache.get("a")
+        cache.put("c", "cccc")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "aaaa")
+        self.assertEqual(cache.get("c"), "cccc")
+
+    def test_concurrent_use_keeps_the_lru_consistent(self):
+        cache = BlockCache(max_bytes=1000)
+        errors = []
+
+        def hammer(n):
+            try:
+                for i in range(20000):
+                    key = f"k{(i * 7 + n) % 300}"
+                    if cache.get(key) is None:
+                        cache.put(key, "x" * 10)
+            except Exception as exc:
+                errors.append(exc)
+
+        # switch threads often so unlocked updates would interleave
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=hammer, args=(n,)) for n in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(cache.hits + cache.misses, 8 * 20000)
+        self.assertEqual(cache._size, sum(map(len, cache._entries.values())))
+        self.assertLessEqual(cache._size, 1000)
+
+    def test_disk_entries_survive_a_new_cache(self):
+        BlockCache(directory=self.dir).put("ab12", "<p>x</p>")
+        cache = BlockCache(directory=self.dir)
+        self.assertEqual(cache.get("ab12"), "<p>x</p>")
+        self.assertEqual(cache.hits, 1)
+
+    def test_trim_disk_drops_oldest(self):
+        cache = BlockCache(directory=self.dir, max_disk_bytes=8)
+        for i, key in enumerate(["aa1", "bb2", "cc3"]):
+            cache.put(key, "xxxx")
+            path = self.dir / key[:2] / f"{key}.html"
+            os.utime(path, ns=(i * 10**9, i * 10**9))
+
+        self.assertEqual(cache.trim_disk(), 1)
+        self.assertFalse((self.dir / "aa" / "aa1.html").exists())
+        self.assertTrue((self.dir / "cc" / "cc3.html").exists())
+
+
+class TestCachedRender(unittest.TestCase):
+    def test_same_html_with_and_without_cache(self):
+        cache = BlockCache()
+        expected = markdown_to_html_node(MARKDOWN).to_html()
+        self.assertEqual(markdown_to_html_node(MARKDOWN, cache).to_html(), expected)
+        self.assertEqual(markdown_to_html_node(MARKDOWN, cache).to_html(), expected)
+        self.assertEqual(cache.hits, cache.misses)
+
+    def test_reference_definitions_are_part_of_the_key(self):
+        cache = BlockCache()
+        first = markdown_to_html_node(MARKDOWN, cache).to_html()
+        moved = markdown_to_html_node(
+            MARKDOWN.replace("/target", "/elsewhere"), cache
+        ).to_html()
+        self.assertIn('href="/target"', first)
+        self.assertIn('href="/elsewhere"', moved)
+
+    def test_hit_still_yields_block_text(self):
+        cache = BlockCache()
+        expected: list[str] = []
+        markdown_to_html_node(MARKDOWN, text_out=expected)
+        for _ in range(2):
+            text: list[str] = []
+            markdown_to_html_node(MARKDOWN, cache, text_out=text)
+            self.assertEqual("\n".join(text), "\n".join(expected))
+        self.assertEqual(cache.hits, cache.misses)
+
+    def test_entries_without_text_are_rendered_again_for_text(self):
+        cache = BlockCache()
+        markdown_to_html_node(MARKDOWN, cache)
+        expected: list[str] = []
+        markdown_to_html_node(MARKDOWN, text_out=expected)
+        text: list[str] = []
+        markdown_to_html_node(MARKDOWN, cache, text_out=text)
+        self.assertEqual("\n".join(text), "\n".join(expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
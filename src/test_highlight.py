@@ -0,0 +1,106 @@
+import re
+import tempfile
+import unittest
+from pathlib import Path
+
+from blockcache import BlockCache
+from highlight import Highlighter, highlight_code
+from parser import markdown_to_html_node
+
+
+def spans(html: str) -> list[tuple[str, str]]:
+    return re.findall(r'<span class="hl-(\w+)">(.*?)</span>', html, re.DOTALL)
+
+
+class TestHighlightCode(unittest.TestCase):
+    def test_unknown_language(self):
+        self.assertIsNone(highlight_code("x = 1", "cobol"))
+
+    def test_python(self):
+        code = '@cache\ndef f(x):  # note\n    return "a#b" if x else 0x1F\n'
+        self.assertEqual(
+            spans(highlight_code(code, "Python")),
+            [
+                ("dec", "@cache"),
+                ("kw", "def"),
+                ("fn", "f"),
+                ("com", "# note"),
+                ("kw", "return"),
+                ("str", '"a#b"'),
+                ("kw", "if"),
+                ("kw", "else"),
+                ("num", "0x1F"),
+            ],
+        )
+
+    def test_escapes_text_between_tokens(self):
+        html = highlight_code("a<b && c", "js")
+        self.assertEqual(html, "a&lt;b &amp;&amp; c")
+
+    def test_json_keys_and_values(self):
+        html = highlight_code('{"a": [true, "b", -2.5]}', "json")
+        self.assertEqual(
+            spans(html),
+            [("key", '"a"'), ("kw", "true"), ("str", '"b"'), ("num", "-2.5")],
+        )
+
+    def test_bash_and_html_aliases(self):
+        self.assertEqual(
+            spans(highlight_code('echo "$HOME" # hi', "sh")),
+            [("str", '"$HOME"'), ("com", "# hi")],
+        )
+        self.assertEqual(
+            spans(highlight_code('<a href="/x">', "xml")),
+            [("tag", "&lt;a"), ("attr", "href"), ("str", '"/x"'), ("tag", "&gt;")],
+        )
+
+    def test_text_round_trips(self):
+        code = "for (let i = 0; i < n; i++) { /* x */ }\n"
+        html = highlight_code(code, "javascript")
+        plain = html.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+        for tag in ("kw", "num", "com"):
+            plain = plain.replace(f'<span class="hl-{tag}">', "")
+        self.assertEqual(plain.replace("</span>", ""), code)
+
+
+class TestHighlighter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name) / "highlight"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_counts_hits_misses_and_time(self):
+        highlighter = Highlighter()
+        first = highlighter.highlight("x = 1", "py")
+        self.assertEqual(highlighter.highlight("x = 1", "py"), first)
+        self.assertIsNone(highlighter.highlight("x = 1", "cobol"))
+        self.assertEqual((highlighter.cache.hits, highlighter.cache.misses), (1, 1))
+        self.assertIn("50.0% hit rate", highlighter.summary())
+
+        hits, misses, elapsed = highlighter.take_counts()
+        self.assertEqual((hits, misses), (1, 1))
+        self.assertGreater(elapsed, 0)
+        self.assertEqual(highlighter.take_counts(), (0, 0, 0))
+
+    def test_disk_entries_survive_a_new_highlighter(self):
+        Highlighter(self.dir).highlight("x = 1", "py")
+        highlighter = Highlighter(self.dir)
+        highlighter.highlight("x = 1", "py")
+        self.assertEqual(highlighter.take_counts()[:2], (1, 0))
+
+    def test_block_cache_keeps_plain_and_highlighted_apart(self):
+        md = "```py\npass\n```"
+        cache = BlockCache()
+        plain = markdown_to_html_node(md, cache).to_html()
+        highlighted = markdown_to_html_node(
+            md, cache, highlighter=Highlighter()
+        ).to_html()
+        self.assertNotIn("hl-kw", plain)
+        self.assertIn('<span class="hl-kw">pass</span>', highlighted)
+        self.assertEqual(cache.misses, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import io
 import unittest
 
 from htmlnode import HTMLNode, LeafNode, ParentNode
@@ -78,5 +79,31 @@ class TestParentNode(unittest.TestCase):
         )
 
 
+class TestRenderTo(unittest.TestCase):
+    def test_list_sink(self):
+        parent_node = ParentNode(
+            "p", [LeafNode(None, "a "), LeafNode("b", "bold"), ParentNode("i", [])]
+        )
+        chunks = []
+        parent_node.render_to(chunks)
+        self.assertEqual(chunks, ["<p>", "a ", "<b>bold</b>", "<i>", "</i>", "</p>"])
+
+    def test_file_sink(self):
+        out = io.StringIO()
+        ParentNode("div", [LeafNode("span", "child")]).render_to(out)
+        self.assertEqual(out.getvalue(), "<div><span>child</span></div>")
+
+    def test_deep_nesting(self):
+        node = LeafNode(None, "x")
+        for _ in range(100_000):
+            node = ParentNode("b", [node])
+        html = node.to_html()
+        self.assertEqual(len(html), 100_000 * len("<b></b>") + 1)
+
+    def test_base_node_not_renderable(self):
+        with self.assertRaises(NotImplementedError):
+            HTMLNode("p", "x").render_to([])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,186 @@
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import imagemeta
+from blockcache import BlockCache
+from imagemeta import ImageMeta, PageImages, image_size
+from parser import markdown_to_html_node
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0\0\0\rIHDR" + struct.pack(">II", 640, 480) + b"\0" * 8
+GIF = b"GIF89a" + struct.pack("<HH", 16, 9) + b"\0" * 8
+WEBP_LOSSY = (
+    b"RIFF\0\0\0\0WEBPVP8 \0\0\0\0\0\0\0\x9d\x01\x2a"
+    + struct.pack("<HH", 1280, 719)
+    + b"\0" * 4
+)
+WEBP_LOSSLESS = (
+    b"RIFF\0\0\0\0WEBPVP8L\0\0\0\0\x2f"
+    + struct.pack("<I", (100 - 1) | ((50 - 1) << 14))
+    + b"\0" * 8
+)
+WEBP_EXTENDED = (
+    b"RIFF\0\0\0\0WEBPVP8X\0\0\0\0\0\0\0\0"
+    + (3000 - 1).to_bytes(3, "little")
+    + (2000 - 1).to_bytes(3, "little")
+    + b"\0" * 4
+)
+JPEG = (
+    b"\xff\xd8"
+    + b"\xff\xe1\x00\x06Exif"  # an app segment to skip
+    + b"\xff\xff\xc2\x00\x11\x08"  # fill byte, then a progressive frame
+    + struct.pack(">HH", 1080, 1920)
+    + b"\0" * 12
+)
+
+
+class TestImageSize(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def size(self, data: bytes):
+        path = self.root / "img"
+        path.write_bytes(data)
+        return image_size(path)
+
+    def test_formats(self):
+        self.assertEqual(self.size(PNG), (640, 480))
+        self.assertEqual(self.size(GIF), (16, 9))
+        self.assertEqual(self.size(WEBP_LOSSY), (1280, 719))
+        self.assertEqual(self.size(WEBP_LOSSLESS), (100, 50))
+        self.assertEqual(self.size(WEBP_EXTENDED), (3000, 2000))
+        self.assertEqual(self.size(JPEG), (1920, 1080))
+
+    def test_unknown_or_truncated(self):
+        self.assertIsNone(self.size(b"not an image"))
+        self.assertIsNone(self.size(b"\xff\xd8\xff\xe1\x00"))
+
+
+class TestLoad(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.static = root / "static"
+        self.cache = root / "docs" / ".image-meta.json"
+        (self.static / "images").mkdir(parents=True)
+        (self.static / "images" / "a.png").write_bytes(PNG)
+        (self.static / "b.gif").write_bytes(GIF)
+        (self.static / "index.css").write_text("p {}")
+        (self.static / "broken.jpg").write_bytes(b"\xff\xd8")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_reads_sizes_once(self):
+        meta = imagemeta.load(self.static, self.cache)
+        self.assertEqual(meta.sizes, {"images/a.png": (640, 480), "b.gif": (16, 9)})
+
+        with mock.patch.object(imagemeta, "image_size") as read:
+            again = imagemeta.load(self.static, self.cache)
+        read.assert_not_called()
+        self.assertEqual(again.sizes, meta.sizes)
+
+    def test_changed_image_is_read_again(self):
+        first = imagemeta.load(self.static, self.cache)
+        (self.static / "b.gif").write_bytes(GIF.replace(b"\x10\x00", b"\x20\x00", 1))
+        meta = imagemeta.load(self.static, self.cache)
+        self.assertEqual(meta.sizes["b.gif"], (32, 9))
+        self.assertEqual(first.sizes["b.gif"], (16, 9))
+
+    def test_lookup(self):
+        meta = imagemeta.load(self.static, self.cache)
+        self.assertEqual(meta.lookup("/images/a.png?v=2"), (640, 480))
+        self.assertIsNone(meta.lookup("images/a.png"))
+        self.assertIsNone(meta.lookup("//cdn/b.gif"))
+        self.assertIsNone(meta.lookup("/missing.png"))
+
+
+class TestPageImages(unittest.TestCase):
+    MARKDOWN = (
+        "# T\n\n![hero](/hero.png)\n\ntext\n\n![a](/a.png) ![b](https://x/b.png)\n\n"
+        "![hero](/hero.png)\n"
+    )
+
+    def setUp(self):
+        self.meta = ImageMeta(Path("static"), {"hero.png": (800, 600), "a.png": (1, 2)})
+
+    def test_first_image_is_eager(self):
+        html = markdown_to_html_node(
+            self.MARKDOWN, images=PageImages(self.meta)
+        ).to_html()
+        self.assertIn('<img src="/hero.png" alt="hero" width="800" height="600">', html)
+        self.assertIn(
+            '<img src="/a.png" alt="a" width="1" height="2" loading="lazy" '
+            'decoding="async">',
+            html,
+        )
+        self.assertIn(
+            '<img src="https://x/b.png" alt="b" loading="lazy" decoding="async">', html
+        )
+        self.assertEqual(html.count("lazy"), 3)
+
+    def test_block_cache_keeps_the_page_order(self):
+        expected = markdown_to_html_node(
+            self.MARKDOWN, images=PageImages(self.meta)
+        ).to_html()
+        cache = BlockCache()
+        for _ in range(2):
+            html = markdown_to_html_node(
+                self.MARKDOWN, cache, images=PageImages(self.meta)
+            ).to_html()
+            self.assertEqual(html, expected)
+        self.assertGreater(cache.hits, 0)
+
+    def test_img_text_does_not_count_as_an_image(self):
+        markdown = "```\n<img src=x>\n```\n\n![a](/a.png)\n\n<img src=y> ![b](/b.png)"
+        expected = markdown_to_html_node(
+            markdown, images=PageImages(self.meta)
+        ).to_html()
+        self.assertIn('height="2">', expected)
+        cache = BlockCache()
+        for _ in range(2):
+            html = markdown_to_html_node(
+                markdown, cache, images=PageImages(self.meta)
+            ).to_html()
+            self.assertEqual(html, expected)
+
+    def test_pages_record_the_images_they_use(self):
+        images = PageImages(self.meta)
+        markdown_to_html_node(self.MARKDOWN + "![c](/c.png)\n", images=images)
+        self.assertEqual(
+            images.used, {"/hero.png": [800, 600], "/a.png": [1, 2], "/c.png": []}
+        )
+        self.assertTrue(self.meta.is_current(images.used))
+
+        moved = ImageMeta(Path("static"), {**self.meta.sizes, "c.png": (3, 4)})
+        self.assertFalse(moved.is_current(images.used))
+        other = ImageMeta(Path("static"), {**self.meta.sizes, "other.png": (5, 6)})
+        self.assertTrue(other.is_current(images.used))
+
+    def test_cached_blocks_follow_their_own_images(self):
+        cache = BlockCache()
+        markdown_to_html_node(self.MARKDOWN, cache, images=PageImages(self.meta))
+        misses = cache.misses
+
+        # an unrelated image leaves every cached block usable
+        other = ImageMeta(Path("static"), {**self.meta.sizes, "other.png": (5, 6)})
+        images = PageImages(other)
+        markdown_to_html_node(self.MARKDOWN, cache, images=images)
+        self.assertEqual(cache.misses, misses)
+        self.assertEqual(images.used, {"/hero.png": [800, 600], "/a.png": [1, 2]})
+
+        resized = ImageMeta(Path("static"), {**self.meta.sizes, "a.png": (7, 8)})
+        html = markdown_to_html_node(
+            self.MARKDOWN, cache, images=PageImages(resized)
+        ).to_html()
+        self.assertIn('width="7" height="8"', html)
+
+
+if __name__ == "__main__":
+    unittest.main()
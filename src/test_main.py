@@ -0,0 +1,511 @@
+import contextlib
+import io
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import highlight
+import imagemeta
+import main
+import pages
+from main import generate_site, generate_sites, parse_args
+from manifest import Manifest
+from pages import extract_title, stream_page, write_page
+from template import Template
+
+
+class TestParseArgs(unittest.TestCase):
+    def test_defaults(self):
+        args = parse_args([])
+        self.assertEqual(args.basepath, "/")
+        self.assertFalse(args.incremental)
+        self.assertEqual(args.jobs, 1)
+        self.assertFalse(args.block_cache)
+
+    def test_block_cache_dir_enables_the_cache(self):
+        self.assertTrue(parse_args(["--block-cache-dir", "cache"]).block_cache)
+
+    def test_basepath_gets_leading_slash(self):
+        self.assertEqual(parse_args(["site/"]).basepath, "/site/")
+
+    def test_jobs_zero_means_all_cores(self):
+        self.assertGreaterEqual(parse_args(["--jobs", "0"]).jobs, 1)
+
+    def test_targets(self):
+        args = parse_args(["--target", "mirror/=out/m", "--target", "/x/=out/x"])
+        self.assertEqual(
+            args.targets, [("/mirror/", Path("out/m")), ("/x/", Path("out/x"))]
+        )
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            parse_args(["--target", "no-dir"])
+
+    def test_cli_passes_parsed_options(self):
+        with mock.patch.object(main, "main") as run:
+            main.cli(["--highlight", "--minify", "--serve", "8080"])
+        (args,), _ = run.call_args
+        self.assertEqual(args.basepath, "/")
+        self.assertEqual(args.serve, 8080)
+        self.assertTrue(args.highlight)
+        self.assertTrue(args.minify)
+        self.assertFalse(args.search)
+
+
+class TestStartup(unittest.TestCase):
+    def test_optional_subsystems_are_not_imported(self):
+        lazy = ["multiprocessing", "postprocess", "search", "server", "watch"]
+        code = f"import sys, main; print([m for m in {lazy!r} if m in sys.modules])"
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(main.__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        self.assertEqual(out.strip(), "[]")
+
+
+class TestParallelSite(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.content = root / "content"
+        self.template = root / "template.html"
+
+        self.content.mkdir()
+        for i in range(6):
+            (self.content / f"page{i}.md").write_text(f"# Page {i}\n\n[home](/)\n")
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, docs: Path, jobs: int) -> str:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            generate_site(self.content, self.template, docs, "/base/", jobs=jobs)
+        return out.getvalue()
+
+    def test_parallel_matches_serial(self):
+        root = Path(self.tmp.name)
+        serial_log = self.build(root / "serial", jobs=1)
+        parallel_log = self.build(root / "parallel", jobs=3)
+
+        self.assertEqual(
+            serial_log.replace("serial", "X"), parallel_log.replace("parallel", "X")
+        )
+        for i in range(6):
+            self.assertEqual(
+                (root / "serial" / f"page{i}.html").read_text(),
+                (root / "parallel" / f"page{i}.html").read_text(),
+            )
+
+    def test_errors_are_reported_in_order(self):
+        (self.content / "page2.md").write_text("no title here\n")
+        (self.content / "page4.md").write_text("no title either\n")
+
+        root = Path(self.tmp.name)
+        logs = {}
+        for jobs in (1, 3):
+            out = root / f"docs{jobs}"
+            with self.subTest(jobs=jobs):
+                log = io.StringIO()
+                with contextlib.redirect_stdout(log), self.assertRaises(
+                    Exception
+                ) as ctx:
+                    generate_site(self.content, self.template, out, "/", jobs=jobs)
+                self.assertIn("failed to generate 2 page(s)", str(ctx.exception))
+                self.assertIn("page2.md", str(ctx.exception))
+                self.assertTrue((out / "page5.html").exists())
+                self.assertEqual(
+                    sorted(Manifest.load(out).pages),
+                    ["page0.md", "page1.md", "page3.md", "page5.md"],
+                )
+                logs[jobs] = log.getvalue().replace(str(out), "X")
+
+        self.assertEqual(logs[1], logs[3])
+
+
+class TestLayouts(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.content = self.root / "content"
+        self.template = self.root / "template.html"
+        self.docs = self.root / "docs"
+
+        (self.content / "blog" / "2024").mkdir(parents=True)
+        (self.content / "index.md").write_text("# Home\n\nhi\n")
+        (self.content / "blog" / "post.md").write_text("# Post\n\nbody\n")
+        (self.content / "blog" / "2024" / "old.md").write_text("# Old\n\nbody\n")
+        (self.root / "layouts").mkdir()
+        (self.root / "layouts" / "blog.html").write_text(
+            "<article>{{ Content }}</article>{{> footer }}"
+        )
+        (self.root / "partials").mkdir()
+        (self.root / "partials" / "footer.html").write_text("<footer>f</footer>")
+        self.template.write_text("<main>{{ Content }}</main>")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self) -> str:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            generate_site(
+                self.content, self.template, self.docs, "/", incremental=True
+            )
+        return out.getvalue()
+
+    def test_section_layouts(self):
+        self.build()
+        self.assertEqual(
+            (self.docs / "index.html").read_text(),
+            "<main><div><h1>Home</h1><p>hi</p></div></main>",
+        )
+        for page in ("blog/post.html", "blog/2024/old.html"):
+            html = (self.docs / page).read_text()
+            self.assertTrue(html.startswith("<article>"), html)
+            self.assertTrue(html.endswith("<footer>f</footer>"), html)
+
+    def test_partial_edit_rebuilds_only_its_pages(self):
+        self.build()
+        manifest = Manifest.load(self.docs)
+        self.assertEqual(
+            manifest.pages["blog/post.md"]["deps"],
+            ["layouts/blog.html", "partials/footer.html"],
+        )
+        self.assertEqual(manifest.pages["index.md"]["deps"], ["template.html"])
+        self.assertEqual(
+            manifest.dependents("partials/footer.html"),
+            ["blog/2024/old.md", "blog/post.md"],
+        )
+
+        (self.root / "partials" / "footer.html").write_text("<footer>g</footer>")
+        log = self.build()
+        self.assertIn("post.md", log)
+        self.assertIn("old.md", log)
+        self.assertNotIn("index.md", log)
+        html = (self.docs / "blog" / "post.html").read_text()
+        self.assertTrue(html.endswith("<footer>g</footer>"))
+
+    def test_unknown_layout_fails_only_its_page(self):
+        (self.content / "index.md").write_text("---\nlayout: nope\n---\n# Home\n")
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), self.assertRaises(Exception) as raised:
+            generate_site(self.content, self.template, self.docs, "/")
+        self.assertIn("index.md", str(raised.exception))
+        self.assertIn("no layout 'nope'", out.getvalue())
+        self.assertTrue((self.docs / "blog" / "post.html").exists())
+        self.assertFalse((self.docs / "index.html").exists())
+        self.assertEqual(
+            sorted(Manifest.load(self.docs).pages), ["blog/2024/old.md", "blog/post.md"]
+        )
+
+
+class TestHighlight(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / "content").mkdir()
+        sample = "```python\nimport os\n```\n"
+        for name in ("a", "b"):
+            (self.root / "content" / f"{name}.md").write_text(f"# {name}\n\n{sample}")
+        (self.root / "t.html").write_text("{{ Content }}")
+        self.highlighter = highlight.enable(self.root / "cache")
+
+    def tearDown(self):
+        highlight.disable()
+        self.tmp.cleanup()
+
+    def build(self, jobs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_site(
+                self.root / "content",
+                self.root / "t.html",
+                self.root / "docs",
+                "/",
+                jobs=jobs,
+            )
+
+    def test_pages_are_highlighted_and_counted(self):
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                self.highlighter.take_counts()
+                self.build(jobs)
+                html = (self.root / "docs" / "a.html").read_text()
+                self.assertIn('<span class="hl-kw">import</span> os', html)
+                hits, misses, _ = self.highlighter.take_counts()
+                self.assertEqual(hits + misses, 2)
+
+        # the second build found the sample on disk
+        self.assertEqual(misses, 0)
+
+    def test_toggling_rebuilds_incremental_pages(self):
+        self.build(1)
+        highlight.disable()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_site(
+                self.root / "content",
+                self.root / "t.html",
+                self.root / "docs",
+                "/",
+                incremental=True,
+            )
+        html = (self.root / "docs" / "a.html").read_text()
+        self.assertNotIn("hl-kw", html)
+
+
+class TestFrontMatter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / "content").mkdir()
+        (self.root / "layouts").mkdir()
+        (self.root / "layouts" / "wide.html").write_text(
+            "<wide>{{ Title }}|{{ Date }}|{{ Tags }}|{{ author }}</wide>"
+        )
+        self.template = self.root / "template.html"
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, name: str, markdown: str) -> str:
+        (self.root / "content" / f"{name}.md").write_text(markdown)
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_site(
+                self.root / "content", self.template, self.root / "docs", "/"
+            )
+        return (self.root / "docs" / f"{name}.html").read_text()
+
+    def test_extract_title_without_blank_line(self):
+        self.assertEqual(extract_title("# Title\nright after"), "Title")
+        self.assertEqual(extract_title("---\ntitle: Meta\n---\n# H1\n"), "Meta")
+        with self.assertRaises(Exception):
+            extract_title("no title\n")
+
+    def test_values_and_layout_from_front_matter(self):
+        html = self.build(
+            "post",
+            "---\ntitle: From meta\ndate: 2024-05-01\ntags: [a, b]\n"
+            "author: Sam\nlayout: wide\n---\n# Heading\n",
+        )
+        self.assertEqual(html, "<wide>From meta|2024-05-01|a, b|Sam</wide>")
+
+    def test_title_falls_back_to_first_h1(self):
+        html = self.build("page", "# Heading\nno blank line\n")
+        self.assertTrue(html.startswith("<title>Heading</title>"), html)
+
+    def test_unknown_layout_fails_the_build(self):
+        with self.assertRaises(Exception) as ctx:
+            self.build("page", "---\nlayout: nope\n---\n# T\n")
+        self.assertIn("page.md", str(ctx.exception))
+
+    def test_streamed_page_reads_front_matter(self):
+        source = self.root / "big.md"
+        source.write_text("---\ntitle: Streamed\n---\nbody\n")
+        template = Template("{{ Title }}:{{ Content }}")
+        stream_page(source, template, [("/", self.root / "s.html")])
+        self.assertEqual(
+            (self.root / "s.html").read_text(), "Streamed:<div><p>body</p></div>"
+        )
+
+
+class TestMinify(unittest.TestCase):
+    def test_switching_minify_rebuilds_pages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "content").mkdir()
+            (root / "content" / "index.md").write_text("# T\n\n```\na   b\n```\n")
+            (root / "t.html").write_text("<body>\n    {{ Content }}\n</body>\n")
+
+            def build(minify):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    generate_site(
+                        root / "content",
+                        root / "t.html",
+                        root / "docs",
+                        "/",
+                        incremental=True,
+                        minify=minify,
+                    )
+                return (root / "docs" / "index.html").read_text()
+
+            plain = build(False)
+            self.assertEqual(
+                build(True),
+                "<body>\n<div><h1>T</h1><pre><code>a   b\n</code></pre></div>\n</body>\n",
+            )
+            self.assertEqual(build(False), plain)
+
+
+class TestWriteIfChanged(unittest.TestCase):
+    def test_identical_output_is_not_rewritten(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "content").mkdir()
+            (root / "content" / "index.md").write_text("# T\n\nbody\n")
+            (root / "t.html").write_text("{{ Content }}")
+            out = root / "docs" / "index.html"
+
+            def build():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    generate_site(root / "content", root / "t.html", root / "docs", "/")
+                return out.stat().st_mtime_ns
+
+            first = build()
+            self.assertEqual(build(), first)
+            (root / "content" / "index.md").write_text("# T\n\nother\n")
+            build()
+            self.assertIn("other", out.read_text())
+            self.assertEqual(list((root / "docs").glob("*.tmp")), [])
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / "content" / "blog").mkdir(parents=True)
+        (self.root / "content" / "index.md").write_text("# Home\n\nWelcome **home**\n")
+        (self.root / "content" / "blog" / "post.md").write_text(
+            "# Post\n\n- first item\n\n```\ncode_word\n```\n"
+        )
+        (self.root / "t.html").write_text("{{ Content }}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, jobs=1):
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_site(
+                self.root / "content",
+                self.root / "t.html",
+                self.root / "docs",
+                "/",
+                incremental=True,
+                jobs=jobs,
+                search=True,
+            )
+
+    def terms(self) -> dict[str, list[str]]:
+        index = self.root / "docs" / "search"
+        docs = json.loads((index / "docs.json").read_text())["docs"]
+        found = {}
+        for shard in index.glob("*.json"):
+            if shard.name not in ("docs.json", ".state.json"):
+                for term, postings in json.loads(shard.read_text()).items():
+                    found[term] = sorted(docs[p[0]][0] for p in postings)
+        return found
+
+    def test_index_is_built_from_rendered_pages(self):
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                shutil.rmtree(self.root / "docs", ignore_errors=True)
+                self.build(jobs)
+                terms = self.terms()
+                self.assertEqual(terms["welcome"], ["index.html"])
+                self.assertEqual(terms["code_word"], ["blog/post.html"])
+                self.assertEqual(terms["post"], ["blog/post.html"])
+
+    def test_incremental_build_keeps_fresh_pages(self):
+        self.build()
+        (self.root / "content" / "index.md").write_text("# Home\n\nGoodbye\n")
+        self.build()
+        terms = self.terms()
+        self.assertNotIn("welcome", terms)
+        self.assertEqual(terms["goodbye"], ["index.html"])
+        self.assertEqual(terms["item"], ["blog/post.html"])
+
+
+class TestMultipleTargets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.content = self.root / "content"
+        self.template = self.root / "template.html"
+
+        self.content.mkdir()
+        for i in range(4):
+            (self.content / f"p{i}.md").write_text(
+                f"# Page {i}\n\n[home](/) ![x](/x.png) and a \0 nul\n"
+            )
+        self.template.write_text('<link href="/i.css">{{ Title }}{{ Content }}')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, targets, incremental=False, jobs=1) -> str:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            generate_sites(self.content, self.template, targets, incremental, jobs)
+        return out.getvalue()
+
+    def test_same_output_as_separate_builds(self):
+        for jobs in (1, 2):
+            both = [("/", self.root / f"a{jobs}"), ("/m/", self.root / f"b{jobs}")]
+            self.build(both, jobs=jobs)
+            for basepath, out_dir in both:
+                self.build([(basepath, self.root / "single")])
+                for i in range(4):
+                    self.assertEqual(
+                        (out_dir / f"p{i}.html").read_text(),
+                        (self.root / "single" / f"p{i}.html").read_text(),
+                    )
+
+        html = (self.root / "b1" / "p0.html").read_text()
+        self.assertIn('<link href="/m/i.css">', html)
+        self.assertIn('<a href="/m/">home</a> <img src="/m/x.png"', html)
+        self.assertIn("a \ufffd nul", html)
+
+    def test_incremental_only_writes_stale_targets(self):
+        a, b = ("/", self.root / "a"), ("/m/", self.root / "b")
+        self.build([a])
+        log = self.build([a, b], incremental=True)
+        self.assertEqual(log.count("Generating page"), 4)
+        self.assertNotIn(str(self.root / "a"), log)
+        self.assertEqual(self.build([a, b], incremental=True), "")
+
+    def test_only_pages_using_a_changed_image_are_rebuilt(self):
+        a = ("/", self.root / "a")
+        (self.content / "p1.md").write_text("# Page 1\n\n![y](/y.png)\n")
+        sizes = {"x.png": (1, 1), "y.png": (2, 2)}
+        try:
+            imagemeta.enable(imagemeta.ImageMeta(self.root, sizes))
+            self.build([a])
+            imagemeta.enable(imagemeta.ImageMeta(self.root, {**sizes, "z.png": (3, 3)}))
+            self.assertEqual(self.build([a], incremental=True), "")
+
+            imagemeta.enable(imagemeta.ImageMeta(self.root, {**sizes, "y.png": (4, 4)}))
+            log = self.build([a], incremental=True)
+        finally:
+            imagemeta.disable()
+        self.assertEqual(log.count("Generating page"), 1)
+        self.assertIn("p1.md", log)
+        self.assertIn('width="4"', (self.root / "a" / "p1.html").read_text())
+
+    def test_new_parser_version_rebuilds_incremental_pages(self):
+        a = ("/", self.root / "a")
+        self.build([a])
+        with mock.patch.object(pages, "PARSER_VERSION", "test"):
+            log = self.build([a], incremental=True)
+        self.assertEqual(log.count("Generating page"), 4)
+
+    def test_streamed_page_matches(self):
+        source = self.content / "p1.md"
+        template = Template(self.template.read_text())
+        targets = [("/", self.root / "s1.html"), ("/m/", self.root / "s2.html")]
+        stream_page(source, template, targets)
+        write_page(source.read_text(), template, [("/m/", self.root / "w.html")])
+        self.assertEqual(
+            (self.root / "s2.html").read_text(), (self.root / "w.html").read_text()
+        )
+        self.assertFalse(list(self.root.glob("*.tmp")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import contextlib
+import io
+import tempfile
+import json
+import os
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import manifest as manifest_module
+from main import generate_site
+from manifest import DELTA_NAME, Manifest, MANIFEST_NAME, digest
+
+
+class TestManifest(unittest.TestCase):
+    def test_digest_is_length_prefixed(self):
+        self.assertNotEqual(digest("ab", "c"), digest("a", "bc"))
+
+    def test_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp)
+            (out / "a.html").write_text("x")
+            manifest = Manifest(out)
+            manifest.record("a.md", "a.html", "h1")
+            manifest.save()
+
+            loaded = Manifest.load(out)
+            self.assertTrue(loaded.is_fresh("a.md", "h1"))
+            self.assertFalse(loaded.is_fresh("a.md", "h2"))
+            self.assertFalse(loaded.is_fresh("b.md", "h1"))
+
+    def test_missing_output_is_stale(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = Manifest(Path(tmp))
+            manifest.record("a.md", "a.html", "h1")
+            self.assertFalse(manifest.is_fresh("a.md", "h1"))
+
+    def test_corrupt_manifest_loads_empty(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            (Path(tmp) / MANIFEST_NAME).write_text("{nope")
+            self.assertEqual(Manifest.load(Path(tmp)).pages, {})
+
+    def test_prune(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp)
+            (out / "gone.html").write_text("x")
+            manifest = Manifest(out)
+            manifest.record("gone.md", "gone.html", "h")
+            manifest.record("kept.md", "kept.html", "h")
+
+            removed = manifest.prune({"kept.md"})
+            self.assertEqual(removed, [out / "gone.html"])
+            self.assertFalse((out / "gone.html").exists())
+            self.assertEqual(list(manifest.pages), ["kept.md"])
+
+    def test_scan_outputs_reports_delta(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp)
+            (out / "a.html").write_text("a")
+            (out / "b.html").write_text("b")
+            (out / "gone.html").write_text("x")
+            manifest = Manifest(out)
+            first = manifest.scan_outputs()
+            self.assertEqual(sorted(first.added), ["a.html", "b.html", "gone.html"])
+            manifest.save()
+
+            (out / "b.html").write_text("bb")
+            (out / "gone.html").unlink()
+            (out / "new.html").write_text("n")
+            (out / ".nojekyll").write_text("")
+            (out / "search").mkdir()
+            (out / "search" / ".state.json").write_text("{}")
+            (out / "c.html.123.tmp").write_text("partial")
+            delta = Manifest.load(out).scan_outputs()
+            self.assertEqual(sorted(delta.added), [".nojekyll", "new.html"])
+            self.assertEqual(list(delta.changed), ["b.html"])
+            self.assertEqual(delta.deleted, ["gone.html"])
+            self.assertEqual(delta.unchanged, 1)
+
+            delta.save(out)
+            saved = json.loads((out / DELTA_NAME).read_text())
+            self.assertEqual(saved["deleted"], ["gone.html"])
+            self.assertEqual(
+                saved["added"]["new.html"], manifest_module.file_digest(out / "new.html")
+            )
+
+    def test_scan_outputs_skips_hashing_unchanged_stat(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp)
+            (out / "a.html").write_text("a")
+            manifest = Manifest(out)
+            manifest.scan_outputs()
+            with mock.patch.object(manifest_module, "file_digest") as file_digest:
+                delta = manifest.scan_outputs()
+            file_digest.assert_not_called()
+            self.assertEqual(delta.unchanged, 1)
+
+            # touched but identical: rehashed, still not a change
+            stat = (out / "a.html").stat()
+            os.utime(out / "a.html", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            delta = manifest.scan_outputs()
+            self.assertEqual((delta.changed, delta.unchanged), ({}, 1))
+
+
+class TestIncrementalSite(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.content = root / "content"
+        self.docs = root / "docs"
+        self.template = root / "template.html"
+
+        (self.content / "blog").mkdir(parents=True)
+        (self.content / "index.md").write_text("# Home\n\nhello\n")
+        (self.content / "blog" / "post.md").write_text("# Post\n\nbody\n")
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, basepath="/", incremental=True) -> str:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            generate_site(
+                self.content, self.template, self.docs, basepath, incremental
+            )
+        return out.getvalue()
+
+    def test_second_build_skips_everything(self):
+        self.build()
+        self.assertTrue((self.docs / "blog" / "post.html").exists())
+        self.assertEqual(self.build(), "")
+
+    def test_only_changed_page_is_regenerated(self):
+        self.build()
+        (self.content / "index.md").write_text("# Home\n\nhello again\n")
+        log = self.build()
+        self.assertIn("index.md", log)
+        self.assertNotIn("post.md", log)
+
+    def test_template_or_basepath_change_rebuilds_all(self):
+        self.build()
+        self.assertEqual(self.build(basepath="/sub/").count("Generating page"), 2)
+        self.template.write_text("<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertEqual(self.build(basepath="/sub/").count("Generating page"), 2)
+
+    def test_deleted_source_is_pruned(self):
+        self.build()
+        (self.content / "blog" / "post.md").unlink()
+        self.build()
+        self.assertFalse((self.docs / "blog" / "post.html").exists())
+        self.assertTrue((self.docs / "index.html").exists())
+
+    def test_full_build_ignores_manifest(self):
+        self.build()
+        self.assertEqual(self.build(incremental=False).count("Generating page"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
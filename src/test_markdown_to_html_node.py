@@ -1,6 +1,8 @@
 import unittest
 
+from highlight import Highlighter
 from parser import markdown_to_html_node
+from urls import BasepathRewriter
 
 
 class TestMarkdownToHtmlNode(unittest.TestCase):
@@ -101,6 +103,49 @@ raw_code()
             '<div><h1>Title</h1><p>Paragraph with <a href="https://example.com">link</a> inside it</p><blockquote>Quoted line with <b>bold</b></blockquote><ul><li>first bullet</li><li>second bullet</li></ul><pre><code>raw_code()\n</code></pre></div>',
         )
 
+    def test_reference_links(self):
+        md = """
+Read the [guide][docs] or the [faq].
+
+- also [docs]
+
+[docs]: /guide.html
+[FAQ]: /faq.html
+"""
+
+        node = markdown_to_html_node(md)
+        html = node.to_html()
+        self.assertEqual(
+            html,
+            '<div><p>Read the <a href="/guide.html">guide</a> or the <a href="/faq.html">faq</a>.</p><ul><li>also <a href="/guide.html">docs</a></li></ul></div>',
+        )
+
+    def test_rewrite_url_skips_code(self):
+        md = '[home](/) ![logo](/logo.png)\n\n```\n<a href="/raw">\n```'
+        html = markdown_to_html_node(md, rewrite_url=BasepathRewriter("/site/")).to_html()
+        self.assertEqual(
+            html,
+            '<div><p><a href="/site/">home</a> <img src="/site/logo.png" alt="logo"></img></p>'
+            '<pre><code><a href="/raw">\n</code></pre></div>',
+        )
+
+    def test_codeblock_info_string(self):
+        md = "```python  title=x\nx = 1\n```"
+        html = markdown_to_html_node(md).to_html()
+        self.assertEqual(
+            html, '<div><pre><code class="language-python">x = 1\n</code></pre></div>'
+        )
+
+    def test_codeblock_highlighted(self):
+        md = "```py\nreturn a < 1\n```\n\n```text\n<b>\n```"
+        html = markdown_to_html_node(md, highlighter=Highlighter()).to_html()
+        self.assertEqual(
+            html,
+            '<div><pre><code class="language-py"><span class="hl-kw">return</span> '
+            'a &lt; <span class="hl-num">1</span>\n</code></pre>'
+            '<pre><code class="language-text"><b>\n</code></pre></div>',
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,80 @@
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pages
+from main import generate_site
+from pages import stream_page, write_page
+from template import Template
+
+
+class TestStreamPage(unittest.TestCase):
+    MARKDOWN = (
+        "# Big _page_\n\nintro with [link](/a) and ![img](/b.png)\n\n"
+        "- one\n- two\n\n> quote\n\n```\ncode\n\nmore code\n```\n\n"
+        "1. x\n2. y\n"
+    )
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.source = self.root / "big.md"
+        self.source.write_text(self.MARKDOWN)
+        self.template = Template('<title>{{ Title }}</title><a href="/">{{ Content }}')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_same_output_as_full_render(self):
+        stream_page(self.source, self.template, [("/base/", self.root / "s.html")])
+        write_page(self.MARKDOWN, self.template, [("/base/", self.root / "f.html")])
+        self.assertEqual(
+            (self.root / "s.html").read_text(), (self.root / "f.html").read_text()
+        )
+
+    def build_both_ways(self, markdown: str) -> list[str]:
+        (self.root / "content").mkdir()
+        (self.root / "content" / "page.md").write_text(markdown)
+        (self.root / "t.html").write_text("<title>{{ Title }}</title>{{ Content }}")
+        built = []
+        for threshold in (pages.STREAM_THRESHOLD, 0):
+            with mock.patch.object(pages, "STREAM_THRESHOLD", threshold):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    generate_site(
+                        self.root / "content",
+                        self.root / "t.html",
+                        self.root / "docs",
+                        "/",
+                    )
+            built.append((self.root / "docs" / "page.html").read_text())
+        return built
+
+    def test_title_after_other_blocks(self):
+        whole, streamed = self.build_both_ways("intro\n\n# Late title\n\nbody\n")
+        self.assertEqual(whole, streamed)
+        self.assertTrue(streamed.startswith("<title>Late title</title><div><p>intro"))
+
+    def test_definitions_after_their_use(self):
+        whole, streamed = self.build_both_ways("# T\n\nsee [docs][d]\n\n[d]: /docs\n")
+        self.assertEqual(whole, streamed)
+        self.assertIn('<a href="/docs">docs</a>', streamed)
+
+    def test_missing_title_leaves_no_output(self):
+        self.source.write_text("no title\n")
+        with self.assertRaises(Exception):
+            stream_page(self.source, self.template, [("/", self.root / "s.html")])
+        self.assertEqual(sorted(p.name for p in self.root.iterdir()), ["big.md"])
+
+    def test_large_sources_take_streaming_path(self):
+        with mock.patch.object(pages, "STREAM_THRESHOLD", 10), mock.patch.object(
+            pages, "stream_page"
+        ) as streamed:
+            pages.build_page(self.source, self.template, [("/", self.root / "s.html")])
+        streamed.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
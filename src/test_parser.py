@@ -9,6 +9,8 @@ from parser import (
     text_to_text_nodes,
     markdown_to_blocks,
     block_to_block_type,
+    read_front_matter,
+    scan_blocks,
 )
 from block import BlockType
 
@@ -109,6 +111,11 @@ class TestSplitNodesDelimiter(unittest.TestCase):
             ],
         )
 
+    def test_many_pairs_no_recursion_limit(self):
+        node = TextNode("x `y` " * 5000, TextType.TEXT)
+        new_nodes = split_nodes_delimiter([node], "`", TextType.CODE)
+        self.assertEqual(len(new_nodes), 10001)
+
     def test_text_at_end(self):
         node = TextNode("bold at **end**", TextType.TEXT)
         new_nodes = split_nodes_delimiter([node], "**", TextType.BOLD)
@@ -543,6 +550,25 @@ class TestSplitNodesLink(unittest.TestCase):
             new_nodes,
         )
 
+    def test_repeated_link(self):
+        node = TextNode("[a](/x) mid [a](/x) end", TextType.TEXT)
+        new_nodes = split_nodes_link([node])
+        self.assertListEqual(
+            [
+                TextNode("a", TextType.LINK, "/x"),
+                TextNode(" mid ", TextType.TEXT),
+                TextNode("a", TextType.LINK, "/x"),
+                TextNode(" end", TextType.TEXT),
+            ],
+            new_nodes,
+        )
+
+    def test_many_links_linear(self):
+        node = TextNode(" ".join(f"[l{i}](/p{i})" for i in range(5000)), TextType.TEXT)
+        new_nodes = split_nodes_link([node])
+        self.assertEqual(len(new_nodes), 9999)
+        self.assertEqual(new_nodes[-1], TextNode("l4999", TextType.LINK, "/p4999"))
+
 
 class TestTextToTextNodes(unittest.TestCase):
     def test_text_to_text_nodes_example(self):
@@ -695,6 +721,103 @@ class TestTextToTextNodes(unittest.TestCase):
             nodes,
         )
 
+    def test_many_markers_no_recursion_limit(self):
+        text = "a **b** " * 5000
+        nodes = text_to_text_nodes(text)
+        self.assertEqual(len(nodes), 10001)
+        self.assertEqual(nodes[1], TextNode("b", TextType.BOLD))
+        self.assertEqual(nodes[-1], TextNode(" ", TextType.TEXT))
+
+    def test_code_span_is_literal(self):
+        nodes = text_to_text_nodes("run `a_b **c**` now")
+        self.assertListEqual(
+            [
+                TextNode("run ", TextType.TEXT),
+                TextNode("a_b **c**", TextType.CODE),
+                TextNode(" now", TextType.TEXT),
+            ],
+            nodes,
+        )
+
+    def test_underscore_in_link_url(self):
+        nodes = text_to_text_nodes("see [docs](https://example.com/a_b.html)")
+        self.assertListEqual(
+            [
+                TextNode("see ", TextType.TEXT),
+                TextNode("docs", TextType.LINK, "https://example.com/a_b.html"),
+            ],
+            nodes,
+        )
+
+    def test_brackets_in_link_text(self):
+        nodes = text_to_text_nodes("[a [b] c](u) and ![x [y]](i.png)")
+        self.assertListEqual(
+            [
+                TextNode("a [b] c", TextType.LINK, "u"),
+                TextNode(" and ", TextType.TEXT),
+                TextNode("x [y]", TextType.IMAGE, "i.png"),
+            ],
+            nodes,
+        )
+
+    def test_unmatched_bracket_is_text(self):
+        nodes = text_to_text_nodes("a [b and ![c] d")
+        self.assertListEqual([TextNode("a [b and ![c] d", TextType.TEXT)], nodes)
+
+    def test_unmatched_delimiter_raises(self):
+        with self.assertRaises(Exception):
+            text_to_text_nodes("This has **no closing")
+
+
+
+class TestReferenceLinks(unittest.TestCase):
+    REFS = {"boot dev": "https://boot.dev", "logo": "/logo.png"}
+
+    def test_full_reference(self):
+        nodes = text_to_text_nodes("see [the site][Boot  Dev] now", self.REFS)
+        self.assertListEqual(
+            [
+                TextNode("see ", TextType.TEXT),
+                TextNode("the site", TextType.LINK, "https://boot.dev"),
+                TextNode(" now", TextType.TEXT),
+            ],
+            nodes,
+        )
+
+    def test_collapsed_and_shortcut(self):
+        nodes = text_to_text_nodes("[boot dev][] and [boot dev]", self.REFS)
+        self.assertListEqual(
+            [
+                TextNode("boot dev", TextType.LINK, "https://boot.dev"),
+                TextNode(" and ", TextType.TEXT),
+                TextNode("boot dev", TextType.LINK, "https://boot.dev"),
+            ],
+            nodes,
+        )
+
+    def test_image_reference(self):
+        nodes = text_to_text_nodes("![our logo][logo]", self.REFS)
+        self.assertListEqual([TextNode("our logo", TextType.IMAGE, "/logo.png")], nodes)
+
+    def test_undefined_reference_is_text(self):
+        nodes = text_to_text_nodes("[x][nope] and [y]", self.REFS)
+        self.assertListEqual([TextNode("[x][nope] and [y]", TextType.TEXT)], nodes)
+
+    def test_definitions_collected_and_dropped(self):
+        refs = {}
+        md = "Para [a]\n\n[A]: /first\n[b]: <https://b.example> 'title'\n\n[a]: /second"
+        blocks = list(scan_blocks(md, refs))
+        self.assertEqual(blocks, [("Para [a]", BlockType.PARAGRAPH)])
+        self.assertEqual(refs, {"a": "/first", "b": "https://b.example"})
+
+    def test_definitions_before_other_lines(self):
+        refs = {}
+        blocks = list(scan_blocks("[a]: /x\n- item [a]", refs))
+        self.assertEqual(blocks, [("- item [a]", BlockType.UNORDERED_LIST)])
+
+    def test_blocks_keep_definitions_without_refs(self):
+        self.assertEqual(markdown_to_blocks("[a]: /x"), ["[a]: /x"])
+
 
 class TestMarkdownToBlocks(unittest.TestCase):
     def test_markdown_to_blocks(self):
@@ -779,6 +902,108 @@ This is the same paragraph on a new line
         blocks = markdown_to_blocks(md)
         self.assertEqual([], blocks)
 
+    def test_fenced_code_keeps_blank_lines(self):
+        md = "Intro\n\n```\nfirst\n\n\nsecond\n```\n\nOutro"
+        blocks = markdown_to_blocks(md)
+        self.assertEqual(
+            ["Intro", "```\nfirst\n\n\nsecond\n```", "Outro"], blocks
+        )
+
+    def test_unclosed_fence_splits_normally(self):
+        md = "```\ncode\n\nmore\n\n```python"
+        blocks = markdown_to_blocks(md)
+        self.assertEqual(["```\ncode", "more", "```python"], blocks)
+
+    def test_closing_fence_ends_block(self):
+        md = "```\ncode\n```\nafter"
+        blocks = markdown_to_blocks(md)
+        self.assertEqual(["```\ncode\n```", "after"], blocks)
+
+    def test_same_blocks_as_the_scanner(self):
+        md = (
+            "---\ntitle: T\n---\nintro ```x``` here\n\n  ```py\na\n\n\nb\n```  \n"
+            "```\nc\n```\nafter\n\n\n[a]: /x"
+        )
+        blocks = markdown_to_blocks(md)
+        self.assertEqual(
+            [
+                "intro ```x``` here",
+                "```py\na\n\n\nb\n```",
+                "```\nc\n```",
+                "after",
+                "[a]: /x",
+            ],
+            blocks,
+        )
+        self.assertEqual([block for block, _ in scan_blocks(md)], blocks)
+
+
+class TestScanBlocks(unittest.TestCase):
+    def test_types_in_one_pass(self):
+        md = "# Title\n\n- a\n- b\n\n> q\n\n1. x\n\n```\nc\n\nd\n```\n\ntext"
+        self.assertEqual(
+            [block_type for _, block_type in scan_blocks(md)],
+            [
+                BlockType.HEADING,
+                BlockType.UNORDERED_LIST,
+                BlockType.QUOTE,
+                BlockType.ORDERED_LIST,
+                BlockType.CODE,
+                BlockType.PARAGRAPH,
+            ],
+        )
+
+    def test_accepts_line_iterator(self):
+        lines = iter(["# Title\n", "\n", "body\n", "more\n"])
+        self.assertEqual(
+            list(scan_blocks(lines)),
+            [("# Title", BlockType.HEADING), ("body\nmore", BlockType.PARAGRAPH)],
+        )
+
+
+class TestFrontMatter(unittest.TestCase):
+    def test_front_matter_is_collected_and_dropped(self):
+        md = "---\ntitle: Hello\ndate: 2024-05-01\nTags: a, b\n---\n# Heading\n\nbody"
+        meta = {}
+        blocks = list(scan_blocks(md, meta=meta))
+        self.assertEqual(
+            meta, {"title": "Hello", "date": "2024-05-01", "tags": "a, b"}
+        )
+        self.assertEqual(blocks[0], ("# Heading", BlockType.HEADING))
+        self.assertEqual(list(scan_blocks(md)), blocks)
+
+    def test_first_h1_is_the_fallback_title(self):
+        meta = {}
+        md = "intro\n\n## Sub\n\n# Real title\nno blank\n\nx"
+        blocks = scan_blocks(md, meta=meta)
+        next(blocks)
+        self.assertNotIn("title", meta)
+        list(blocks)
+        self.assertEqual(meta["title"], "Real title")
+
+    def test_title_is_set_when_its_block_is_handed_out(self):
+        meta = {}
+        next(scan_blocks(iter(["# Streamed\n", "\n", "body\n"]), meta=meta))
+        self.assertEqual(meta, {"title": "Streamed"})
+
+    def test_not_front_matter_stays_content(self):
+        for md in ("---\nnot a key value\n---\n", "---\ntitle: x\n"):
+            with self.subTest(md=md):
+                meta = {}
+                blocks = list(scan_blocks(md, meta=meta))
+                self.assertEqual(meta, {})
+                self.assertEqual("\n".join(b for b, _ in blocks), md.strip())
+
+    def test_read_front_matter_stops_at_the_fence(self):
+        def lines():
+            yield "---\n"
+            yield "layout: wide\n"
+            yield "---\n"
+            raise AssertionError("read past the front matter")
+
+        self.assertEqual(read_front_matter(lines()), {"layout": "wide"})
+        self.assertEqual(read_front_matter(["# no front matter\n"]), {})
+
 
 class TestBlockToBlockType(unittest.TestCase):
     def test_heading(self):
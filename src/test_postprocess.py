@@ -0,0 +1,117 @@
+import gzip
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import postprocess
+from postprocess import MinifyWriter, compress_tree, minify_file, minify_html
+
+
+class TestMinifyHtml(unittest.TestCase):
+    def test_collapses_whitespace(self):
+        self.assertEqual(
+            minify_html("<p>a   b\t c</p>\n\n   <p>d</p>"), "<p>a b c</p>\n<p>d</p>"
+        )
+
+    def test_keeps_whitespace_sensitive_elements(self):
+        html = (
+            "<pre><code>x  =\n\n  1</code></pre>  <TEXTAREA a='1'>  t  </textarea>"
+            "<script>if (a)  {\n}</script> <style>p  {}</style>"
+        )
+        self.assertEqual(
+            minify_html(html),
+            "<pre><code>x  =\n\n  1</code></pre> <TEXTAREA a='1'>  t  </textarea>"
+            "<script>if (a)  {\n}</script> <style>p  {}</style>",
+        )
+
+    def test_unclosed_pre_runs_to_the_end(self):
+        self.assertEqual(minify_html("a  b<pre> x   y"), "a b<pre> x   y")
+
+    def test_non_breaking_space_is_kept(self):
+        self.assertEqual(minify_html("a\u00a0\u00a0b"), "a\u00a0\u00a0b")
+
+    def test_writer_output_does_not_depend_on_chunks(self):
+        html = (
+            "<p>a  \n b</p>  <PRE>x   y</pre >  <preview>  "
+            "<script>if  (a)</script\n>c  "
+        )
+        for size in (1, 2, 3, 7, len(html)):
+            with self.subTest(size=size):
+                out = io.StringIO()
+                writer = MinifyWriter(out)
+                for i in range(0, len(html), size):
+                    writer.write(html[i : i + size])
+                writer.close()
+                self.assertEqual(out.getvalue(), minify_html(html))
+
+
+class TestPostprocessFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out = Path(self.tmp.name)
+        (self.out / "sub").mkdir()
+        (self.out / "index.html").write_text("<p>a    b</p>")
+        (self.out / "sub" / "site.css").write_text("p { color: red }")
+        (self.out / "logo.png").write_bytes(b"png")
+        (self.out / ".build-manifest.json").write_text("{}")
+        (self.out / ".well-known").mkdir()
+        (self.out / ".well-known" / "security.txt").write_text("Contact: x")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_minify_file(self):
+        self.assertTrue(minify_file(self.out / "index.html"))
+        self.assertEqual((self.out / "index.html").read_text(), "<p>a b</p>")
+        self.assertFalse(minify_file(self.out / "index.html"))
+
+    def test_compress_text_outputs(self):
+        result = compress_tree(self.out, jobs=2)
+        self.assertEqual(result.compressed, 3)
+        self.assertTrue((self.out / ".well-known" / "security.txt.gz").exists())
+        self.assertEqual(
+            gzip.decompress((self.out / "sub" / "site.css.gz").read_bytes()),
+            b"p { color: red }",
+        )
+        self.assertFalse((self.out / "logo.png.gz").exists())
+        self.assertFalse((self.out / ".build-manifest.json.gz").exists())
+
+    def test_compression_reads_in_chunks(self):
+        with mock.patch.object(postprocess, "CHUNK_SIZE", 3):
+            self.assertTrue(minify_file(self.out / "index.html"))
+            compress_tree(self.out)
+        self.assertEqual(
+            gzip.decompress((self.out / "index.html.gz").read_bytes()), b"<p>a b</p>"
+        )
+
+    def test_unchanged_outputs_are_skipped(self):
+        compress_tree(self.out)
+        result = compress_tree(self.out)
+        self.assertEqual((result.compressed, result.unchanged), (0, 3))
+
+        page = self.out / "index.html"
+        page.write_text("<p>new</p>")
+        stat = page.stat()
+        os.utime(page, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        result = compress_tree(self.out)
+        self.assertEqual((result.compressed, result.unchanged), (1, 2))
+        self.assertEqual(
+            gzip.decompress((self.out / "index.html.gz").read_bytes()), b"<p>new</p>"
+        )
+
+    def test_orphaned_siblings_are_removed(self):
+        compress_tree(self.out)
+        (self.out / "index.html").unlink()
+        (self.out / "data.json.gz").write_bytes(b"shipped as is")
+
+        result = compress_tree(self.out, keep={"data.json.gz"})
+        self.assertEqual(result.removed, 1)
+        self.assertFalse((self.out / "index.html.gz").exists())
+        self.assertTrue((self.out / "data.json.gz").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import profiling
+from main import generate_site
+
+
+class TestProfiler(unittest.TestCase):
+    def test_stage_records_event(self):
+        profiler = profiling.Profiler()
+        with profiler.stage("parse", "a.md"):
+            pass
+        stage, page, _, duration, pid, _ = profiler.events[0]
+        self.assertEqual((stage, page, pid), ("parse", "a.md", os.getpid()))
+        self.assertGreaterEqual(duration, 0)
+
+    def test_disabled_stage_is_shared_null_context(self):
+        profiling.disable()
+        self.assertIs(profiling.stage("a", "x"), profiling.stage("b", "y"))
+
+    def test_summary_and_trace(self):
+        profiler = profiling.Profiler()
+        profiler.add("parse", "slow.md", 0, 5_000_000)
+        profiler.add("parse", "fast.md", 5_000_000, 1_000_000)
+        profiler.add("write", "fast.md", 6_000_000, 1_000_000)
+
+        summary = profiler.summary()
+        self.assertLess(summary.index("slow.md"), summary.index("fast.md"))
+        self.assertIn("parse", summary)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "trace.json"
+            profiler.write_trace(path)
+            events = json.loads(path.read_text())["traceEvents"]
+
+        spans = [event for event in events if event["ph"] == "X"]
+        self.assertEqual(len(spans), 3)
+        self.assertEqual(spans[1]["ts"], 5000)
+        self.assertEqual(spans[1]["dur"], 1000)
+        self.assertTrue(any(event["ph"] == "M" for event in events))
+
+
+class TestProfiledBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.content = root / "content"
+        self.template = root / "template.html"
+        self.content.mkdir()
+        for i in range(4):
+            (self.content / f"p{i}.md").write_text(f"# P{i}\n\ntext\n")
+        self.template.write_text("{{ Title }}{{ Content }}")
+
+    def tearDown(self):
+        profiling.disable()
+        self.tmp.cleanup()
+
+    def build(self, jobs: int) -> profiling.Profiler:
+        profiler = profiling.enable()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_site(
+                self.content, self.template, Path(self.tmp.name) / "d", "/", jobs=jobs
+            )
+        profiling.disable()
+        return profiler
+
+    def test_serial_stages(self):
+        profiler = self.build(jobs=1)
+        self.assertEqual(
+            set(profiler.stage_totals()),
+            {"read", "markdown_to_html_node", "render", "write"},
+        )
+        self.assertEqual(len(profiler.page_totals()), 4)
+
+    def test_parallel_events_come_from_workers(self):
+        profiler = self.build(jobs=2)
+        self.assertEqual(len(profiler.events), 4 * 4)
+        self.assertNotIn(os.getpid(), {event[4] for event in profiler.events})
+
+    def test_nothing_recorded_when_disabled(self):
+        profiler = profiling.enable()
+        profiling.disable()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_site(self.content, self.template, Path(self.tmp.name) / "d", "/")
+        self.assertEqual(profiler.events, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import itertools
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from search import INDEX_DIR, SearchIndex, postings, shard_name, tokenize
+
+
+def decode(posting: list[int]) -> list[int]:
+    return list(itertools.accumulate(posting[1:]))
+
+
+class TestTokenize(unittest.TestCase):
+    def test_words_are_casefolded_and_tags_dropped(self):
+        self.assertEqual(
+            tokenize("Hello<br>World, <b>straße</b> 42!"),
+            ["hello", "world", "strasse", "42"],
+        )
+
+    def test_positions_are_delta_encoded(self):
+        self.assertEqual(
+            postings("a b a c a"), {"a": [0, 2, 2], "b": [1], "c": [3]}
+        )
+
+    def test_shard_names_are_ascii(self):
+        self.assertEqual(shard_name("hello"), "he")
+        self.assertEqual(shard_name("x"), "x")
+        self.assertEqual(shard_name("éa"), "_e9a")
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out = Path(self.tmp.name)
+        self.dir = self.out / INDEX_DIR
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def shard(self, name: str) -> dict:
+        return json.loads((self.dir / f"{name}.json").read_text())
+
+    def docs(self) -> list:
+        return json.loads((self.dir / "docs.json").read_text())["docs"]
+
+    def build(self, live, pages) -> int:
+        index = SearchIndex.load(self.out, "/")
+        index.update(set(live), pages)
+        return index.save()
+
+    def test_postings_point_at_docs(self):
+        self.build(
+            ["a.html", "b.html"],
+            {"a.html": ("A", "apple pie apple"), "b.html": ("B", "pie")},
+        )
+        self.assertEqual(self.docs(), [["a.html", "A"], ["b.html", "B"]])
+        apple = self.shard("ap")["apple"]
+        self.assertEqual([(p[0], decode(p)) for p in apple], [(0, [0, 2])])
+        self.assertEqual(sorted(p[0] for p in self.shard("pi")["pie"]), [0, 1])
+
+    def test_incremental_update_touches_only_affected_shards(self):
+        self.build(
+            ["a.html", "b.html"],
+            {"a.html": ("A", "apple"), "b.html": ("B", "banana")},
+        )
+        banana = (self.dir / "ba.json").stat().st_mtime_ns
+
+        self.build(["a.html", "b.html"], {"a.html": ("A", "cherry")})
+        self.assertFalse((self.dir / "ap.json").exists())
+        self.assertEqual(list(self.shard("ch")), ["cherry"])
+        self.assertEqual((self.dir / "ba.json").stat().st_mtime_ns, banana)
+        self.assertEqual(self.shard("ba")["banana"][0][0], 1)
+
+    def test_deleted_page_is_dropped_and_its_id_reused(self):
+        self.build(
+            ["a.html", "b.html"],
+            {"a.html": ("A", "shared"), "b.html": ("B", "shared")},
+        )
+        self.build(["b.html"], {})
+        self.assertEqual(self.docs(), [None, ["b.html", "B"]])
+        self.assertEqual([p[0] for p in self.shard("sh")["shared"]], [1])
+
+        self.build(["b.html", "c.html"], {"c.html": ("C", "shared")})
+        self.assertEqual(self.docs(), [["c.html", "C"], ["b.html", "B"]])
+
+    def test_unchanged_index_writes_nothing(self):
+        pages = {"a.html": ("A", "apple")}
+        self.build(["a.html"], pages)
+        self.assertEqual(self.build(["a.html"], pages), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from server import PageCache, serve
+
+
+class TestPageCache(unittest.TestCase):
+    def test_hit_needs_the_same_stamp(self):
+        cache = PageCache()
+        self.assertEqual(cache.get(Path("a"), (1, 1, None), lambda: b"one"), b"one")
+        self.assertEqual(cache.get(Path("a"), (1, 1, None), lambda: b"two"), b"one")
+        self.assertEqual(cache.get(Path("a"), (2, 1, None), lambda: b"two"), b"two")
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_bounded_lru(self):
+        cache = PageCache(max_bytes=8)
+        cache.get(Path("a"), (1, 1, None), lambda: b"aaaa")
+        cache.get(Path("b"), (1, 1, None), lambda: b"bbbb")
+        cache.get(Path("a"), (1, 1, None), lambda: b"xxxx")
+        cache.get(Path("c"), (1, 1, None), lambda: b"cccc")
+        self.assertEqual(cache.get(Path("a"), (1, 1, None), lambda: b"new!"), b"aaaa")
+        self.assertEqual(cache.get(Path("b"), (1, 1, None), lambda: b"new!"), b"new!")
+
+    def test_concurrent_misses_render_once(self):
+        cache = PageCache()
+        started = threading.Event()
+        release = threading.Event()
+        renders = []
+
+        def render():
+            renders.append(1)
+            started.set()
+            release.wait(5)
+            return b"page"
+
+        results = []
+        first = threading.Thread(
+            target=lambda: results.append(cache.get(Path("a"), (1, 1, None), render))
+        )
+        first.start()
+        started.wait(5)
+        others = [
+            threading.Thread(
+                target=lambda: results.append(
+                    cache.get(Path("a"), (1, 1, None), render)
+                )
+            )
+            for _ in range(4)
+        ]
+        for thread in others:
+            thread.start()
+        while cache.coalesced < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in [first, *others]:
+            thread.join(5)
+
+        self.assertEqual(renders, [1])
+        self.assertEqual(results, [b"page"] * 5)
+
+    def test_failed_render_is_not_cached(self):
+        cache = PageCache()
+
+        def fail():
+            raise ValueError("broken")
+
+        with self.assertRaises(ValueError):
+            cache.get(Path("a"), (1, 1, None), fail)
+        self.assertEqual(cache.get(Path("a"), (1, 1, None), lambda: b"ok"), b"ok")
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.content = root / "content"
+        self.static = root / "static"
+        (self.content / "blog").mkdir(parents=True)
+        self.static.mkdir()
+        (self.content / "index.md").write_text("# Home\n\n[post](/blog/post.html)\n")
+        (self.content / "blog" / "post.md").write_text("# Post\n\nfirst\n")
+        (self.content / "broken.md").write_text("no title\n")
+        (self.static / "site.css").write_text("p {}")
+        template = root / "template.html"
+        template.write_text("<title>{{ Title }}</title>{{ Content }}")
+
+        self.cache = PageCache()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.server = serve(
+                self.content, self.static, template, 0, "/sub/", self.cache
+            )
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}/sub/"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def get(self, path: str) -> bytes:
+        with urllib.request.urlopen(self.base + path) as resp:
+            return resp.read()
+
+    def test_pages_render_on_request(self):
+        index = self.get("")
+        self.assertIn(b"<title>Home</title>", index)
+        self.assertIn(b'href="/sub/blog/post.html"', index)
+        self.assertIn(b"<p>first</p>", self.get("blog/post.html"))
+        self.assertEqual(self.get("site.css"), b"p {}")
+
+    def test_edited_source_is_rendered_again(self):
+        self.get("blog/post.html")
+        self.get("blog/post.html")
+        post = self.content / "blog" / "post.md"
+        post.write_text("# Post\n\nsecond\n")
+        stat = post.stat()
+        os.utime(post, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertIn(b"<p>second</p>", self.get("blog/post.html"))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_missing_and_broken_pages(self):
+        with self.assertRaises(urllib.error.HTTPError) as missing:
+            self.get("nope.html")
+        self.assertEqual(missing.exception.code, 404)
+        with self.assertRaises(urllib.error.HTTPError) as broken:
+            self.get("broken.html")
+        self.assertEqual(broken.exception.code, 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
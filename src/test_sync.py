@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from sync import sync_tree
+
+
+class TestSyncTree(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.src = root / "static"
+        self.dst = root / "docs"
+        (self.src / "images").mkdir(parents=True)
+        (self.src / "index.css").write_text("p {}")
+        (self.src / "images" / "a.webp").write_bytes(b"webp")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_first_sync_copies_everything(self):
+        result = sync_tree(self.src, self.dst)
+        self.assertEqual(result.files, {"index.css", "images/a.webp"})
+        self.assertEqual(result.copied, 2)
+        self.assertEqual((self.dst / "images" / "a.webp").read_bytes(), b"webp")
+
+    def test_unchanged_files_are_skipped(self):
+        sync_tree(self.src, self.dst)
+        result = sync_tree(self.src, self.dst)
+        self.assertEqual((result.copied, result.unchanged), (0, 2))
+
+    def test_changed_file_is_copied(self):
+        sync_tree(self.src, self.dst)
+        (self.src / "index.css").write_text("body { margin: 0 }")
+        result = sync_tree(self.src, self.dst)
+        self.assertEqual(result.copied, 1)
+        self.assertEqual((self.dst / "index.css").read_text(), "body { margin: 0 }")
+
+    def test_checksum_skips_touched_but_identical_file(self):
+        sync_tree(self.src, self.dst)
+        stat = (self.src / "index.css").stat()
+        os.utime(self.src / "index.css", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10))
+
+        self.assertEqual(sync_tree(self.src, self.dst, checksum=True).copied, 0)
+        self.assertEqual(sync_tree(self.src, self.dst).copied, 0)
+
+    def test_orphans_removed_but_foreign_files_kept(self):
+        first = sync_tree(self.src, self.dst)
+        (self.dst / "page.html").write_text("generated")
+        (self.src / "images" / "a.webp").unlink()
+
+        result = sync_tree(self.src, self.dst, first.files)
+        self.assertEqual(result.removed, 1)
+        self.assertFalse((self.dst / "images").exists())
+        self.assertTrue((self.dst / "page.html").exists())
+
+    def test_hardlink_mode(self):
+        sync_tree(self.src, self.dst, mode="hardlink")
+        self.assertTrue(
+            os.path.samefile(self.src / "index.css", self.dst / "index.css")
+        )
+        self.assertEqual(sync_tree(self.src, self.dst, mode="hardlink").copied, 0)
+
+    def test_reflink_mode_falls_back_to_copy(self):
+        sync_tree(self.src, self.dst, mode="reflink")
+        self.assertEqual((self.dst / "index.css").read_text(), "p {}")
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            sync_tree(self.src, self.dst, mode="symlink")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from template import Template, load_template
+from urls import BasepathRewriter
+
+
+class TestTemplate(unittest.TestCase):
+    def test_compile(self):
+        template = Template("<t>{{ Title }}</t><a>{{Content}}</a>")
+        self.assertEqual(template.literals, ["<t>", "</t><a>", "</a>"])
+        self.assertEqual(template.slots, ["Title", "Content"])
+
+    def test_render(self):
+        template = Template("<t>{{ Title }}</t>{{ Content }}{{ date }}")
+        html = template.render({"Title": "Hi", "Content": "<p>x</p>", "date": "d"})
+        self.assertEqual(html, "<t>Hi</t><p>x</p>d")
+
+    def test_missing_value_renders_empty(self):
+        self.assertEqual(Template("a{{ tags }}b").render({}), "ab")
+
+    def test_repeated_slot(self):
+        self.assertEqual(Template("{{ x }}-{{ x }}").render({"x": "1"}), "1-1")
+
+    def test_basepath_only_touches_template(self):
+        template = Template('<link href="/index.css">{{ Content }}<img src="/a.png">')
+        html = template.render({"Content": 'href="/raw'}, BasepathRewriter("/site/"))
+        self.assertEqual(
+            html, '<link href="/site/index.css">href="/raw<img src="/site/a.png">'
+        )
+
+    def test_rewrites_url_attributes_exactly(self):
+        template = Template(
+            '<a href="//cdn/x">{{ x }}</a><p>src="/text"</p><a href="/{{ path }}">'
+        )
+        html = template.render({"x": "1", "path": "p"}, BasepathRewriter("/site/"))
+        self.assertEqual(
+            html, '<a href="//cdn/x">1</a><p>src="/text"</p><a href="/site/p">'
+        )
+
+    def test_rewriter_sees_the_attribute(self):
+        class Cdn:
+            key = "cdn"
+
+            def __call__(self, url, attr):
+                return "https://cdn.example" + url if attr == "src" else url
+
+        html = Template('<a href="/a"><img src="/b.png">').render({}, Cdn())
+        self.assertEqual(html, '<a href="/a"><img src="https://cdn.example/b.png">')
+
+    def test_render_to(self):
+        out = io.StringIO()
+        Template("<t>{{ Title }}</t>").render_to(out, {"Title": "Hi"})
+        self.assertEqual(out.getvalue(), "<t>Hi</t>")
+
+    def test_placeholder_in_value_is_not_expanded(self):
+        template = Template("{{ Title }}|{{ Content }}")
+        html = template.render({"Title": "{{ Content }}", "Content": "c"})
+        self.assertEqual(html, "{{ Content }}|c")
+
+
+class TestLoadTemplate(unittest.TestCase):
+    def test_cached_until_modified(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "t.html"
+            path.write_text("one {{ Title }}")
+            first = load_template(path)
+            self.assertIs(load_template(path), first)
+
+            path.write_text("two {{ Title }}")
+            stat = path.stat()
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+            second = load_template(path)
+            self.assertIsNot(second, first)
+            self.assertEqual(second.render({"Title": "x"}), "two x")
+
+
+class TestPartials(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.partials = self.root / "partials"
+        self.partials.mkdir()
+        (self.partials / "head.html").write_text("<title>{{ Title }}</title>{{> nav }}")
+        (self.partials / "nav.html").write_text('<a href="/">home</a>')
+        self.page = self.root / "page.html"
+        self.page.write_text("{{> head }}<main>{{ Content }}</main>{{> nav }}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_partials_are_spliced_in(self):
+        template = load_template(self.page, self.partials)
+        self.assertEqual(template.slots, ["Title", "Content"])
+        self.assertEqual(
+            template.render({"Title": "T", "Content": "c"}),
+            '<title>T</title><a href="/">home</a><main>c</main><a href="/">home</a>',
+        )
+        self.assertEqual(
+            template.dependencies,
+            [self.partials / "head.html", self.partials / "nav.html"],
+        )
+
+    def test_edited_partial_invalidates_including_templates(self):
+        first = load_template(self.page, self.partials)
+        self.assertIs(load_template(self.page, self.partials), first)
+
+        nav = self.partials / "nav.html"
+        nav.write_text("<nav></nav>")
+        stat = nav.stat()
+        os.utime(nav, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        second = load_template(self.page, self.partials)
+        self.assertIsNot(second, first)
+        self.assertIn("<nav></nav><main>", second.render({}))
+
+    def test_include_cycle(self):
+        (self.partials / "nav.html").write_text("{{> head }}")
+        with self.assertRaisesRegex(ValueError, "head.html -> nav.html -> head.html"):
+            load_template(self.page, self.partials)
+
+    def test_partial_needs_a_partials_dir(self):
+        with self.assertRaises(ValueError):
+            Template("{{> head }}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 
 from textnode import TextNode, TextType, text_node_to_html_node
+from urls import BasepathRewriter
 
 
 class TestTextNode(unittest.TestCase):
@@ -58,6 +59,25 @@ class TestTextNodeToHTMLNode(unittest.TestCase):
         self.assertEqual(html_node.value, "")
         self.assertEqual(html_node.props, {"src": "", "alt": "logo"})
 
+    def test_links_share_props(self):
+        first = text_node_to_html_node(TextNode("a", TextType.LINK, "/x"))
+        second = text_node_to_html_node(TextNode("b", TextType.LINK, "/x"))
+        self.assertIs(first.props, second.props)
+        with self.assertRaises(TypeError):
+            first.props["href"] = "/y"
+
+    def test_rewrite_url(self):
+        rewrite = BasepathRewriter("/site/")
+        link = text_node_to_html_node(TextNode("a", TextType.LINK, "/x"), rewrite)
+        image = text_node_to_html_node(TextNode("i", TextType.IMAGE, "y.png"), rewrite)
+        self.assertEqual(link.props, {"href": "/site/x"})
+        self.assertEqual(image.props, {"src": "y.png", "alt": "i"})
+
+    def test_nodes_have_no_dict(self):
+        node = TextNode("x", TextType.TEXT)
+        self.assertFalse(hasattr(node, "__dict__"))
+        self.assertFalse(hasattr(text_node_to_html_node(node), "__dict__"))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,224 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import urllib.request
+from pathlib import Path
+from unittest import mock
+
+import imagemeta
+from main import generate_site
+from watch import RELOAD_SCRIPT, Reloader, SiteBuilder, Watcher, serve
+
+
+def touch(path: Path, text: str) -> None:
+    path.write_text(text)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.content = root / "content"
+        self.static = root / "static"
+        self.docs = root / "docs"
+        self.template = root / "template.html"
+
+        self.content.mkdir()
+        self.static.mkdir()
+        (self.content / "a.md").write_text("# A\n\none\n")
+        (self.content / "b.md").write_text("# B\n\ntwo\n")
+        (self.static / "site.css").write_text("p {}")
+        self.template.write_text("<body>{{ Content }}</body>")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_site(self.content, self.template, self.docs, "/")
+
+        self.watcher = self.make_watcher()
+        self.builder = SiteBuilder(
+            self.content, self.static, self.template, self.docs, "/"
+        )
+
+    def tearDown(self):
+        self.watcher.close()
+        self.tmp.cleanup()
+
+    def make_watcher(self) -> Watcher:
+        return Watcher(self.content, self.static, self.template)
+
+    def rebuild(self) -> str:
+        changed, deleted = self.watcher.poll()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.builder.rebuild(changed | deleted)
+        return out.getvalue()
+
+    def test_no_changes(self):
+        self.assertEqual(self.watcher.poll(), (set(), set()))
+
+    def test_only_edited_page_is_rebuilt(self):
+        touch(self.content / "a.md", "# A\n\nedited\n")
+        log = self.rebuild()
+        self.assertIn("a.md", log)
+        self.assertNotIn("b.md", log)
+        self.assertIn("edited", (self.docs / "a.html").read_text())
+
+    def test_template_change_rebuilds_all(self):
+        touch(self.template, "<main>{{ Content }}</main>")
+        self.assertEqual(self.rebuild().count("Generating page"), 2)
+
+    def test_new_layout_and_partial_edits_rebuild_their_section(self):
+        root = Path(self.tmp.name)
+        (self.content / "blog").mkdir()
+        (self.content / "blog" / "c.md").write_text("# C\n\nthree\n")
+        (root / "layouts").mkdir()
+        (root / "partials").mkdir()
+        (root / "partials" / "nav.html").write_text("<nav>1</nav>")
+        touch(root / "layouts" / "blog.html", "{{> nav }}{{ Content }}")
+        log = self.rebuild()
+        self.assertEqual(log.count("Generating page"), 1)
+        self.assertIn("c.md", log)
+
+        touch(root / "partials" / "nav.html", "<nav>2</nav>")
+        log = self.rebuild()
+        self.assertEqual(log.count("Generating page"), 1)
+        self.assertIn("<nav>2</nav>", (self.docs / "blog" / "c.html").read_text())
+
+    def test_deleted_page_and_static_are_removed(self):
+        (self.content / "b.md").unlink()
+        (self.static / "site.css").unlink()
+        self.rebuild()
+        self.assertFalse((self.docs / "b.html").exists())
+        self.assertFalse((self.docs / "site.css").exists())
+
+    def test_static_file_is_copied(self):
+        (self.static / "img").mkdir()
+        (self.static / "img" / "x.png").write_bytes(b"png")
+        self.rebuild()
+        self.assertEqual((self.docs / "img" / "x.png").read_bytes(), b"png")
+
+    def test_broken_page_does_not_stop_rebuild(self):
+        touch(self.content / "a.md", "no title")
+        self.assertIn("Failed to build", self.rebuild())
+
+    def test_served_pages_get_reload_script(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            server = serve(self.docs, 0, "/", Reloader())
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/a.html") as resp:
+                body = resp.read()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertIn(RELOAD_SCRIPT + b"</body>", body)
+        self.assertNotIn(RELOAD_SCRIPT, (self.docs / "a.html").read_bytes())
+
+
+    def test_new_directories_are_watched(self):
+        (self.content / "x" / "y").mkdir(parents=True)
+        (self.content / "x" / "y" / "c.md").write_text("# C\n")
+        self.assertEqual(self.watcher.poll()[0], {self.content / "x" / "y" / "c.md"})
+        touch(self.content / "x" / "y" / "c.md", "# C2\n")
+        self.assertEqual(self.watcher.poll()[0], {self.content / "x" / "y" / "c.md"})
+
+        shutil.rmtree(self.content / "x")
+        self.assertEqual(
+            self.watcher.poll(), (set(), {self.content / "x" / "y" / "c.md"})
+        )
+
+    def test_idle_inotify_poll_lists_nothing(self):
+        if self.watcher.inotify is None:
+            self.skipTest("no inotify")
+        with mock.patch("os.scandir") as scandir:
+            self.assertEqual(self.watcher.poll(), (set(), set()))
+        scandir.assert_not_called()
+
+
+class TestWatchOptions(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.content = root / "content"
+        self.docs = root / "docs"
+        self.template = root / "template.html"
+        self.content.mkdir()
+        (self.content / "a.md").write_text("# A\n\none   two\n")
+        (self.content / "b.md").write_text("# B\n\nthree\n")
+        self.template.write_text("<body>\n\n{{ Content }}</body>")
+        imagemeta.enable(imagemeta.ImageMeta(root / "static", {"x.png": (1, 2)}))
+
+    def tearDown(self):
+        imagemeta.disable()
+        self.tmp.cleanup()
+
+    def build(self) -> str:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            generate_site(
+                self.content,
+                self.template,
+                self.docs,
+                "/",
+                incremental=True,
+                minify=True,
+                search=True,
+            )
+        return out.getvalue()
+
+    def test_watch_rebuilds_match_full_builds(self):
+        self.build()
+        builder = SiteBuilder(
+            self.content,
+            self.content,
+            self.template,
+            self.docs,
+            "/",
+            minify=True,
+            search=True,
+        )
+        touch(self.content / "a.md", "# A\n\nfour   five\n")
+        with contextlib.redirect_stdout(io.StringIO()):
+            builder.rebuild({self.content / "a.md"})
+
+        self.assertIn("<body>\n<div>", (self.docs / "a.html").read_text())
+        self.assertTrue((self.docs / "search" / "fo.json").exists())
+        self.assertFalse((self.docs / "search" / "on.json").exists())
+        self.assertNotIn("Generating page", self.build())
+
+
+class TestWatchPolling(TestWatch):
+    def make_watcher(self) -> Watcher:
+        # a full rescan on every poll also sees edits in place
+        return Watcher(
+            self.content, self.static, self.template, notify=False, rescan_interval=0
+        )
+
+    def test_directory_mtimes_catch_added_and_removed_files(self):
+        watcher = Watcher(
+            self.content, self.static, self.template, notify=False, rescan_interval=60
+        )
+        (self.content / "c.md").write_text("# C\n")
+        (self.static / "site.css").unlink()
+        with mock.patch.object(watcher, "take_snapshot") as full:
+            changed, deleted = watcher.poll()
+        full.assert_not_called()
+        self.assertEqual(changed, {self.content / "c.md"})
+        self.assertEqual(deleted, {self.static / "site.css"})
+
+
+class TestReloader(unittest.TestCase):
+    def test_wait_returns_new_version(self):
+        reloader = Reloader()
+        reloader.bump()
+        self.assertEqual(reloader.wait(0, timeout=0), 1)
+        self.assertEqual(reloader.wait(1, timeout=0), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
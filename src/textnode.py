@@ -1,8 +1,15 @@
 from __future__ import annotations
 from enum import Enum
+from functools import lru_cache
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Mapping
 
 from htmlnode import HTMLNode, LeafNode
 
+if TYPE_CHECKING:
+    from imagemeta import PageImages
+    from urls import UrlRewriter
+
 
 class TextType(Enum):
     TEXT = "plain"
@@ -14,6 +21,8 @@ class TextType(Enum):
 
 
 class TextNode:
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text: str, text_type: TextType, url: str | None = None) -> None:
         self.text = text
         self.text_type = text_type
@@ -33,7 +42,22 @@ class TextNode:
         return f"TextNode({self.text}, {self.text_type.value}, {self.url})"
 
 
-def text_node_to_html_node(text_node: TextNode) -> HTMLNode:
+# links and images to the same url share one read-only props mapping
+@lru_cache(maxsize=8192)
+def _link_props(url: str) -> Mapping[str, str]:
+    return MappingProxyType({"href": url})
+
+
+@lru_cache(maxsize=8192)
+def _image_props(url: str, alt: str) -> Mapping[str, str]:
+    return MappingProxyType({"src": url, "alt": alt})
+
+
+def text_node_to_html_node(
+    text_node: TextNode,
+    rewrite_url: UrlRewriter | None = None,
+    images: PageImages | None = None,
+) -> HTMLNode:
     match text_node.text_type:
         case TextType.TEXT:
             return LeafNode(None, text_node.text)
@@ -47,9 +71,16 @@ def text_node_to_html_node(text_node: TextNode) -> HTMLNode:
             url = text_node.url
             if url is None:
                 url = ""
-            return LeafNode("a", text_node.text, {"href": url})
+            elif rewrite_url is not None:
+                url = rewrite_url(url, "href")
+            return LeafNode("a", text_node.text, _link_props(url))
         case TextType.IMAGE:
-            url = text_node.url
+            url = src = text_node.url
             if url is None:
-                url = ""
-            return LeafNode("img", "", {"src": url, "alt": text_node.text})
+                url = src = ""
+            elif rewrite_url is not None:
+                src = rewrite_url(url, "src")
+            if images is not None:
+                # sizes are looked up by the url as written, before rewriting
+                return LeafNode("img", "", images.props(url, src, text_node.text))
+            return LeafNode("img", "", _image_props(src, text_node.text))
@@ -0,0 +1,42 @@
+from __future__ import annotations
+from functools import lru_cache
+from typing import Protocol
+
+# rendered in place of the basepath when one render is written out for
+# several basepaths; NUL never survives into page text
+BASEPATH_MARKER = "\x00"
+
+
+class UrlRewriter(Protocol):
+    # key identifies what the rewriter does; it is part of the block cache
+    # key, so two rewriters with the same key must return the same urls
+    key: str
+
+    def __call__(self, url: str, attr: str, /) -> str: ...
+
+
+class BasepathRewriter:
+    __slots__ = ("basepath", "key")
+
+    def __init__(self, basepath: str) -> None:
+        self.basepath = basepath
+        self.key = f"basepath:{basepath}"
+
+    def __call__(self, url: str, attr: str) -> str:
+        # "//host/x" is protocol-relative, not relative to the site root
+        if url.startswith("/") and not url.startswith("//"):
+            return self.basepath + url[1:]
+        return url
+
+
+@lru_cache(maxsize=None)
+def basepath_rewriter(basepath: str) -> BasepathRewriter:
+    return BasepathRewriter(basepath)
+
+
+def strip_basepath(path: str, basepath: str) -> str:
+    # the inverse for a server rooted at the site: pages built for a
+    # sub-path link to /basepath/..., those map back onto the root
+    if basepath != "/" and path.startswith(basepath):
+        return "/" + path[len(basepath) :]
+    return path
@@ -0,0 +1,605 @@
+from __future__ import annotations
+import errno
+import os
+import struct
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from imagemeta import ImageDeps
+from manifest import Manifest, file_digest
+from pages import generate_page, layout_dependencies, page_digest, page_layout
+from sync import sync_file
+from urls import strip_basepath
+
+RELOAD_PATH = "/__livereload"
+RELOAD_SCRIPT = (
+    f'<script>new EventSource("{RELOAD_PATH}").onmessage = '
+    "() => location.reload();</script>"
+).encode("utf-8")
+
+Snapshot = dict[Path, tuple[int, int]]
+# a listed directory: its mtime then, and the files and subdirectories in it
+Listing = tuple[int, set[Path], set[Path]]
+
+# inotify(7) event bits
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ISDIR = 0x40000000
+# no IN_MODIFY, a file being written is picked up once it is closed
+_IN_MASK = (
+    _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+)
+_EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    # the kernel queues what changed, so a poll with nothing to report is a
+    # single read(); Linux only, open() returns None elsewhere
+    def __init__(self, libc, fd: int) -> None:
+        self._libc = libc
+        self.fd = fd
+        self.paths: dict[int, Path] = {}
+        self.wds: dict[Path, int] = {}
+
+    @classmethod
+    def open(cls) -> Inotify | None:
+        try:
+            import ctypes
+
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    def add(self, path: Path) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _IN_MASK)
+        if wd < 0:
+            import ctypes
+
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return  # gone again, its parent's events say so
+            raise OSError(err, os.strerror(err), str(path))
+        # a renamed directory keeps its watch, which now stands for the new path
+        self.paths[wd] = path
+        self.wds[path] = wd
+
+    def remove(self, path: Path) -> None:
+        wd = self.wds.pop(path, None)
+        if wd is not None and self.paths.get(wd) == path:
+            del self.paths[wd]
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self) -> tuple[set[Path], set[Path]] | None:
+        # (files, directories) with events since the last read, None if the
+        # kernel's queue overflowed and events were lost
+        files: set[Path] = set()
+        dirs: set[Path] = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+
+                if mask & _IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                path = self.paths.get(wd)
+                if path is None:
+                    continue
+                if mask & _IN_IGNORED:
+                    del self.paths[wd]
+                    if self.wds.get(path) == wd:
+                        del self.wds[path]
+                elif not name:
+                    dirs.add(path)  # the watched directory itself
+                elif mask & _IN_ISDIR:
+                    dirs.add(path / name)
+                else:
+                    files.add(path / name)
+
+        return None if overflow else (files, dirs)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class Watcher:
+    # with inotify only what the kernel reports is stat'ed or listed again;
+    # without it directory mtimes are polled, which catch added, removed and
+    # renamed files, and everything is rescanned every rescan_interval
+    # seconds for files edited in place
+    def __init__(
+        self,
+        content_dir: Path,
+        static_dir: Path,
+        template_path: Path,
+        notify: bool = True,
+        rescan_interval: float = 2.0,
+    ):
+        site_root = template_path.parent
+        self.template_path = template_path
+        # watched trees and the files that matter in them
+        self.roots: dict[Path, str | None] = {
+            content_dir: ".md",
+            static_dir: None,
+            site_root / "layouts": ".html",
+            site_root / "partials": ".html",
+        }
+        self.rescan_interval = rescan_interval
+        self.scanned = 0.0
+        self.inotify = Inotify.open() if notify else None
+        self.dirs: dict[Path, Listing] = {}
+        if self.inotify is not None:
+            # the template, and layouts/ or partials/ once they are created
+            self._watch(site_root)
+        self.snapshot = self.take_snapshot()
+
+    def close(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def _watch(self, directory: Path) -> None:
+        assert self.inotify is not None
+        try:
+            self.inotify.add(directory)
+        except OSError as exc:
+            # out of watches most likely, polling still works
+            print(f"Falling back to polling: {exc}")
+            self.close()
+            self.scanned = float("-inf")
+
+    def _root(self, path: Path) -> Path | None:
+        for root in self.roots:
+            if path == root or path.is_relative_to(root):
+                return root
+        return None
+
+    def _list(
+        self, directory: Path, suffix: str | None
+    ) -> tuple[int, Snapshot, set[Path]] | None:
+        if self.inotify is not None:
+            # watched before it is listed, a file created in between shows
+            # up twice instead of never
+            self._watch(directory)
+        try:
+            mtime = directory.stat().st_mtime_ns
+            entries = os.scandir(directory)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+        files: Snapshot = {}
+        subdirs = set()
+        with entries:
+            for entry in entries:
+                path = Path(entry.path)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.add(path)
+                    elif suffix is None or entry.name.endswith(suffix):
+                        stat = entry.stat()
+                        files[path] = (stat.st_mtime_ns, stat.st_size)
+                except FileNotFoundError:
+                    continue
+
+        return mtime, files, subdirs
+
+    def _walk(self, directory: Path, suffix: str | None, snapshot: Snapshot) -> None:
+        listed = self._list(directory, suffix)
+        if listed is None:
+            return
+
+        mtime, files, subdirs = listed
+        snapshot.update(files)
+        self.dirs[directory] = (mtime, set(files), subdirs)
+        for subdir in subdirs:
+            self._walk(subdir, suffix, snapshot)
+
+    def take_snapshot(self) -> Snapshot:
+        self.scanned = time.monotonic()
+        self.dirs = {}
+        snapshot: Snapshot = {}
+        for root, suffix in self.roots.items():
+            self._walk(root, suffix, snapshot)
+        if self.template_path.exists():
+            stat = self.template_path.stat()
+            snapshot[self.template_path] = (stat.st_mtime_ns, stat.st_size)
+
+        return snapshot
+
+    def _forget(self, directory: Path, deleted: set[Path]) -> None:
+        for path in [d for d in self.dirs if d.is_relative_to(directory)]:
+            _, files, _ = self.dirs.pop(path)
+            for file in files:
+                if self.snapshot.pop(file, None) is not None:
+                    deleted.add(file)
+            if self.inotify is not None:
+                self.inotify.remove(path)
+
+    def _relist(self, directory: Path, changed: set[Path], deleted: set[Path]) -> None:
+        root = self._root(directory)
+        if root is None:
+            return
+        listed = self._list(directory, self.roots[root])
+        if listed is None:
+            self._forget(directory, deleted)
+            return
+
+        mtime, files, subdirs = listed
+        _, old_files, old_subdirs = self.dirs.get(directory, (0, set(), set()))
+        for path, stat in files.items():
+            if self.snapshot.get(path) != stat:
+                self.snapshot[path] = stat
+                changed.add(path)
+        for path in old_files - files.keys():
+            if self.snapshot.pop(path, None) is not None:
+                deleted.add(path)
+        self.dirs[directory] = (mtime, set(files), subdirs)
+
+        for subdir in old_subdirs - subdirs:
+            self._forget(subdir, deleted)
+        for subdir in subdirs - old_subdirs:
+            self._relist(subdir, changed, deleted)
+
+    def _restat(self, path: Path, changed: set[Path], deleted: set[Path]) -> None:
+        listing = self.dirs.get(path.parent)
+        if path != self.template_path:
+            # a file in a directory not listed yet comes with that listing
+            root = self._root(path.parent)
+            if listing is None or root is None:
+                return
+            suffix = self.roots[root]
+            if suffix is not None and not path.name.endswith(suffix):
+                return
+
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            if self.snapshot.pop(path, None) is not None:
+                deleted.add(path)
+            if listing is not None:
+                listing[1].discard(path)
+            return
+
+        if self.snapshot.get(path) != (stat.st_mtime_ns, stat.st_size):
+            self.snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+            changed.add(path)
+        if listing is not None:
+            listing[1].add(path)
+
+    def _changed_dirs(self) -> set[Path]:
+        dirs = set()
+        for directory, (mtime, _, _) in self.dirs.items():
+            try:
+                if directory.stat().st_mtime_ns == mtime:
+                    continue
+            except FileNotFoundError:
+                pass
+            dirs.add(directory)
+
+        return dirs
+
+    def poll(self) -> tuple[set[Path], set[Path]]:
+        if self.inotify is not None:
+            events = self.inotify.read()
+        elif time.monotonic() - self.scanned < self.rescan_interval:
+            events = {self.template_path}, self._changed_dirs()
+        else:
+            events = None
+
+        if events is None:
+            old, new = self.snapshot, self.take_snapshot()
+            self.snapshot = new
+
+            changed = {path for path, stat in new.items() if old.get(path) != stat}
+            deleted = set(old) - set(new)
+
+            return changed, deleted
+
+        files, dirs = events
+        # a tree that did not exist before, wherever it lives
+        dirs.update(r for r in self.roots if r not in self.dirs and r.is_dir())
+        changed: set[Path] = set()
+        deleted: set[Path] = set()
+        for directory in sorted(dirs):
+            self._relist(directory, changed, deleted)
+        for path in files:
+            self._restat(path, changed, deleted)
+
+        return changed, deleted
+
+
+class Reloader:
+    def __init__(self) -> None:
+        self.version = 0
+        self.cond = threading.Condition()
+
+    def bump(self) -> None:
+        with self.cond:
+            self.version += 1
+            self.cond.notify_all()
+
+    def wait(self, version: int, timeout: float) -> int:
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class SiteBuilder:
+    def __init__(
+        self,
+        content_dir: Path,
+        static_dir: Path,
+        template_path: Path,
+        docs_dir: Path,
+        basepath: str,
+        static_mode: str = "copy",
+        minify: bool = False,
+        search: bool = False,
+    ):
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.template_path = template_path
+        self.docs_dir = docs_dir
+        self.basepath = basepath
+        self.static_mode = static_mode
+        self.minify = minify
+        self.search = search
+        # (title, text) of the pages rebuilt since the index was last saved
+        self.indexed: dict[str, tuple[str, str]] = {}
+        self.manifest = Manifest.load(docs_dir)
+        self.site_root = template_path.parent
+        self.layouts_dir = self.site_root / "layouts"
+        self.partials_dir = self.site_root / "partials"
+        self.digests: dict[Path, str] = {}
+
+    def _is_template(self, path: Path) -> bool:
+        return (
+            path == self.template_path
+            or path.is_relative_to(self.layouts_dir)
+            or path.is_relative_to(self.partials_dir)
+        )
+
+    def _build_page(self, md_path: Path) -> None:
+        rel = md_path.relative_to(self.content_dir)
+        out_rel = rel.with_suffix(".html")
+        source = rel.as_posix()
+
+        if not md_path.exists():
+            out_path = self.docs_dir / out_rel
+            if out_path.exists():
+                out_path.unlink()
+            self.manifest.pages.pop(source, None)
+            print(f"Removed stale page {out_path}")
+            return
+
+        layout = page_layout(md_path, rel, self.template_path)
+        template_digest, files = layout_dependencies(
+            layout, self.partials_dir, self.digests
+        )
+        page_hash = page_digest(
+            file_digest(md_path),
+            template_digest,
+            self.basepath,
+            self.minify,
+            self.search,
+        )
+        text: list[str] | None = [] if self.search else None
+        images_used: ImageDeps = {}
+        title = generate_page(
+            md_path,
+            layout,
+            [(self.basepath, self.docs_dir / out_rel)],
+            self.partials_dir,
+            self.minify,
+            text,
+            images_used,
+        )
+        deps = [path.relative_to(self.site_root).as_posix() for path in files]
+        self.manifest.record(source, out_rel.as_posix(), page_hash, deps, images_used)
+        if text is not None:
+            self.indexed[out_rel.as_posix()] = (title, "\n".join(text))
+
+    def _sync_static(self, path: Path) -> None:
+        rel = path.relative_to(self.static_dir).as_posix()
+        dest = self.docs_dir / rel
+        if path.exists():
+            sync_file(path, dest, self.static_mode)
+            if rel not in self.manifest.static:
+                self.manifest.static.append(rel)
+        else:
+            if dest.exists():
+                dest.unlink()
+            if rel in self.manifest.static:
+                self.manifest.static.remove(rel)
+
+    def rebuild(self, paths: set[Path]) -> int:
+        pages = set()
+        for path in sorted(paths):
+            if self._is_template(path):
+                # only the pages recorded as using the file are rebuilt
+                self.digests.pop(path, None)
+                rel = path.relative_to(self.site_root).as_posix()
+                pages.update(
+                    self.content_dir / source
+                    for source in self.manifest.dependents(rel)
+                )
+                if path.is_relative_to(self.layouts_dir):
+                    # a new or deleted layout moves its whole section
+                    section = path.relative_to(self.layouts_dir).with_suffix("")
+                    pages.update((self.content_dir / section).rglob("*.md"))
+            elif path.is_relative_to(self.content_dir):
+                pages.add(path)
+            elif path.is_relative_to(self.static_dir):
+                self._sync_static(path)
+
+        for md_path in sorted(pages):
+            try:
+                self._build_page(md_path)
+            except Exception as exc:
+                # a half-written page must not stop the watcher
+                print(f"Failed to build {md_path}: {exc}")
+                source = md_path.relative_to(self.content_dir).as_posix()
+                self.manifest.pages.pop(source, None)
+
+        self.manifest.save()
+        if self.search:
+            from search import SearchIndex
+
+            index = SearchIndex.load(self.docs_dir, self.basepath)
+            live = {entry["output"] for entry in self.manifest.pages.values()}
+            index.update(live, self.indexed)
+            index.save()
+            self.indexed.clear()
+
+        return len(pages)
+
+
+class LiveReloadHandler(SimpleHTTPRequestHandler):
+    reloader: Reloader
+    basepath = "/"
+
+    def log_message(self, format, *args):
+        pass
+
+    def translate_path(self, path: str) -> str:
+        return super().translate_path(strip_basepath(path, self.basepath))
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] == RELOAD_PATH:
+            self._stream_reloads()
+            return
+
+        fs_path = Path(self.translate_path(self.path.split("?", 1)[0]))
+        if fs_path.is_dir():
+            fs_path = fs_path / "index.html"
+        if fs_path.suffix != ".html" or not fs_path.is_file():
+            super().do_GET()
+            return
+
+        body = fs_path.read_bytes()
+        index = body.rfind(b"</body>")
+        if index == -1:
+            body += RELOAD_SCRIPT
+        else:
+            body = body[:index] + RELOAD_SCRIPT + body[index:]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_reloads(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+
+        version = self.reloader.version
+        try:
+            while True:
+                current = self.reloader.wait(version, timeout=15)
+                if current == version:
+                    self.wfile.write(b": keepalive\n\n")
+                else:
+                    version = current
+                    self.wfile.write(b"data: reload\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def serve(
+    docs_dir: Path, port: int, basepath: str, reloader: Reloader
+) -> ThreadingHTTPServer:
+    handler = type(
+        "Handler", (LiveReloadHandler,), {"reloader": reloader, "basepath": basepath}
+    )
+    server = ThreadingHTTPServer(
+        ("", port), partial(handler, directory=str(docs_dir))
+    )
+    server.daemon_threads = True
+    print(f"Serving {docs_dir} on http://localhost:{port}{basepath}")
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def watch(
+    content_dir: Path,
+    static_dir: Path,
+    template_path: Path,
+    docs_dir: Path,
+    basepath: str,
+    port: int | None = None,
+    static_mode: str = "copy",
+    minify: bool = False,
+    search: bool = False,
+    interval: float = 0.05,
+) -> None:
+    builder = SiteBuilder(
+        content_dir,
+        static_dir,
+        template_path,
+        docs_dir,
+        basepath,
+        static_mode,
+        minify,
+        search,
+    )
+    watcher = Watcher(content_dir, static_dir, template_path)
+    reloader = Reloader()
+
+    if port is not None:
+        serve(docs_dir, port, basepath, reloader)
+    print(f"Watching {content_dir}, {static_dir} and {template_path}")
+
+    try:
+        while True:
+            time.sleep(interval)
+            changed, deleted = watcher.poll()
+            if not changed and not deleted:
+                continue
+
+            start = time.perf_counter()
+            count = builder.rebuild(changed | deleted)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"Rebuilt {count} page(s) in {elapsed:.1f} ms")
+            reloader.bump()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
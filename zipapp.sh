@@ -0,0 +1 @@
+python3 tools/build_zipapp.py "$@"